@@ -1,4 +1,6 @@
 import { Module } from '@nestjs/common';
+import { Agent as HttpAgent } from 'http';
+import { Agent as HttpsAgent } from 'https';
 import { HttpModule } from '@nestjs/axios';
 import { ConfigModule } from '@nestjs/config';
 import { AiController } from './ai.controller';
@@ -9,6 +11,9 @@ import { AiService } from './ai.service';
     HttpModule.register({
       timeout: 30000, // 30 seconds timeout for AI service calls
       maxRedirects: 5,
+      // Reuse connections to the AI service instead of a new one per call
+      httpAgent: new HttpAgent({ keepAlive: true }),
+      httpsAgent: new HttpsAgent({ keepAlive: true }),
     }),
     ConfigModule,
   ],
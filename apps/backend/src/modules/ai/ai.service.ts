@@ -5,12 +5,12 @@ import { PrismaService } from '../../common/prisma/prisma.service';
 import { SnakeDetectionDto } from './dto/snake-detection.dto';
 import { ChatbotQueryDto } from './dto/chatbot-query.dto';
 import { first } from 'rxjs/operators';
-import * as FormData from 'form-data';
 
 @Injectable()
 export class AiService {
   private readonly logger = new Logger(AiService.name);
   private readonly aiServiceUrl: string;
+  private readonly aiServiceToken?: string;
 
   constructor(
     private readonly configService: ConfigService,
@@ -18,34 +18,33 @@ export class AiService {
     private readonly prisma: PrismaService,
   ) {
     this.aiServiceUrl = this.configService.get('AI_SERVICE_URL', 'http://localhost:8000');
+    // Shared secret for the AI service's internal API (its INTERNAL_API_TOKEN)
+    this.aiServiceToken = this.configService.get('AI_SERVICE_INTERNAL_TOKEN');
   }
 
   async detectSnakeSpeciesFromFile(file: Express.Multer.File, userId: string, sessionId: string, location?: any) {
     this.logger.log('Processing snake species detection from file upload');
     
     try {
-      // Create FormData for file upload to AI service using form-data package
-      const formData = new FormData();
-      formData.append('image', Buffer.from(file.buffer), {
-        filename: file.originalname,
-        contentType: file.mimetype,
-      });
-      formData.append('userId', userId);
-      formData.append('sessionId', sessionId);
+      // Send the raw image bytes to the internal endpoint; options travel in headers
+      const headers: Record<string, string> = {
+        'Content-Type': file.mimetype || 'image/jpeg',
+        'X-User-Id': userId,
+        'X-Session-Id': sessionId,
+      };
+      if (this.aiServiceToken) {
+        headers['Authorization'] = `Bearer ${this.aiServiceToken}`;
+      }
       if (location) {
-        formData.append('location', JSON.stringify(location));
+        headers['X-Location'] = JSON.stringify(location);
       }
 
-      // Call Python FastAPI AI service upload endpoint
-      // form-data package provides headers with boundary automatically
-      this.logger.log(`Calling AI service for image detection: ${this.aiServiceUrl}/api/v1/upload-and-detect`);
+      this.logger.log(`Calling AI service for image detection: ${this.aiServiceUrl}/internal/v1/detect`);
 
       const response = await this.httpService.post(
-        `${this.aiServiceUrl}/api/v1/upload-and-detect`,
-        formData,
-        {
-          headers: formData.getHeaders(),
-        }
+        `${this.aiServiceUrl}/internal/v1/detect`,
+        Buffer.from(file.buffer),
+        { headers }
       ).pipe(first()).toPromise();
 
       const aiResult = (response as any).data;
@@ -0,0 +1,106 @@
+"""
+Admin profiling and usage endpoints
+
+Disabled unless ADMIN_ENDPOINTS_ENABLED is set, and each call needs an admin
+token (see app/core/security.py). Results describe only the worker process
+that served the request; its PID is returned in X-Worker-PID.
+"""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from app.core import profiling
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.responses import FastRoute
+from app.core.security import require_admin
+from app.services.cache_snapshots import get_cache_snapshots
+from app.services.prefetch import get_prefetcher
+from app.services.shadow import get_shadow_evaluator
+from app.services.usage import get_usage_accountant
+
+logger = get_logger(__name__)
+
+router = APIRouter(route_class=FastRoute, dependencies=[Depends(require_admin)])
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=409, detail="Another profile is running in this worker")
+
+@router.get("/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1.0, le=1000.0)
+):
+    """
+    Sample all thread stacks for `seconds` and return collapsed stacks
+
+    The body feeds straight into flamegraph.pl or speedscope.
+    """
+    seconds = min(seconds, settings.PROFILER_MAX_SECONDS)
+    try:
+        result = await profiling.sample_stacks(seconds, interval_ms / 1000)
+    except profiling.ProfilerBusy:
+        raise _busy()
+    return PlainTextResponse(
+        result["collapsed"],
+        headers={"X-Profile-Samples": str(result["samples"]), "X-Worker-PID": str(os.getpid())},
+    )
+
+@router.get("/profile/memory")
+async def profile_memory(
+    response: Response,
+    seconds: float = Query(5.0, ge=0),
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Top allocation sites by retained size (tracemalloc)"""
+    seconds = min(seconds, settings.PROFILER_MAX_SECONDS)
+    try:
+        result = await profiling.allocation_top(seconds, limit, group_by)
+    except profiling.ProfilerBusy:
+        raise _busy()
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return result
+
+@router.get("/profile/objects")
+async def profile_objects(
+    response: Response,
+    limit: int = Query(25, ge=1, le=200),
+    min_string_kb: int = Query(64, ge=1)
+):
+    """Live objects by type, and large strings such as retained data URLs"""
+    try:
+        result = await profiling.object_counts(limit, min_string_kb * 1024)
+    except profiling.ProfilerBusy:
+        raise _busy()
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return result
+
+@router.get("/usage")
+async def upstream_usage(
+    response: Response,
+    group_by: str = Query("route", pattern="^(route|query_type|user)$")
+):
+    """Today's upstream token usage in this worker"""
+    accountant = get_usage_accountant()
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return {"day": accountant.day, "group_by": group_by, "usage": accountant.snapshot(group_by)}
+
+@router.get("/prefetch")
+async def prefetch_stats(response: Response):
+    """Speculative prefetch outcomes and hit rate in this worker"""
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return {"enabled": settings.PREFETCH_ENABLED, "kinds": get_prefetcher().snapshot()}
+
+@router.get("/shadow")
+async def shadow_report(response: Response):
+    """Agreement, confidence and latency of the candidate vision model against the primary in this worker"""
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return get_shadow_evaluator().snapshot()
+
+@router.get("/cache-snapshots")
+async def cache_snapshot_stats(response: Response):
+    """Cache snapshot versions and entries mapped, served and written by this worker"""
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return get_cache_snapshots().snapshot()
@@ -2,14 +2,39 @@
 Chatbot API endpoints
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from app.models.chatbot import ChatbotRequest, ChatbotResponse, ChatbotContext
-from app.services.chatbot_service import ChatbotService
+from fastapi import APIRouter, HTTPException, Depends, Query
+from app.core.admission import AdmissionController, Priority, get_admission_controller
+from app.core.exceptions import SnaKToxAIException
+from app.core.responses import FastRoute
+from app.models.chatbot import ChatbotRequest, ChatbotResponse, ChatbotContext, QueryType
+from app.services.chatbot_service import ChatbotService, classify_by_keywords
+from app.services.context_store import ANONYMOUS, ContextStore, get_context_store
+from app.services.usage import usage_scope
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
+
+# Admission priority per query type; unclassified queries count as normal
+QUERY_PRIORITIES = {
+    QueryType.EMERGENCY: Priority.CRITICAL,
+    QueryType.FIRST_AID: Priority.HIGH,
+    QueryType.PREVENTION: Priority.NORMAL,
+    QueryType.SPECIES_INFO: Priority.NORMAL,
+    QueryType.GENERAL: Priority.LOW,
+}
+
+def query_priority(request: ChatbotRequest) -> Priority:
+    """Admission priority from the declared or keyword-detected query type"""
+    query_type = request.query_type or classify_by_keywords(request.query)
+    return QUERY_PRIORITIES.get(query_type, Priority.NORMAL)
+
+def require_user(user_id: str) -> str:
+    """Context endpoints act for a named user; anonymous sessions stay private to chat"""
+    if user_id == ANONYMOUS:
+        raise HTTPException(status_code=400, detail="A user_id is required")
+    return user_id
 
 # Dependency injection
 def get_chatbot_service() -> ChatbotService:
@@ -19,7 +44,8 @@ def get_chatbot_service() -> ChatbotService:
 @router.post("/chat", response_model=ChatbotResponse)
 async def chat_with_bot(
     request: ChatbotRequest,
-    service: ChatbotService = Depends(get_chatbot_service)
+    service: ChatbotService = Depends(get_chatbot_service),
+    admission: AdmissionController = Depends(get_admission_controller)
 ):
     """
     Chat with the AI assistant about snakebite prevention and emergency response
@@ -35,7 +61,10 @@ async def chat_with_bot(
     try:
         logger.info("Chatbot query received", query_type=request.query_type)
         
-        result = await service.process_query(request)
+        priority = query_priority(request)
+        with usage_scope("chat", request.user_id, critical=priority == Priority.CRITICAL):
+            async with admission.slot(priority):
+                result = await service.process_query(request)
         
         if not result.success:
             raise HTTPException(status_code=400, detail="Failed to process query")
@@ -46,23 +75,37 @@ async def chat_with_bot(
         
         return result
         
+    except SnaKToxAIException:
+        raise
     except Exception as e:
         logger.error("Chatbot endpoint error", error=str(e))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.post("/context")
-async def update_context(context: ChatbotContext):
+async def update_context(
+    context: ChatbotContext,
+    store: ContextStore = Depends(get_context_store)
+):
     """
     Update chatbot conversation context
     
     This endpoint allows updating the conversation context for more personalized
-    responses based on previous interactions.
+    responses based on previous interactions. Chat requests carrying the same
+    session_id and user_id will include a summary of this history in their prompt.
+    A session belongs to the user that created it; other users get 403.
     """
+    def replace(stored: ChatbotContext) -> None:
+        stored.conversation_history = context.conversation_history
+        stored.user_preferences = context.user_preferences
+        stored.location_context = context.location_context
+    
     try:
+        require_user(context.user_id)
         logger.info("Chatbot context updated", user_id=context.user_id)
         
-        # In a real implementation, you'd store this context in a database
-        # For now, just return success
+        saved = await store.update(context.session_id, context.user_id, replace)
+        if saved is None:
+            raise HTTPException(status_code=403, detail="Session belongs to another user")
         
         return {
             "success": True,
@@ -71,17 +114,46 @@ async def update_context(context: ChatbotContext):
             "session_id": context.session_id
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Context update error", error=str(e))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.get("/context/{session_id}", response_model=ChatbotContext)
+async def get_context(
+    session_id: str,
+    user_id: str = Query(..., min_length=1, description="User the session belongs to"),
+    store: ContextStore = Depends(get_context_store)
+):
+    """Get the stored conversation context for one of the user's sessions"""
+    context = await store.get_owned(session_id, require_user(user_id))
+    if context is None:
+        # Sessions of other users look the same as missing ones
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return context
+
+@router.delete("/context/{session_id}")
+async def delete_context(
+    session_id: str,
+    user_id: str = Query(..., min_length=1, description="User the session belongs to"),
+    store: ContextStore = Depends(get_context_store)
+):
+    """Forget the stored conversation context for one of the user's sessions"""
+    deleted = await store.get_owned(session_id, require_user(user_id)) is not None and await store.delete(session_id)
+    return {"success": True, "deleted": deleted, "session_id": session_id}
+
 @router.get("/topics")
-async def get_available_topics():
+async def get_available_topics(
+    admission: AdmissionController = Depends(get_admission_controller)
+):
     """
     Get available conversation topics
     
     Returns a list of topics the chatbot can help with, organized by category.
     """
+    admission.check(Priority.LOW)
+    
     topics = {
         "emergency_response": [
             "First aid for snakebites",
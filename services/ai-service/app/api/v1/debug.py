@@ -0,0 +1,25 @@
+"""
+Diagnostic endpoints for SnaKTox AI Service
+
+Disabled unless DEBUG_ENDPOINTS_ENABLED is set; meant for staging.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.config import settings
+from app.core.loop_monitor import get_loop_monitor
+from app.core.responses import FastRoute
+
+router = APIRouter(route_class=FastRoute)
+
+def require_debug_endpoints() -> None:
+    """Hide diagnostic routes unless explicitly enabled"""
+    if not settings.DEBUG_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@router.get("/loop", dependencies=[Depends(require_debug_endpoints)])
+async def event_loop_status():
+    """Recent event-loop lag and the stacks of calls that blocked the loop"""
+    return {
+        "monitor_enabled": settings.LOOP_MONITOR_ENABLED,
+        **get_loop_monitor().snapshot(),
+    }
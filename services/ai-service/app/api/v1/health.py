@@ -7,10 +7,11 @@ from pydantic import BaseModel
 from typing import Dict, Any
 import asyncio
 from app.core.logging import get_logger
+from app.core.responses import FastRoute
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 class HealthResponse(BaseModel):
     """Health check response model"""
@@ -0,0 +1,148 @@
+"""
+Internal service-to-service API
+
+For the NestJS backend, which already holds image bytes. Images travel as raw
+bytes instead of base64 data URLs, so they are a third smaller and neither side
+encodes or decodes them.
+
+The API is off unless INTERNAL_API_ENABLED, and every request must carry
+``Authorization: Bearer <INTERNAL_API_TOKEN>`` (see app/core/security.py). The
+token is checked before any body is read, so only the backend gets the critical
+priority and the larger body limits below.
+
+- POST /detect: body is the image, Content-Type its MIME type. Options go in
+  X-Confidence-Threshold, X-User-Id, X-Session-Id and X-Location headers. The
+  reply is JSON, or MessagePack with ``Accept: application/msgpack``.
+- POST /detect/batch: MessagePack body ``{"items": [{"id", "image" (bin),
+  "mime_type", "confidence_threshold", "location", "user_id", "session_id"}]}``.
+  The items run concurrently (at most INTERNAL_BATCH_CONCURRENCY at a time) and
+  the reply is ``{"results": [...]}`` in request order, one
+  SnakeDetectionResponse per item with its id.
+
+Both reserve memory for their body up front (see app/core/memory_budget.py).
+Clients should keep connections alive (SERVER_KEEPALIVE) and send many images
+in one batch rather than opening more connections.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+import msgpack
+from fastapi import APIRouter, Depends, Header, Request
+from app.core.admission import AdmissionController, Priority, get_admission_controller
+from app.core.config import settings
+from app.core.exceptions import SnakeDetectionError, ValidationError
+from app.core.logging import get_logger
+from app.core.memory_budget import image_memory
+from app.core.responses import FastRoute, MsgpackResponse
+from app.core.security import require_internal
+from app.models.snake_detection import SnakeDetectionResponse
+from app.services.snake_detection_service import SnakeDetectionService
+from app.services.usage import usage_scope
+
+logger = get_logger(__name__)
+
+router = APIRouter(route_class=FastRoute, dependencies=[Depends(require_internal)])
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+def get_snake_detection_service() -> SnakeDetectionService:
+    return SnakeDetectionService()
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_TYPES)
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """Request body, refusing more than limit bytes"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise SnakeDetectionError(f"Body exceeds {limit} bytes", 413)
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise SnakeDetectionError(f"Body exceeds {limit} bytes", 413)
+    return bytes(body)
+
+async def _detect(
+    service: SnakeDetectionService,
+    admission: AdmissionController,
+    image: bytes,
+    mime_type: str,
+    confidence_threshold: float,
+    location: Optional[str],
+    user_id: Optional[str],
+    session_id: Optional[str],
+) -> SnakeDetectionResponse:
+    # Detections back SOS reports and are always critical
+    with usage_scope("internal-detect", user_id, critical=True):
+        async with admission.slot(Priority.CRITICAL):
+            return await service.detect_image(image, mime_type, confidence_threshold, location, session_id)
+
+@router.post("/detect", response_model=SnakeDetectionResponse)
+async def detect_raw(
+    request: Request,
+    content_type: str = Header("image/jpeg"),
+    confidence_threshold: float = Header(0.7, alias="X-Confidence-Threshold", ge=0.0, le=1.0),
+    user_id: Optional[str] = Header(None, alias="X-User-Id"),
+    session_id: Optional[str] = Header(None, alias="X-Session-Id"),
+    location: Optional[str] = Header(None, alias="X-Location"),
+    service: SnakeDetectionService = Depends(get_snake_detection_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    _memory: int = Depends(image_memory())
+):
+    """Detect snake species from a raw image body"""
+    if not content_type.startswith("image/"):
+        raise SnakeDetectionError(f"Unsupported Content-Type {content_type}", 415)
+    image = await read_body(request, settings.UPLOAD_MAX_BYTES)
+    if not image:
+        raise SnakeDetectionError("Empty image")
+    result = await _detect(
+        service, admission, image, content_type, confidence_threshold, location, user_id, session_id
+    )
+    if wants_msgpack(request):
+        return MsgpackResponse(result)
+    return result
+
+@router.post("/detect/batch", response_class=MsgpackResponse)
+async def detect_batch(
+    request: Request,
+    service: SnakeDetectionService = Depends(get_snake_detection_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    _memory: int = Depends(image_memory())
+):
+    """Detect snake species for a MessagePack batch of raw images"""
+    limit = settings.UPLOAD_MAX_BYTES * settings.INTERNAL_BATCH_MAX_ITEMS
+    try:
+        envelope = msgpack.unpackb(await read_body(request, limit), raw=False)
+        items = envelope["items"]
+    except (ValueError, TypeError, KeyError, msgpack.ExtraData) as e:
+        raise ValidationError(f"Invalid batch envelope: {e}")
+    if not isinstance(items, list) or not 0 < len(items) <= settings.INTERNAL_BATCH_MAX_ITEMS:
+        raise ValidationError(f"A batch holds 1 to {settings.INTERNAL_BATCH_MAX_ITEMS} items")
+
+    gate = asyncio.Semaphore(settings.INTERNAL_BATCH_CONCURRENCY)
+
+    async def run(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        item_id = item.get("id", index) if isinstance(item, dict) else index
+        image = item.get("image") if isinstance(item, dict) else None
+        if not isinstance(image, bytes) or not image:
+            return {"id": item_id, "success": False, "error": "Item has no image bytes", "processing_time": 0.0}
+        async with gate:
+            try:
+                result = await _detect(
+                    service, admission, image,
+                    item.get("mime_type") or "image/jpeg",
+                    float(item.get("confidence_threshold", 0.7)),
+                    item.get("location"), item.get("user_id"), item.get("session_id"),
+                )
+            except Exception as e:
+                # One shed or failed item does not fail the batch
+                return {"id": item_id, "success": False, "error": str(e), "processing_time": 0.0}
+        return {"id": item_id, **result.model_dump(mode="json")}
+
+    results = await asyncio.gather(*(run(i, item) for i, item in enumerate(items)))
+    logger.info("Internal detection batch completed", items=len(results),
+                failed=sum(not r["success"] for r in results))
+    return MsgpackResponse({"results": results})
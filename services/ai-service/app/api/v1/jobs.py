@@ -0,0 +1,88 @@
+"""
+Asynchronous detection job endpoints
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Header, Query
+from app.core.config import settings
+from app.core.exceptions import SnaKToxAIException
+from app.core.responses import FastRoute
+from app.models.jobs import DetectionJob, JobSubmitResponse
+from app.services.job_service import JobService, get_job_service
+from app.utils.urls import UnsafeURLError, check_public_url
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+router = APIRouter(route_class=FastRoute)
+
+@router.post("/jobs/detect", response_model=JobSubmitResponse, status_code=202)
+async def submit_detection_job(
+    image: UploadFile = File(...),
+    userId: str = Form(None),
+    sessionId: str = Form(None),
+    location: str = Form(None),
+    clientKey: str = Form(None),
+    webhookUrl: str = Form(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    service: JobService = Depends(get_job_service)
+):
+    """
+    Queue a snake detection and return immediately
+
+    Poll the returned URL (optionally with ?wait=seconds to long-poll) or pass
+    webhookUrl (https, on a public host) to receive the finished job as a
+    signed POST. Resubmitting the same image with the same client key and
+    userId returns the existing job.
+    """
+    try:
+        if webhookUrl:
+            try:
+                await check_public_url(webhookUrl, settings.JOBS_WEBHOOK_ALLOWED_HOSTS)
+            except UnsafeURLError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid webhookUrl: {e}")
+
+        image_data = await image.read()
+        if not image_data:
+            raise HTTPException(status_code=400, detail="Empty image upload")
+
+        job, created = await service.submit(
+            image_data,
+            image.content_type or "image/jpeg",
+            client_key=idempotency_key or clientKey or "",
+            webhook_url=webhookUrl,
+            user_id=userId,
+            session_id=sessionId,
+            location=location,
+        )
+        return JobSubmitResponse(
+            job_id=job.job_id,
+            status=job.status,
+            created=created,
+            poll_url=f"/api/v1/jobs/{job.job_id}",
+        )
+
+    except (SnaKToxAIException, HTTPException):
+        raise
+    except Exception as e:
+        logger.error("Detection job submit error", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=DetectionJob)
+async def get_detection_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish"),
+    service: JobService = Depends(get_job_service)
+):
+    """
+    Get the state of a detection job, long-polling up to `wait` seconds
+    """
+    if wait > 0:
+        job = await service.wait(job_id, min(wait, settings.JOBS_LONG_POLL_MAX_SECONDS))
+    else:
+        job = await service.get(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.public()
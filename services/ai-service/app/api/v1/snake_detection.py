@@ -2,25 +2,63 @@
 Snake detection API endpoints
 """
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile, File, Form
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError as PydanticValidationError
+from app.core.admission import AdmissionController, Priority, get_admission_controller
+from app.core.config import settings
+from app.core.memory_budget import image_memory
+from app.core.exceptions import SnaKToxAIException, SnakeDetectionError, ValidationError
+from app.core.responses import FastRoute
 from app.models.snake_detection import SnakeDetectionRequest, SnakeDetectionResponse
 from app.services.snake_detection_service import SnakeDetectionService
+from app.services.usage import usage_scope
+from app.utils.data_url import DataURLBodyParser, DataURLError, DecodedImage, ImageTooLarge, describe_image_url
 from app.core.logging import get_logger
-import base64
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 # Dependency injection
 def get_snake_detection_service() -> SnakeDetectionService:
     """Get snake detection service instance"""
     return SnakeDetectionService()
 
-@router.post("/predict", response_model=SnakeDetectionResponse)
+async def read_detection_request(http_request: Request) -> Tuple[SnakeDetectionRequest, Optional[DecodedImage]]:
+    """Parse a predict body, decoding a data-URL image as it streams in"""
+    parser = DataURLBodyParser("image_url", settings.UPLOAD_MAX_BYTES)
+    try:
+        async for chunk in http_request.stream():
+            parser.feed(chunk)
+        fields, image = parser.close()
+    except ImageTooLarge as e:
+        raise SnakeDetectionError(str(e), 413)
+    except (DataURLError, ValueError) as e:
+        # Anything else the parser rejects is malformed client input as well
+        raise ValidationError(str(e))
+    try:
+        return SnakeDetectionRequest(**fields), image
+    except PydanticValidationError as e:
+        # Same error locations FastAPI reports for a declared body
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+
+# The body is parsed by read_detection_request, so describe it for the docs here
+PREDICT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": SnakeDetectionRequest.model_json_schema()}},
+    }
+}
+
+@router.post("/predict", response_model=SnakeDetectionResponse, openapi_extra=PREDICT_REQUEST_BODY)
 async def detect_snake(
-    request: SnakeDetectionRequest,
-    service: SnakeDetectionService = Depends(get_snake_detection_service)
+    http_request: Request,
+    service: SnakeDetectionService = Depends(get_snake_detection_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    _memory: int = Depends(image_memory(base64_encoded=True))
 ):
     """
     Detect snake species from image URL
@@ -28,11 +66,24 @@ async def detect_snake(
     This endpoint uses external AI APIs (OpenAI Vision or Google Vision) to identify
     snake species from uploaded images. It provides detailed information about the
     identified snake including venom type, severity, and first aid recommendations.
+    
+    Data-URL images are decoded while the body streams in and are limited to
+    UPLOAD_MAX_BYTES once decoded.
     """
+    request, image = await read_detection_request(http_request)
     try:
-        logger.info("Snake detection request received", image_url=str(request.image_url))
+        logger.info("Snake detection request received", image_url=describe_image_url(request.image_url))
         
-        result = await service.detect_snake(request)
+        # Detections back SOS reports and are always critical
+        with usage_scope("predict", request.user_id, critical=True):
+            async with admission.slot(Priority.CRITICAL):
+                if image is not None:
+                    result = await service.detect_image(
+                        image.data, image.mime_type, request.confidence_threshold,
+                        request.location, request.session_id
+                    )
+                else:
+                    result = await service.detect_snake(request)
         
         if not result.success:
             raise HTTPException(status_code=400, detail=result.error)
@@ -42,6 +93,8 @@ async def detect_snake(
         
         return result
         
+    except SnaKToxAIException:
+        raise
     except Exception as e:
         logger.error("Snake detection endpoint error", error=str(e))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -52,7 +105,9 @@ async def upload_and_detect_snake(
     userId: str = Form(...),
     sessionId: str = Form(...),
     location: str = Form(None),
-    service: SnakeDetectionService = Depends(get_snake_detection_service)
+    service: SnakeDetectionService = Depends(get_snake_detection_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    _memory: int = Depends(image_memory())
 ):
     """
     Upload image file and detect snake species
@@ -66,20 +121,13 @@ async def upload_and_detect_snake(
         
         # Read the uploaded file
         image_data = await image.read()
-        
-        # Convert to base64 data URL
         mime_type = image.content_type or "image/jpeg"
-        base64_data = base64.b64encode(image_data).decode('utf-8')
-        data_url = f"data:{mime_type};base64,{base64_data}"
-        
-        # Create detection request
-        request = SnakeDetectionRequest(
-            image_url=data_url,
-            confidence_threshold=0.7
-        )
         
-        # Process the detection
-        result = await service.detect_snake(request)
+        # Process the detection on the raw bytes
+        # Detections back SOS reports and are always critical
+        with usage_scope("upload-and-detect", userId, critical=True):
+            async with admission.slot(Priority.CRITICAL):
+                result = await service.detect_image(image_data, mime_type, 0.7, location, sessionId)
         
         if not result.success:
             raise HTTPException(status_code=400, detail=result.error)
@@ -89,18 +137,24 @@ async def upload_and_detect_snake(
         
         return result
         
+    except SnaKToxAIException:
+        raise
     except Exception as e:
         logger.error("Snake detection upload endpoint error", error=str(e))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/species")
-async def get_supported_species():
+async def get_supported_species(
+    admission: AdmissionController = Depends(get_admission_controller)
+):
     """
     Get list of supported snake species
     
     Returns a list of snake species that can be identified by the AI service,
     along with their basic information.
     """
+    admission.check(Priority.LOW)
+    
     # This would typically come from a database
     # For now, return a mock list of common African snakes
     species_list = [
@@ -0,0 +1,66 @@
+"""
+Resumable image upload endpoints
+
+Protocol: POST /uploads with the image size (and SHA-256 if known), then PATCH
+/uploads/{id} with raw chunk bytes and an Upload-Offset header, optionally
+Upload-Chunk-SHA256. After a dropped connection, GET /uploads/{id} returns the
+offset to resume from. The final chunk starts detection as a job.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request, Response
+from app.core.responses import FastRoute
+from app.models.uploads import UploadCreateRequest, UploadStatus
+from app.services.upload_service import UploadService, get_upload_service
+
+router = APIRouter(route_class=FastRoute)
+
+@router.post("/uploads", response_model=UploadStatus, status_code=201)
+async def create_upload(
+    request: UploadCreateRequest,
+    response: Response,
+    service: UploadService = Depends(get_upload_service)
+):
+    """
+    Start a resumable upload
+
+    When `sha256` matches an image detected recently, the result is returned
+    immediately and no upload is needed.
+    """
+    status = await service.create(request)
+    response.headers["Upload-Offset"] = str(status.offset)
+    if status.upload_id:
+        response.headers["Location"] = f"/api/v1/uploads/{status.upload_id}"
+    else:
+        response.status_code = 200
+    return status
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatus)
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    service: UploadService = Depends(get_upload_service)
+):
+    """Get the offset to resume an upload from"""
+    status = service.status(upload_id)
+    response.headers["Upload-Offset"] = str(status.offset)
+    return status
+
+@router.patch("/uploads/{upload_id}", response_model=UploadStatus)
+async def append_upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_chunk_sha256: Optional[str] = Header(None, alias="Upload-Chunk-SHA256"),
+    service: UploadService = Depends(get_upload_service)
+):
+    """
+    Append a chunk of raw image bytes at Upload-Offset
+
+    A mismatched offset returns 409 with the expected Upload-Offset.
+    """
+    status = await service.append(upload_id, upload_offset, request.stream(), upload_chunk_sha256)
+    response.headers["Upload-Offset"] = str(status.offset)
+    return status
@@ -0,0 +1,191 @@
+"""
+Priority-aware admission control for upstream-bound work
+
+Requests take a slot before reaching the service layer. The number of slots
+adapts to observed latency (AIMD: +1/limit per fast completion, multiplied by
+ADMISSION_DECREASE_FACTOR when completions are slow or fail). When no slot is
+free, requests wait in bounded per-priority queues served highest priority
+first; a few slots are reserved for critical work. Requests whose queue is full
+or whose wait times out are shed with 503 and Retry-After.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.exceptions import OverloadedError
+from app.core.logging import get_logger
+from app.core.metrics import (
+    ADMISSION_INFLIGHT,
+    ADMISSION_LIMIT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT,
+)
+
+logger = get_logger(__name__)
+
+class Priority(IntEnum):
+    """Admission priority classes, lower value is served first"""
+    CRITICAL = 0
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+class AdmissionController:
+    """Bounded, prioritized, latency-adaptive concurrency gate"""
+
+    def __init__(self):
+        self.limit = float(settings.ADMISSION_INITIAL_LIMIT)
+        self.min_limit = settings.ADMISSION_MIN_LIMIT
+        self.max_limit = settings.ADMISSION_MAX_LIMIT
+        self.target_latency = settings.ADMISSION_TARGET_LATENCY
+        self.decrease_factor = settings.ADMISSION_DECREASE_FACTOR
+        self.reserved = settings.ADMISSION_RESERVED_SLOTS
+        self.queue_sizes = {p: settings.ADMISSION_QUEUE_SIZES.get(p.label, 0) for p in Priority}
+        self.queue_timeouts = {p: settings.ADMISSION_QUEUE_TIMEOUTS.get(p.label, 0.0) for p in Priority}
+        self.in_flight = 0
+        self.ewma_latency = 0.0
+        self._last_decrease = 0.0
+        self._queues: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+
+    def _capacity(self, priority: Priority) -> int:
+        """Slots usable by a priority class; non-critical work leaves some in reserve"""
+        limit = int(self.limit)
+        if priority == Priority.CRITICAL:
+            return limit
+        return max(limit - self.reserved, 1)
+
+    def _has_waiters(self, up_to: Priority) -> bool:
+        return any(self._queues[p] for p in Priority if p <= up_to)
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait, from queue depth and recent latency"""
+        queued = sum(len(q) for q in self._queues.values())
+        estimate = (self.ewma_latency or 1.0) * (queued + 1) / max(int(self.limit), 1)
+        return int(min(max(math.ceil(estimate), settings.ADMISSION_RETRY_AFTER), 60))
+
+    def _reject(self, priority: Priority, reason: str) -> OverloadedError:
+        ADMISSION_REJECTED.labels(priority=priority.label, reason=reason).inc()
+        retry_after = self.retry_after()
+        logger.warning("Request shed", priority=priority.label, reason=reason,
+                       in_flight=self.in_flight, limit=int(self.limit), retry_after=retry_after)
+        return OverloadedError(retry_after=retry_after)
+
+    def check(self, priority: Priority) -> None:
+        """Shed immediately if a request of this priority could not start now
+
+        For cheap routes that never call upstream and so do not need a slot.
+        """
+        if not settings.ADMISSION_ENABLED:
+            return
+        if self.in_flight >= self._capacity(priority) and self._has_waiters(Priority.LOW):
+            raise self._reject(priority, "overloaded")
+
+    def has_idle_capacity(self, priority: Priority) -> bool:
+        """Whether work of this priority could start now without anyone waiting"""
+        if not settings.ADMISSION_ENABLED:
+            return True
+        return self.in_flight < self._capacity(priority) and not self._has_waiters(Priority.LOW)
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self.in_flight < self._capacity(priority) and not self._has_waiters(priority):
+            self.in_flight += 1
+            return
+
+        queue = self._queues[priority]
+        if len(queue) >= self.queue_sizes[priority]:
+            raise self._reject(priority, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        ADMISSION_QUEUE_DEPTH.labels(priority=priority.label).set(len(queue))
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeouts[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+                if waiter in queue:
+                    queue.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(priority=priority.label).set(len(queue))
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(priority, "queue_timeout")
+            raise
+        ADMISSION_WAIT.labels(priority=priority.label).observe(time.monotonic() - start)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued waiters, highest priority first"""
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self.in_flight < self._capacity(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.in_flight += 1
+                waiter.set_result(None)
+            ADMISSION_QUEUE_DEPTH.labels(priority=priority.label).set(len(queue))
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _record(self, latency: float, ok: bool) -> None:
+        """AIMD update of the concurrency limit from one completion"""
+        self.ewma_latency = latency if not self.ewma_latency else 0.2 * latency + 0.8 * self.ewma_latency
+        now = time.monotonic()
+        if not ok or latency > self.target_latency:
+            # At most one decrease per target-latency window
+            if now - self._last_decrease > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        ADMISSION_LIMIT.set(int(self.limit))
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        """Hold an admission slot for the duration of the block"""
+        if not settings.ADMISSION_ENABLED:
+            yield
+            return
+        await self._acquire(priority)
+        ADMISSION_INFLIGHT.set(self.in_flight)
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._record(time.monotonic() - start, ok)
+            self._release_slot()
+            ADMISSION_INFLIGHT.set(self.in_flight)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "ewma_latency_s": round(self.ewma_latency, 3),
+            "queued": {p.label: len(q) for p, q in self._queues.items()},
+        }
+
+_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide admission controller"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
@@ -0,0 +1,54 @@
+"""
+Request body size limit
+
+Enforced while the body streams in: a declared Content-Length over the limit
+is refused before anything is read, and a body that turns out larger (chunked
+or lying about its length) fails as soon as the running count passes the
+limit. Both give 413. Paths under an exempt prefix enforce their own limits.
+"""
+
+from typing import Sequence
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+class BodyTooLarge(HTTPException):
+    """Raised from receive() once a body passes the limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Request body exceeds {limit} bytes")
+
+class BodySizeLimitMiddleware:
+    """Pure ASGI middleware capping request bodies at max_bytes"""
+
+    def __init__(self, app: ASGIApp, max_bytes: int, exempt_prefixes: Sequence[str] = ()):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.max_bytes or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_bytes:
+                    error = BodyTooLarge(self.max_bytes)
+                    await JSONResponse({"detail": error.detail}, status_code=413)(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise BodyTooLarge(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
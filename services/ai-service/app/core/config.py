@@ -4,7 +4,7 @@ Configuration settings for SnaKTox AI Service
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator, model_validator
-from typing import List, Optional, Union, Any
+from typing import List, Dict, Optional, Union, Any
 import os
 import json
 
@@ -27,6 +27,19 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     
+    # Production Server (see app/core/server.py)
+    WORKERS: int = 1  # 0 = one worker per CPU
+    SERVER_LOOP: str = "auto"  # auto | uvloop | asyncio
+    SERVER_HTTP: str = "auto"  # auto | httptools | h11
+    SERVER_KEEPALIVE: int = 5
+    SERVER_BACKLOG: int = 2048
+    SERVER_MAX_REQUESTS: int = 0  # recycle workers after N requests, 0 = never
+    SERVER_MAX_REQUESTS_JITTER: int = 0
+    SERVER_TIMEOUT: int = 120
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_PRELOAD: bool = True
+    STARTUP_WARMUP: bool = False  # pre-connect to upstreams in the background after startup
+    
     # Security
     SECRET_KEY: str = "snaktox-ai-secret-key-change-in-production"
     ALLOWED_HOSTS: Union[str, List[str]] = ["*"]
@@ -97,7 +110,165 @@ class Settings(BaseSettings):
     GEMINI_MODEL: str = "gemini-pro"  # Updated to use stable model name
     GEMINI_VISION_MODEL: str = "gemini-pro-vision"  # Updated to use stable model name
     VISION_CONFIDENCE_THRESHOLD: float = 0.7
-    
+
+    # Model Providers
+    # JSON list of {"name", "kind": "gemini"|"http", "model", "tier": "fast"|"standard"|"reliable",
+    # "capabilities": ["text", "vision"], "cost", "base_url", "timeout"}.
+    # When empty, providers are derived from GEMINI_MODEL and GEMINI_VISION_MODEL.
+    MODEL_PROVIDERS: List[Dict[str, Any]] = []
+    ROUTER_EWMA_ALPHA: float = 0.2
+    ROUTER_LATENCY_WEIGHT: float = 1.0
+    ROUTER_ERROR_WEIGHT: float = 5.0
+    ROUTER_COST_WEIGHT: float = 0.5
+    ROUTER_MAX_ATTEMPTS: int = 3
+    ROUTER_ERROR_COOLDOWN: float = 30.0
+    ROUTER_COOLDOWN_FAILURES: int = 3  # consecutive failures before a provider cools down
+
+    # Prompt Budget
+    PROMPT_TOKEN_BUDGET: int = 1500
+    PROMPT_MIN_QUERY_TOKENS: int = 64  # query tokens kept however tight the budget; checked at startup
+    PROMPT_CONTEXT_CACHING: bool = True
+    PROMPT_CACHE_TTL_SECONDS: int = 3600
+
+    # Conversation Context
+    CONTEXT_STORE_BACKEND: str = "memory"  # memory | redis
+    REDIS_URL: Optional[str] = None
+    CONTEXT_TTL_SECONDS: int = 1800
+    CONTEXT_MAX_SESSIONS: int = 10000
+    CONTEXT_MAX_TURNS: int = 20
+    CONTEXT_MAX_TURN_CHARS: int = 2000
+    CONTEXT_SUMMARY_TOKENS: int = 300
+
+    # Guidance Retrieval
+    RETRIEVAL_ENABLED: bool = True
+    GUIDANCE_CORPUS_PATH: Optional[str] = None  # defaults to app/data/guidance/corpus.json
+    GUIDANCE_INDEX_PATH: Optional[str] = None  # defaults to app/data/guidance/bm25.json
+    RETRIEVAL_TOP_K: int = 3
+    RETRIEVAL_TOKEN_BUDGET: int = 400  # prompt tokens for retrieved passages
+    RETRIEVAL_ANSWER_CONFIDENCE: float = 0.85  # answer from the top passage without an LLM call
+
+    # Answer Pack
+    ANSWER_PACK_ENABLED: bool = True
+    ANSWER_PACK_PATH: Optional[str] = None  # defaults to app/data/answer_pack/answers.pack
+    ANSWER_PACK_REFRESH_SECONDS: float = 60.0
+
+    # Admission Control
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INITIAL_LIMIT: int = 16
+    ADMISSION_MIN_LIMIT: int = 2
+    ADMISSION_MAX_LIMIT: int = 64
+    ADMISSION_TARGET_LATENCY: float = 8.0  # seconds; slower completions shrink the limit
+    ADMISSION_DECREASE_FACTOR: float = 0.7
+    ADMISSION_RESERVED_SLOTS: int = 2  # only critical work may use these
+    ADMISSION_QUEUE_SIZES: Dict[str, int] = {"critical": 256, "high": 64, "normal": 32, "low": 8}
+    ADMISSION_QUEUE_TIMEOUTS: Dict[str, float] = {"critical": 60.0, "high": 20.0, "normal": 10.0, "low": 2.0}
+    ADMISSION_RETRY_AFTER: int = 5
+
+    # Detection Jobs
+    JOBS_BACKEND: str = "memory"  # "memory" or "redis" (uses REDIS_URL)
+    JOBS_CONCURRENCY: int = 4
+    JOBS_QUEUE_SIZE: int = 100
+    JOBS_QUEUE_MAX_BYTES: int = 64 * 1024 * 1024  # image bytes held by queued jobs
+    JOBS_RESULT_TTL_SECONDS: int = 3600
+    JOBS_MAX_STORED: int = 10000
+    JOBS_LONG_POLL_MAX_SECONDS: float = 30.0
+    JOBS_WEBHOOK_TIMEOUT: float = 10.0
+    JOBS_WEBHOOK_RETRIES: int = 3
+    JOBS_WEBHOOK_ALLOWED_HOSTS: List[str] = []  # webhook hosts (and subdomains); empty = any public https host
+
+    # Detection Cache
+    DETECTION_CACHE_TTL_SECONDS: int = 3600
+    DETECTION_CACHE_MAX_ENTRIES: int = 1000
+
+    # Resumable Uploads
+    UPLOAD_DIR: Optional[str] = None  # defaults to <tmp>/snaktox-uploads
+    UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024
+    UPLOAD_MAX_CHUNK_BYTES: int = 4 * 1024 * 1024
+    UPLOAD_TTL_SECONDS: int = 86400
+    IMAGE_FETCH_TIMEOUT: float = 10.0  # seconds to download an image_url
+
+    # Hospital Index
+    HOSPITAL_DATA_PATH: Optional[str] = None  # exported hospitals JSON; defaults to app/data/hospitals/hospitals.json
+    HOSPITAL_REFRESH_SECONDS: float = 300.0
+    NEARBY_FACILITIES_K: int = 3
+    NEARBY_FACILITIES_MAX_KM: float = 500.0
+
+    # Diagnostics
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL: float = 0.1  # seconds between lag samples
+    LOOP_WATCHDOG_ENABLED: bool = False  # capture stacks of blocking calls (staging)
+    LOOP_BLOCK_THRESHOLD: float = 0.2  # seconds the loop may stall before a stack is captured
+    LOOP_BLOCK_HISTORY: int = 50
+    DEBUG_ENDPOINTS_ENABLED: bool = False
+
+    # Tracing
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.1  # fraction of requests without an incoming traceparent
+    TRACING_EXPORTER: str = "file"  # "file", "otlp" or "none"
+    TRACING_FILE_PATH: str = "traces.ndjson"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_EXPORT_INTERVAL: float = 1.0
+    TRACING_BATCH_SIZE: int = 256
+    TRACING_QUEUE_SIZE: int = 2048
+    SERVER_TIMING_ENABLED: bool = False  # also records unsampled requests, for the header only
+
+    # Admin Profiling
+    ADMIN_ENDPOINTS_ENABLED: bool = False  # also requires a non-default SECRET_KEY
+    ADMIN_TOKEN_ALGORITHM: str = "HS256"
+    PROFILER_MAX_SECONDS: float = 60.0
+    TRACEMALLOC_FRAMES: int = 10
+
+    # Upstream Usage and Budgets (tokens per UTC day, 0 = unlimited)
+    USAGE_DAILY_TOKEN_BUDGET: int = 0
+    USAGE_USER_DAILY_TOKEN_BUDGET: int = 0
+    USAGE_ROUTE_DAILY_TOKEN_BUDGETS: Dict[str, int] = {}  # e.g. {"chat": 2000000}
+    USAGE_BUDGET_EXEMPT_CRITICAL: bool = True  # detections and emergency chats ignore budgets
+    USAGE_FLUSH_SECONDS: float = 60.0
+    USAGE_FLUSH_PATH: Optional[str] = None  # NDJSON usage deltas; log only when unset
+    CHAT_CACHE_TTL_SECONDS: int = 3600
+    CHAT_CACHE_MAX_ENTRIES: int = 5000
+
+    # API Responses
+    FAST_JSON_RESPONSES: bool = True  # encode with pydantic-core/orjson, skip re-validating built models
+
+    # Speculative Prefetch (see app/services/prefetch.py)
+    PREFETCH_ENABLED: bool = False
+    PREFETCH_QUEUE_SIZE: int = 32  # pending prefetches; more are dropped
+    PREFETCH_MAX_FOLLOW_UPS: int = 3  # follow-up questions warmed per chat answer
+    PREFETCH_DAILY_TOKEN_BUDGET: int = 200000  # tokens per UTC day, 0 = unlimited
+
+    # Internal API (backend-to-AI-service, see app/api/v1/internal.py)
+    INTERNAL_API_ENABLED: bool = False
+    INTERNAL_API_TOKEN: Optional[str] = None  # shared secret callers send as "Authorization: Bearer"; required
+    INTERNAL_BATCH_MAX_ITEMS: int = 16
+    INTERNAL_BATCH_CONCURRENCY: int = 4  # detections run at once per batch
+
+    # Request Bodies (images are also capped at UPLOAD_MAX_BYTES once decoded)
+    REQUEST_MAX_BODY_BYTES: int = 28 * 1024 * 1024  # base64 of UPLOAD_MAX_BYTES plus headroom
+
+    # Image Memory Budget (see app/core/memory_budget.py)
+    IMAGE_MEMORY_BUDGET_BYTES: int = 160 * 1024 * 1024  # bytes reserved by in-flight images, 0 = unlimited
+    IMAGE_MEMORY_COPIES: float = 3.0  # copies of a decoded image held during a detection
+    IMAGE_MEMORY_QUEUE_TIMEOUT: float = 15.0  # seconds to wait for a reservation before 503
+
+    # Cache Snapshots (see app/services/cache_snapshots.py)
+    CACHE_SNAPSHOT_DIR: Optional[str] = None  # persistent directory for cache snapshots, unset = off
+    CACHE_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+
+    # Analytics Export (see app/services/analytics.py)
+    ANALYTICS_DIR: Optional[str] = None  # directory for NDJSON.gz event files, unset = off
+    ANALYTICS_QUEUE_SIZE: int = 8192  # events held before new ones are dropped
+    ANALYTICS_BATCH_SIZE: int = 1000
+    ANALYTICS_FLUSH_INTERVAL: float = 5.0
+
+    # Shadow Evaluation (see app/services/shadow.py)
+    SHADOW_PROVIDER: Dict[str, Any] = {}  # MODEL_PROVIDERS-style entry for the candidate vision model, empty = off
+    SHADOW_SAMPLE_RATE: float = 0.05  # fraction of upstream detections repeated on the candidate
+    SHADOW_CONCURRENCY: int = 2
+    SHADOW_QUEUE_SIZE: int = 4
+    SHADOW_DAILY_TOKEN_BUDGET: int = 100000  # tokens per day for shadow calls, 0 = unlimited
+    SHADOW_REPORT_WINDOW: int = 500  # recent comparisons summarized by /admin/shadow
+
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     
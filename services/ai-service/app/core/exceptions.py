@@ -35,3 +35,25 @@ class ValidationError(SnaKToxAIException):
     
     def __init__(self, message: str, status_code: int = 422):
         super().__init__(f"Validation error: {message}", status_code)
+
+class OverloadedError(SnaKToxAIException):
+    """Exception for requests shed by admission control"""
+    
+    def __init__(self, retry_after: int, message: str = "Service overloaded, please retry later"):
+        self.retry_after = retry_after
+        super().__init__(message, 503)
+
+class BudgetExhaustedError(SnaKToxAIException):
+    """Exception for upstream work refused by an exhausted daily token budget"""
+    
+    def __init__(self, budget: str, retry_after: int):
+        self.budget = budget
+        self.retry_after = retry_after
+        super().__init__(f"Daily token budget exhausted ({budget}), please retry later", 429)
+
+class UploadError(SnaKToxAIException):
+    """Exception for resumable upload errors"""
+    
+    def __init__(self, message: str, status_code: int = 400, offset: int = None):
+        self.offset = offset
+        super().__init__(f"Upload error: {message}", status_code)
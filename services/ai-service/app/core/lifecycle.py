@@ -0,0 +1,51 @@
+"""
+In-flight work tracking for graceful shutdown
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class InflightTracker:
+    """Count running units of work so shutdown can wait for them to finish"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def active(self) -> int:
+        return sum(self._counts.values())
+
+    def snapshot(self) -> Dict[str, int]:
+        return {kind: count for kind, count in self._counts.items() if count}
+
+    @asynccontextmanager
+    async def track(self, kind: str):
+        self._counts[kind] = self._counts.get(kind, 0) + 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._counts[kind] -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for in-flight work; True if everything finished"""
+        if not self.active:
+            return True
+        logger.info("Draining in-flight work", inflight=self.snapshot(), timeout=timeout)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Drain timed out, abandoning in-flight work", inflight=self.snapshot())
+            return False
+
+inflight = InflightTracker()
@@ -0,0 +1,151 @@
+"""
+Event-loop lag monitoring and blocking-call detection
+
+A monitor task sleeps for a fixed interval and records how late it wakes up;
+that delay is the event-loop lag every other request saw at that moment, and is
+exported as a histogram. With the watchdog enabled, a background thread also
+watches the monitor's heartbeat: when the loop has not advanced for longer than
+LOOP_BLOCK_THRESHOLD, it captures the loop thread's current stack, which points
+at the synchronous call holding the loop. Captured blocks are kept in a short
+history for the debug endpoint.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import LOOP_BLOCKS, LOOP_LAG
+
+logger = get_logger(__name__)
+
+# Recent lag samples kept for the debug endpoint's percentiles
+_RECENT_SAMPLES = 600
+
+class BlockEvent:
+    """One stall of the event loop and the stack that caused it"""
+
+    __slots__ = ("started_at", "duration", "stack")
+
+    def __init__(self, started_at: float, duration: float, stack: List[str]):
+        self.started_at = started_at
+        self.duration = duration
+        self.stack = stack
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "duration_ms": round(self.duration * 1000, 1),
+            "stack": self.stack,
+        }
+
+class LoopMonitor:
+    """Lag sampler task plus optional stall watchdog thread"""
+
+    def __init__(self, interval: float, threshold: float, history: int, watchdog: bool):
+        self.interval = interval
+        self.threshold = threshold
+        self.watchdog_enabled = watchdog
+        self.samples: Deque[float] = deque(maxlen=_RECENT_SAMPLES)
+        self.blocks: Deque[BlockEvent] = deque(maxlen=history)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._current: Optional[BlockEvent] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._sample())
+        if self.watchdog_enabled:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    async def _sample(self) -> None:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - before - self.interval)
+            self._heartbeat = now
+            self.samples.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        """Watchdog thread: capture the loop's stack once per stall"""
+        poll = max(self.threshold / 4, 0.005)
+        while not self._stop.wait(poll):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold:
+                if self._current is not None:
+                    self._current = None
+                continue
+            if self._current is not None and self._current.started_at == heartbeat:
+                # Same stall as last poll: just extend its duration
+                self._current.duration = stalled
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            event = BlockEvent(heartbeat, stalled, [line.rstrip() for line in stack])
+            self._current = event
+            self.blocks.append(event)
+            LOOP_BLOCKS.inc()
+            # Innermost application frame is the most useful single line
+            culprit = next((line for line in reversed(event.stack) if "/app/" in line), stack[-1] if stack else "")
+            logger.warning("Event loop blocked", threshold_ms=int(self.threshold * 1000),
+                           culprit=culprit.strip().splitlines()[0] if culprit else None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 2)
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "block_threshold_ms": self.threshold * 1000,
+            "watchdog": self.watchdog_enabled,
+            "lag_ms": {"samples": len(samples), "p50": pct(50), "p99": pct(99), "max": pct(100)},
+            # started_at is monotonic; convert to wall-clock for display
+            "blocks": [
+                BlockEvent(time.time() - (time.monotonic() - b.started_at), b.duration, b.stack).to_dict()
+                for b in reversed(self.blocks)
+            ],
+        }
+
+_monitor: Optional[LoopMonitor] = None
+
+def get_loop_monitor() -> LoopMonitor:
+    """Process-wide loop monitor"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopMonitor(
+            interval=settings.LOOP_MONITOR_INTERVAL,
+            threshold=settings.LOOP_BLOCK_THRESHOLD,
+            history=settings.LOOP_BLOCK_HISTORY,
+            watchdog=settings.LOOP_WATCHDOG_ENABLED,
+        )
+    return _monitor
@@ -0,0 +1,151 @@
+"""
+Memory budget for in-flight images
+
+Every detection holds a few copies of its image at once: the decoded bytes,
+the provider's encoding of them and the upstream request body. Without a cap,
+a burst of large uploads can exhaust a small instance. ``MemoryBudget`` is a
+byte-weighted semaphore: each image reserves its estimated footprint before
+its body is read and releases it once the upstream call is done. Requests that
+do not fit wait first-come first-served, so large images are not starved by
+small ones. After IMAGE_MEMORY_QUEUE_TIMEOUT they are shed with 503 and
+Retry-After. An image larger than the whole budget may still run, but only
+alone.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Optional, Tuple
+
+from fastapi import Request
+
+from app.core.config import settings
+from app.core.exceptions import OverloadedError
+from app.core.logging import get_logger
+from app.core.metrics import (
+    IMAGE_MEMORY_PEAK,
+    IMAGE_MEMORY_QUEUED,
+    IMAGE_MEMORY_REJECTED,
+    IMAGE_MEMORY_RESERVED,
+    IMAGE_MEMORY_WAIT,
+)
+
+logger = get_logger(__name__)
+
+def image_footprint(size: Optional[int], base64_encoded: bool = False) -> int:
+    """Bytes a detection holds for an image whose body is size bytes long"""
+    if size is None:
+        decoded = settings.UPLOAD_MAX_BYTES
+    else:
+        decoded = size * 3 // 4 if base64_encoded else size
+    return int(decoded * settings.IMAGE_MEMORY_COPIES)
+
+class MemoryBudget:
+    """Byte-weighted FIFO semaphore"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.reserved = 0
+        self.peak = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def _grant(self, nbytes: int) -> None:
+        self.reserved += nbytes
+        self.peak = max(self.peak, self.reserved)
+        IMAGE_MEMORY_RESERVED.set(self.reserved)
+        IMAGE_MEMORY_PEAK.set(self.peak)
+
+    def _release(self, nbytes: int) -> None:
+        self.reserved -= nbytes
+        IMAGE_MEMORY_RESERVED.set(self.reserved)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant queued reservations in arrival order while they fit"""
+        while self._waiters:
+            nbytes, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.reserved + nbytes > self.capacity:
+                break
+            self._waiters.popleft()
+            self._grant(nbytes)
+            waiter.set_result(None)
+        IMAGE_MEMORY_QUEUED.set(len(self._waiters))
+
+    async def _acquire(self, nbytes: int, timeout: float) -> None:
+        if not self._waiters and self.reserved + nbytes <= self.capacity:
+            self._grant(nbytes)
+            return
+
+        entry = (nbytes, asyncio.get_running_loop().create_future())
+        self._waiters.append(entry)
+        IMAGE_MEMORY_QUEUED.set(len(self._waiters))
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(entry[1]), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            waiter = entry[1]
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up; hand it on
+                self._release(nbytes)
+            else:
+                waiter.cancel()
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                # A large waiter at the head may have been holding others back
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                IMAGE_MEMORY_REJECTED.inc()
+                logger.warning("Image shed, memory budget exhausted", bytes=nbytes,
+                               reserved=self.reserved, queued=len(self._waiters))
+                raise OverloadedError(retry_after=settings.ADMISSION_RETRY_AFTER)
+            raise
+        IMAGE_MEMORY_WAIT.observe(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[None]:
+        """Hold nbytes of the budget for the duration of the block"""
+        if not self.capacity:
+            yield
+            return
+        nbytes = max(1, min(nbytes, self.capacity))
+        await self._acquire(nbytes, settings.IMAGE_MEMORY_QUEUE_TIMEOUT)
+        try:
+            yield
+        finally:
+            self._release(nbytes)
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "reserved": self.reserved,
+            "peak": self.peak,
+            "queued": len(self._waiters),
+        }
+
+_budget: Optional[MemoryBudget] = None
+
+def get_image_budget() -> MemoryBudget:
+    """Process-wide image memory budget"""
+    global _budget
+    if _budget is None:
+        _budget = MemoryBudget(settings.IMAGE_MEMORY_BUDGET_BYTES)
+    return _budget
+
+def image_memory(base64_encoded: bool = False) -> Callable[[Request], AsyncIterator[int]]:
+    """Dependency reserving memory for the image in the request body
+
+    Sized from Content-Length (the largest allowed image when it is missing)
+    and held until the response has been produced.
+    """
+    async def reserve_image_memory(request: Request) -> AsyncIterator[int]:
+        declared = request.headers.get("content-length")
+        size = int(declared) if declared and declared.isdigit() else None
+        nbytes = image_footprint(size, base64_encoded)
+        async with get_image_budget().reserve(nbytes):
+            yield nbytes
+
+    return reserve_image_memory
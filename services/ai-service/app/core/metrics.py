@@ -0,0 +1,249 @@
+"""
+Prometheus metrics for SnaKTox AI Service
+
+prometheus_client is only imported when a metric is first touched (or /metrics
+is scraped), keeping it off the cold-start import path.
+"""
+
+from typing import Any, List, Optional
+
+_LAZY_METRICS: List["LazyMetric"] = []
+
+class LazyMetric:
+    """Declares a metric now and creates the prometheus_client object on first use"""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames=(), **kwargs: Any):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kwargs = kwargs
+        self._metric: Optional[Any] = None
+        _LAZY_METRICS.append(self)
+
+    def get(self) -> Any:
+        if self._metric is None:
+            import prometheus_client
+
+            metric_class = getattr(prometheus_client, self.kind)
+            self._metric = metric_class(self.name, self.documentation, self.labelnames, **self.kwargs)
+        return self._metric
+
+    def labels(self, *args: Any, **kwargs: Any) -> Any:
+        return self.get().labels(*args, **kwargs)
+
+    def __getattr__(self, attr: str) -> Any:
+        # inc/observe/set on unlabelled metrics
+        return getattr(self.get(), attr)
+
+def Counter(name: str, documentation: str, labelnames=(), **kwargs: Any) -> LazyMetric:
+    return LazyMetric("Counter", name, documentation, labelnames, **kwargs)
+
+def Histogram(name: str, documentation: str, labelnames=(), **kwargs: Any) -> LazyMetric:
+    return LazyMetric("Histogram", name, documentation, labelnames, **kwargs)
+
+def Gauge(name: str, documentation: str, labelnames=(), **kwargs: Any) -> LazyMetric:
+    return LazyMetric("Gauge", name, documentation, labelnames, **kwargs)
+
+def render_latest() -> tuple:
+    """Materialize every declared metric and return (payload, content type)"""
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    for metric in _LAZY_METRICS:
+        metric.get()
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# Model provider routing
+PROVIDER_REQUESTS = Counter(
+    "snaktox_provider_requests_total",
+    "Upstream model calls by provider and outcome",
+    ["provider", "outcome"],
+)
+PROVIDER_LATENCY = Histogram(
+    "snaktox_provider_latency_seconds",
+    "Upstream model call latency by provider",
+    ["provider"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0),
+)
+ROUTER_DECISIONS = Counter(
+    "snaktox_router_decisions_total",
+    "Provider selected by the router per capability and tier",
+    ["capability", "tier", "provider"],
+)
+ROUTER_FAILOVERS = Counter(
+    "snaktox_router_failovers_total",
+    "Requests that had to fail over to another provider",
+    ["capability"],
+)
+
+# Prompt accounting
+PROMPT_TOKENS = Histogram(
+    "snaktox_prompt_tokens",
+    "Estimated prompt tokens per chat request",
+    ["query_type"],
+    buckets=(100, 200, 400, 600, 800, 1000, 1500, 2000, 4000),
+)
+PROMPT_PREFIX_CACHE = Counter(
+    "snaktox_prompt_prefix_cache_total",
+    "Upstream context cache lookups for the static prompt prefix",
+    ["provider", "outcome"],
+)
+
+# Request coalescing
+SINGLEFLIGHT_CALLS = Counter(
+    "snaktox_singleflight_calls_total",
+    "Coalesced calls; leaders run the work, followers share its result",
+    ["flight", "role"],
+)
+
+# Admission control
+ADMISSION_LIMIT = Gauge(
+    "snaktox_admission_limit",
+    "Current adaptive concurrency limit for upstream-bound work",
+)
+ADMISSION_INFLIGHT = Gauge(
+    "snaktox_admission_in_flight",
+    "Requests currently holding an admission slot",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "snaktox_admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ["priority"],
+)
+ADMISSION_WAIT = Histogram(
+    "snaktox_admission_wait_seconds",
+    "Time spent queued before admission",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+ADMISSION_REJECTED = Counter(
+    "snaktox_admission_rejected_total",
+    "Requests shed with 503 by admission control",
+    ["priority", "reason"],
+)
+
+# Asynchronous detection jobs
+JOBS_TOTAL = Counter(
+    "snaktox_jobs_total",
+    "Detection jobs by outcome (submitted, attached, rejected, succeeded, failed)",
+    ["outcome"],
+)
+JOBS_QUEUE_DEPTH = Gauge(
+    "snaktox_jobs_queue_depth",
+    "Detection jobs waiting for a worker",
+)
+
+JOBS_QUEUE_BYTES = Gauge(
+    "snaktox_jobs_queue_bytes",
+    "Image bytes held by detection jobs waiting for a worker",
+)
+
+# Event loop health
+LOOP_LAG = Histogram(
+    "snaktox_event_loop_lag_seconds",
+    "Delay between when the loop monitor should wake and when it does",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_BLOCKS = Counter(
+    "snaktox_event_loop_blocks_total",
+    "Event loop stalls longer than LOOP_BLOCK_THRESHOLD seen by the watchdog",
+)
+
+# Upstream usage
+UPSTREAM_TOKENS = Counter(
+    "snaktox_upstream_tokens_total",
+    "Tokens consumed by upstream model calls",
+    ["route", "kind"],
+)
+BUDGET_DEGRADED = Counter(
+    "snaktox_budget_degraded_total",
+    "Requests answered locally or refused because a daily token budget was exhausted",
+    ["route", "budget"],
+)
+
+# Guidance retrieval
+RETRIEVAL_LATENCY = Histogram(
+    "snaktox_retrieval_seconds",
+    "Time to search the guidance index",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005),
+)
+CHAT_DIRECT_ANSWERS = Counter(
+    "snaktox_chat_direct_answers_total",
+    "Chat queries answered from retrieved guidance without an upstream call",
+    ["query_type"],
+)
+
+# Answer pack
+CHAT_PACK_ANSWERS = Counter(
+    "snaktox_chat_pack_answers_total",
+    "Chat queries answered from the precomputed answer pack",
+    ["language", "reason"],
+)
+
+# Speculative prefetch
+CHAT_PREFETCH = Counter(
+    "snaktox_chat_prefetch_total",
+    "Speculative chat prefetches by outcome; hit over warmed is the hit rate",
+    ["kind", "outcome"],
+)
+
+# Image memory budget
+IMAGE_MEMORY_RESERVED = Gauge(
+    "snaktox_image_memory_reserved_bytes",
+    "Bytes currently reserved by in-flight images",
+)
+IMAGE_MEMORY_PEAK = Gauge(
+    "snaktox_image_memory_peak_bytes",
+    "Highest number of bytes reserved at once since start",
+)
+IMAGE_MEMORY_QUEUED = Gauge(
+    "snaktox_image_memory_queued",
+    "Images waiting for a memory reservation",
+)
+IMAGE_MEMORY_WAIT = Histogram(
+    "snaktox_image_memory_wait_seconds",
+    "Time spent waiting for a memory reservation",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+IMAGE_MEMORY_REJECTED = Counter(
+    "snaktox_image_memory_rejected_total",
+    "Images shed because no memory reservation was granted in time",
+)
+
+# Cache snapshots
+CACHE_SNAPSHOT_RESTORED = Counter(
+    "snaktox_cache_snapshot_restored_total",
+    "Cache entries restored from an on-disk snapshot",
+    ["cache"],
+)
+CACHE_SNAPSHOT_ENTRIES = Gauge(
+    "snaktox_cache_snapshot_entries",
+    "Entries in the last cache snapshot written",
+    ["cache"],
+)
+
+# Analytics export
+ANALYTICS_EVENTS = Counter(
+    "snaktox_analytics_events_total",
+    "Analytics events by outcome: queued, dropped, written or failed",
+    ["event_type", "outcome"],
+)
+
+# Shadow evaluation
+SHADOW_OUTCOMES = Counter(
+    "snaktox_shadow_total",
+    "Shadow detections by outcome: queued, dropped, busy, budget, failed, agree or disagree",
+    ["outcome"],
+)
+SHADOW_CONFIDENCE = Histogram(
+    "snaktox_shadow_confidence",
+    "Detection confidence of the primary and candidate models on shadowed images",
+    ["role"],
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0),
+)
+SHADOW_LATENCY = Histogram(
+    "snaktox_shadow_latency_seconds",
+    "Upstream latency of the primary and candidate models on shadowed images",
+    ["role"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0),
+)
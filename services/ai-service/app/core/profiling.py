@@ -0,0 +1,136 @@
+"""
+On-demand profiling of the running worker
+
+- ``sample_stacks``: statistical CPU profiler. A background thread snapshots
+  every thread's Python stack at a fixed interval and aggregates them into
+  collapsed-stack lines (``frame;frame;frame count``), the input format of
+  flamegraph.pl and speedscope. Nothing is instrumented, so the cost is one
+  stack walk per interval, and it stops when the duration ends.
+- ``allocation_top``: tracemalloc snapshot of the lines holding the most
+  memory, traced for a short window if tracemalloc is not already running.
+- ``object_counts``: live gc-tracked objects by type, plus large strings
+  reachable from them (base64 data URLs that outlive their request show up
+  here).
+
+Each runs off the event loop and only one may run at a time per worker.
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_lock = asyncio.Lock()
+
+class ProfilerBusy(Exception):
+    """Another profiling run is in progress in this worker"""
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _collect_stacks(duration: float, interval: float) -> Dict[str, Any]:
+    """Sample every other thread's stack until duration has passed"""
+    own_id = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    counts: Counter = Counter()
+    samples = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            counts[";".join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    return {"samples": samples, "stacks": counts}
+
+async def sample_stacks(duration: float, interval: float) -> Dict[str, Any]:
+    """Collapsed stacks for the worker over duration seconds"""
+    if _lock.locked():
+        raise ProfilerBusy()
+    async with _lock:
+        logger.info("CPU profile started", duration_s=duration, interval_ms=interval * 1000)
+        result = await asyncio.to_thread(_collect_stacks, duration, interval)
+    stacks: Counter = result["stacks"]
+    collapsed = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+    return {"samples": result["samples"], "collapsed": collapsed + "\n"}
+
+async def allocation_top(duration: float, limit: int, group_by: str = "lineno") -> Dict[str, Any]:
+    """Largest allocation sites; traces for duration seconds if tracemalloc is off"""
+    if _lock.locked():
+        raise ProfilerBusy()
+    async with _lock:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(settings.TRACEMALLOC_FRAMES)
+            await asyncio.sleep(duration)
+        try:
+            snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+        finally:
+            if started_here:
+                tracemalloc.stop()
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    stats = snapshot.statistics(group_by)
+    return {
+        "traced_window_s": duration if started_here else None,
+        "total_kb": round(sum(s.size for s in stats) / 1024, 1),
+        "top": [
+            {
+                "size_kb": round(s.size / 1024, 1),
+                "count": s.count,
+                "traceback": [f"{f.filename}:{f.lineno}" for f in s.traceback],
+            }
+            for s in stats[:limit]
+        ],
+    }
+
+def _count_objects(limit: int, min_string_bytes: int) -> Dict[str, Any]:
+    objects = gc.get_objects()
+    by_type = Counter(type(o).__name__ for o in objects)
+    # Strings are not gc-tracked; find large ones through their containers
+    seen = set()
+    strings: List[Dict[str, Any]] = []
+    for referent in gc.get_referents(*objects):
+        if type(referent) is str and len(referent) >= min_string_bytes and id(referent) not in seen:
+            seen.add(id(referent))
+            strings.append({"length": len(referent), "preview": referent[:48]})
+    del objects
+    strings.sort(key=lambda s: s["length"], reverse=True)
+    data_urls = [s for s in strings if s["preview"].startswith("data:")]
+    return {
+        "gc_tracked": sum(by_type.values()),
+        "by_type": dict(by_type.most_common(limit)),
+        "large_strings": {
+            "min_length": min_string_bytes,
+            "count": len(strings),
+            "total_kb": round(sum(s["length"] for s in strings) / 1024, 1),
+            "data_urls": len(data_urls),
+            "largest": strings[:limit],
+        },
+    }
+
+async def object_counts(limit: int, min_string_bytes: int) -> Dict[str, Any]:
+    """Live objects by type and large strings still referenced"""
+    if _lock.locked():
+        raise ProfilerBusy()
+    async with _lock:
+        return await asyncio.to_thread(_count_objects, limit, min_string_bytes)
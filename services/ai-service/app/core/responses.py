@@ -0,0 +1,84 @@
+"""
+Fast JSON responses
+
+FastAPI normally dumps a returned model to a dict, validates that dict back
+into the response model, runs ``jsonable_encoder`` over the result and encodes
+it with stdlib ``json``. The models our handlers return are built by us and
+are already valid, so that work is wasted.
+
+- ``FastJSONResponse`` encodes pydantic models straight to bytes with
+  pydantic-core and anything else with orjson.
+- ``FastRoute`` is an ``APIRoute`` that, when a handler returns an instance of
+  exactly its ``response_model``, sends it as a ``FastJSONResponse`` without
+  the validation pass. Anything else (dicts, subclasses, other models) still
+  takes the normal path, so the response schema is enforced as before.
+
+Both are switched on by FAST_JSON_RESPONSES. ``MsgpackResponse`` is the
+binary counterpart used by the internal API.
+"""
+
+import asyncio
+import functools
+from typing import Any, Callable
+
+import msgpack
+import orjson
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+from app.core.config import settings
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded by pydantic-core or orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            # Same output as FastAPI's response_model serialization (by_alias, JSON mode)
+            return content.__pydantic_serializer__.to_json(content, by_alias=True)
+        return orjson.dumps(content)
+
+class MsgpackResponse(Response):
+    """MessagePack response; models are packed in their JSON form"""
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            content = content.model_dump(mode="json", by_alias=True)
+        return msgpack.packb(content, use_bin_type=True)
+
+class FastRoute(APIRoute):
+    """Route that skips re-validating response models the handler built itself"""
+
+    def get_route_handler(self) -> Callable:
+        model = self.response_model
+        if (
+            settings.FAST_JSON_RESPONSES
+            and isinstance(model, type)
+            and issubclass(model, BaseModel)
+            and asyncio.iscoroutinefunction(self.dependant.call)
+            and not (self.response_model_include or self.response_model_exclude
+                     or self.response_model_exclude_unset or self.response_model_exclude_defaults
+                     or self.response_model_exclude_none)
+        ):
+            self.dependant.call = self._send_built_models(self.dependant.call, model)
+        return super().get_route_handler()
+
+    def _send_built_models(self, call: Callable, model: type) -> Callable:
+        status_code = self.status_code or 200
+
+        @functools.wraps(call)
+        async def endpoint(**kwargs: Any) -> Any:
+            result = await call(**kwargs)
+            if type(result) is not model:
+                return result
+            response = FastJSONResponse(result, status_code=status_code)
+            # Headers and status set through an injected `response: Response`
+            for value in kwargs.values():
+                if isinstance(value, Response):
+                    response.headers.raw.extend(value.headers.raw)
+                    if value.status_code:
+                        response.status_code = value.status_code
+            return response
+
+        return endpoint
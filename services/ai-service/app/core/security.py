@@ -0,0 +1,80 @@
+"""
+Authentication for admin and internal endpoints
+
+Admin requests carry ``Authorization: Bearer <jwt>``, an HS256 token signed
+with SECRET_KEY whose ``scope`` includes ``admin`` and which has an ``exp``.
+Mint one with::
+
+    python -m app.core.security --ttl 900
+
+Internal (service-to-service) requests carry ``Authorization: Bearer
+<INTERNAL_API_TOKEN>``, a shared secret also configured on the backend.
+"""
+
+import argparse
+import hmac
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import Header, HTTPException
+
+from app.core.config import settings
+
+ADMIN_SCOPE = "admin"
+
+# Shipped default; admin endpoints refuse to run with it
+_DEFAULT_SECRET_KEY = "snaktox-ai-secret-key-change-in-production"
+
+def create_admin_token(ttl_seconds: int = 900, subject: str = "operator") -> str:
+    from jose import jwt
+
+    now = int(time.time())
+    claims = {"sub": subject, "scope": ADMIN_SCOPE, "iat": now, "exp": now + ttl_seconds}
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ADMIN_TOKEN_ALGORITHM)
+
+def verify_admin_token(token: str) -> Dict[str, Any]:
+    """Decoded claims of a valid admin token; raises HTTPException otherwise"""
+    from jose import JWTError, jwt
+
+    try:
+        claims = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ADMIN_TOKEN_ALGORITHM],
+            options={"require_exp": True},
+        )
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid admin token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    scopes = claims.get("scope", "")
+    if ADMIN_SCOPE not in (scopes.split() if isinstance(scopes, str) else scopes):
+        raise HTTPException(status_code=403, detail="Admin scope required")
+    return claims
+
+def require_admin(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Dependency guarding admin routes; they 404 unless ADMIN_ENDPOINTS_ENABLED"""
+    if not settings.ADMIN_ENDPOINTS_ENABLED or settings.SECRET_KEY == _DEFAULT_SECRET_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Admin token required",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return verify_admin_token(token)
+
+def require_internal(authorization: Optional[str] = Header(None)) -> None:
+    """Dependency guarding the internal API; it 404s unless enabled with a token"""
+    if not settings.INTERNAL_API_ENABLED or not settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode("utf-8"), settings.INTERNAL_API_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="Internal token required",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mint an admin token signed with SECRET_KEY")
+    parser.add_argument("--ttl", type=int, default=900, help="Seconds until the token expires")
+    parser.add_argument("--subject", default="operator")
+    args = parser.parse_args()
+    print(create_admin_token(args.ttl, args.subject))
@@ -0,0 +1,124 @@
+"""
+Production server launcher for SnaKTox AI Service
+
+Runs the app under gunicorn with uvicorn workers. The app and its immutable data
+(prompt templates, provider configuration) are loaded once in the master before
+forking, then frozen out of the garbage collector so worker processes share those
+pages copy-on-write instead of each holding a private copy.
+"""
+
+import gc
+import multiprocessing
+from typing import Any, Dict, List
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class SnaKToxUvicornWorker(UvicornWorker):
+    """Uvicorn worker with the event loop and HTTP parser chosen in Settings"""
+
+    CONFIG_KWARGS = {
+        "loop": settings.SERVER_LOOP,
+        "http": settings.SERVER_HTTP,
+        "lifespan": "on",
+    }
+
+def worker_count() -> int:
+    """Configured worker count; 0 means one per CPU"""
+    if settings.WORKERS > 0:
+        return settings.WORKERS
+    return multiprocessing.cpu_count()
+
+def per_worker_state() -> List[str]:
+    """Stores that live inside one worker, so several workers would split their state"""
+    stores = {"CONTEXT_STORE_BACKEND": settings.CONTEXT_STORE_BACKEND, "JOBS_BACKEND": settings.JOBS_BACKEND}
+    # Without REDIS_URL a "redis" backend falls back to memory as well
+    return [name for name, backend in stores.items() if backend != "redis" or not settings.REDIS_URL]
+
+def check_worker_state(workers: int, max_requests: int = 0) -> None:
+    """Refuse to run several workers, or recycle workers, over per-worker stores
+
+    With several workers, job polls and session context would reach the wrong
+    worker about half the time and answer 404. Recycling a worker after
+    max_requests would wipe its queued and finished jobs and session context.
+    """
+    local = per_worker_state()
+    if workers > 1 and local:
+        raise SystemExit(
+            f"WORKERS={workers} needs shared state, but {', '.join(local)} keep state in one worker. "
+            "Set them to redis with REDIS_URL, or run a single worker."
+        )
+    if max_requests > 0 and local:
+        raise SystemExit(
+            f"SERVER_MAX_REQUESTS={max_requests} recycles workers, but {', '.join(local)} keep state "
+            "in the worker. Set them to redis with REDIS_URL, or set SERVER_MAX_REQUESTS=0."
+        )
+
+def preload_shared_data() -> None:
+    """Load immutable shared data before fork"""
+    from app.services import prompts  # noqa: F401  (compiles templates at import)
+    from app.services.answer_pack import get_answer_pack
+    from app.services.hospital_index import get_hospital_index
+    from app.services.providers import load_providers
+    from app.services.retrieval import get_guidance_index
+
+    # Validates MODEL_PROVIDERS once in the master; clients are created lazily per worker
+    load_providers()
+    # Built once here and shared copy-on-write; workers rebuild only if the snapshot changes
+    get_hospital_index()
+    get_guidance_index()
+    # Mapped before fork so workers share the pack's pages
+    get_answer_pack()
+
+class ProductionServer(BaseApplication):
+    """Gunicorn application configured from Settings"""
+
+    def __init__(self, app_path: str = "main:app"):
+        self.app_path = app_path
+        super().__init__()
+
+    def gunicorn_options(self) -> Dict[str, Any]:
+        return {
+            "bind": f"{settings.HOST}:{settings.PORT}",
+            "workers": worker_count(),
+            "worker_class": "app.core.server.SnaKToxUvicornWorker",
+            "keepalive": settings.SERVER_KEEPALIVE,
+            "backlog": settings.SERVER_BACKLOG,
+            "max_requests": settings.SERVER_MAX_REQUESTS,
+            "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+            "timeout": settings.SERVER_TIMEOUT,
+            "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+            "preload_app": settings.SERVER_PRELOAD,
+            "loglevel": settings.LOG_LEVEL.lower(),
+        }
+
+    def load_config(self) -> None:
+        for key, value in self.gunicorn_options().items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+
+        app = import_app(self.app_path)
+        if settings.SERVER_PRELOAD:
+            preload_shared_data()
+            # Keep the GC from touching (and so copying) preloaded objects in workers
+            gc.freeze()
+        return app
+
+def run() -> None:
+    """Start the production server"""
+    check_worker_state(worker_count(), settings.SERVER_MAX_REQUESTS)
+    logger.info(
+        "Starting production server",
+        workers=worker_count(),
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        preload=settings.SERVER_PRELOAD,
+    )
+    ProductionServer().run()
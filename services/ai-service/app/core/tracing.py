@@ -0,0 +1,257 @@
+"""
+Lightweight request tracing
+
+Spans follow the OpenTelemetry data model (128-bit trace id, 64-bit span ids,
+W3C ``traceparent`` propagation) and are exported as OTLP/JSON, either to a
+collector's HTTP endpoint or appended to a local NDJSON file, without
+depending on the OpenTelemetry SDK.
+
+The request middleware opens a trace per request; ``span("stage")`` then
+times a stage of the current request. A request is recorded when tracing is
+enabled and either the sampler picks it or Server-Timing is on. Spans are
+exported only for sampled requests, and stage durations go into the
+``Server-Timing`` response header when that is enabled. Outside a recorded
+request, ``span`` returns a shared no-op, so disabled tracing costs one
+context variable lookup per stage.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Trace:
+    """Spans of one request"""
+
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+
+class Span:
+    """One timed stage; use as a context manager"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token: Optional[contextvars.Token] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.trace.spans.append(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_id is None else 1,  # SERVER for the request span, else INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+class _NoopSpan:
+    """Stand-in returned when the current request is not being recorded"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("snaktox_span", default=None)
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def span(name: str, **attributes: Any):
+    """Time a stage of the current request as a child of the active span"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+def current_trace_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace.trace_id if active else None
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace id, parent span id, sampled) from a W3C traceparent header"""
+    if not header:
+        return None
+    match = _TRACEPARENT.match(header.strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+def start_request_span(name: str, traceparent: Optional[str], **attributes: Any):
+    """Root span for an incoming request, continuing the caller's trace if given"""
+    if not settings.TRACING_ENABLED:
+        return NOOP_SPAN
+    incoming = parse_traceparent(traceparent)
+    if incoming:
+        trace_id, parent_id, sampled = incoming
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+    if not sampled and not settings.SERVER_TIMING_ENABLED:
+        return NOOP_SPAN
+    return Span(Trace(trace_id, sampled), name, parent_id, attributes)
+
+def traceparent_for(request_span: Span) -> str:
+    flags = "01" if request_span.trace.sampled else "00"
+    return f"00-{request_span.trace.trace_id}-{request_span.span_id}-{flags}"
+
+def server_timing(request_span: Span) -> str:
+    """Server-Timing header value listing each finished stage of the request"""
+    entries = [
+        f"{s.name};dur={s.duration_ms:.1f}" for s in request_span.trace.spans if s is not request_span
+    ]
+    entries.append(f"total;dur={request_span.duration_ms:.1f}")
+    return ", ".join(entries)
+
+class SpanExporter:
+    """Batches finished traces and writes them to a file or an OTLP/HTTP collector"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Trace] = []
+        # Export in progress; shielded so shutdown can let it finish
+        self._exporting: Optional[asyncio.Future] = None
+
+    def submit(self, trace: Trace) -> None:
+        if not trace.sampled or settings.TRACING_EXPORTER == "none":
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.TRACING_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            pass  # Tracing must never slow requests down; drop instead
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            self._batch.append(await self._queue.get())
+            await asyncio.sleep(settings.TRACING_EXPORT_INTERVAL)
+            # Export everything queued, a batch at a time, before waiting again
+            while self._batch or not self._queue.empty():
+                while not self._queue.empty() and len(self._batch) < settings.TRACING_BATCH_SIZE:
+                    self._batch.append(self._queue.get_nowait())
+                batch, self._batch = self._batch, []
+                self._exporting = asyncio.ensure_future(self._export_logged(batch))
+                await asyncio.shield(self._exporting)
+                self._exporting = None
+
+    async def _export_logged(self, traces: List[Trace]) -> None:
+        try:
+            await self._export(traces)
+        except Exception as e:
+            logger.warning("Span export failed", spans=sum(len(t.spans) for t in traces), error=str(e))
+
+    @staticmethod
+    def _payload(traces: List[Trace]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    _otlp_attribute("service.name", "snaktox-ai-service"),
+                    _otlp_attribute("service.version", settings.VERSION),
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.core.tracing"},
+                    "spans": [s.to_otlp() for t in traces for s in t.spans],
+                }],
+            }]
+        }
+
+    async def _export(self, traces: List[Trace]) -> None:
+        payload = self._payload(traces)
+        if settings.TRACING_EXPORTER == "otlp":
+            import httpx
+
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                await client.post(settings.TRACING_OTLP_ENDPOINT, json=payload)
+        elif settings.TRACING_EXPORTER == "file":
+            line = json.dumps(payload, separators=(",", ":")) + "\n"
+            await asyncio.to_thread(self._append, settings.TRACING_FILE_PATH, line)
+
+    @staticmethod
+    def _append(path: str, line: str) -> None:
+        with open(path, "a") as f:
+            f.write(line)
+
+    async def shutdown(self) -> None:
+        """Flush queued traces and stop"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        if self._exporting is not None:
+            # Cancelling the task left the batch being exported running
+            await self._exporting
+            self._exporting = None
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), settings.TRACING_BATCH_SIZE):
+            await self._export_logged(pending[start:start + settings.TRACING_BATCH_SIZE])
+        self._task = None
+        self._queue = None
+
+exporter = SpanExporter()
@@ -0,0 +1,48 @@
+"""
+Pydantic models for asynchronous detection jobs
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+from app.models.snake_detection import SnakeDetectionResponse
+
+class JobStatus(str, Enum):
+    """Job status enumeration"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    @property
+    def is_terminal(self) -> bool:
+        return self in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+class DetectionJob(BaseModel):
+    """State of an asynchronous detection job"""
+    job_id: str = Field(..., description="Job identifier")
+    status: JobStatus = Field(..., description="Current job status")
+    created_at: datetime = Field(..., description="Submission time (UTC)")
+    updated_at: datetime = Field(..., description="Last status change (UTC)")
+    image_sha256: str = Field(..., description="SHA-256 of the submitted image")
+    client_key: Optional[str] = Field(None, description="Client idempotency key")
+    result: Optional[SnakeDetectionResponse] = Field(None, description="Detection result once succeeded")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+
+class JobRecord(DetectionJob):
+    """Stored job: the public state plus who submitted it, never returned to clients"""
+    user_id: Optional[str] = Field(None, description="Anonymized user identifier")
+    session_id: Optional[str] = Field(None, description="Session identifier")
+    webhook_url: Optional[str] = Field(None, description="URL notified when the job finishes")
+
+    def public(self) -> DetectionJob:
+        return DetectionJob(**self.model_dump(include=set(DetectionJob.model_fields)))
+
+class JobSubmitResponse(BaseModel):
+    """Response model for job submission"""
+    job_id: str = Field(..., description="Job identifier")
+    status: JobStatus = Field(..., description="Current job status")
+    created: bool = Field(..., description="False when the request attached to an existing job")
+    poll_url: str = Field(..., description="URL to fetch the job state")
@@ -2,7 +2,7 @@
 Pydantic models for snake detection API
 """
 
-from pydantic import BaseModel, HttpUrl, Field, validator
+from pydantic import BaseModel, HttpUrl, Field, field_validator
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
@@ -27,8 +27,10 @@ class SnakeDetectionRequest(BaseModel):
     confidence_threshold: float = Field(0.7, ge=0.0, le=1.0, description="Minimum confidence threshold")
     user_id: Optional[str] = Field(None, description="Anonymized user identifier")
     session_id: Optional[str] = Field(None, description="Session identifier")
+    location: Optional[str] = Field(None, description="Victim location as \"lat,lng\" or JSON {\"lat\", \"lng\"}")
     
-    @validator('image_url')
+    @field_validator('image_url')
+    @classmethod
     def validate_image_url(cls, v):
         """Validate that image_url is either HTTP/HTTPS URL or data URL"""
         if v.startswith('data:'):
@@ -51,6 +53,19 @@ class SnakeSpecies(BaseModel):
     first_aid_notes: str = Field(..., description="First aid recommendations")
     antivenom_available: bool = Field(..., description="Whether antivenom is available")
 
+class NearbyFacility(BaseModel):
+    """Hospital stocking antivenom near the victim"""
+    name: str = Field(..., description="Facility name")
+    address: str = Field(..., description="Facility address")
+    country: str = Field("", description="Country code")
+    distance_km: float = Field(..., description="Great-circle distance from the victim")
+    coordinates: Dict[str, float] = Field(..., description="Facility coordinates {lat, lng}")
+    antivenom_stock: Dict[str, int] = Field(default_factory=dict, description="Vials in stock by antivenom type")
+    phone: Optional[str] = Field(None, description="Main phone number")
+    emergency_phone: Optional[str] = Field(None, description="Emergency contact number")
+    emergency_services: bool = Field(True, description="Whether the facility runs emergency services")
+    verified_status: str = Field(..., description="Verification status")
+
 class DetectionResult(BaseModel):
     """Snake detection result"""
     species: SnakeSpecies = Field(..., description="Identified snake species")
@@ -58,6 +73,8 @@ class DetectionResult(BaseModel):
     bounding_box: Optional[Dict[str, float]] = Field(None, description="Bounding box coordinates")
     alternative_species: List[SnakeSpecies] = Field(default_factory=list, description="Alternative species")
     detection_metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata")
+    nearby_facilities: List[NearbyFacility] = Field(default_factory=list, description="Nearest facilities stocking matching antivenom")
+    follow_up_questions: List[str] = Field(default_factory=list, description="Suggested chat questions about this species")
 
 class SnakeDetectionResponse(BaseModel):
     """Response model for snake detection"""
@@ -0,0 +1,31 @@
+"""
+Pydantic models for resumable image uploads
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional
+
+from app.models.snake_detection import SnakeDetectionResponse
+
+class UploadCreateRequest(BaseModel):
+    """Request model for starting a resumable upload"""
+    size: int = Field(..., gt=0, description="Total image size in bytes")
+    mime_type: str = Field("image/jpeg", description="Image MIME type")
+    sha256: Optional[str] = Field(None, min_length=64, max_length=64, description="SHA-256 of the whole image, hex")
+    confidence_threshold: float = Field(0.7, ge=0.0, le=1.0, description="Minimum confidence threshold")
+    user_id: Optional[str] = Field(None, description="Anonymized user identifier")
+    session_id: Optional[str] = Field(None, description="Session identifier")
+    location: Optional[str] = Field(None, description="Victim location as \"lat,lng\" or JSON {\"lat\", \"lng\"}")
+    client_key: Optional[str] = Field(None, description="Client idempotency key for the detection job")
+    webhook_url: Optional[str] = Field(None, description="https URL on a public host, notified when detection finishes")
+
+class UploadStatus(BaseModel):
+    """State of a resumable upload"""
+    upload_id: Optional[str] = Field(None, description="Upload identifier, absent when no upload was needed")
+    offset: int = Field(..., description="Bytes received so far; resume from here")
+    size: int = Field(..., description="Total image size in bytes")
+    complete: bool = Field(..., description="True once every byte has been received")
+    sha256: Optional[str] = Field(None, description="SHA-256 of the received image once complete")
+    job_id: Optional[str] = Field(None, description="Detection job started by the final chunk")
+    poll_url: Optional[str] = Field(None, description="URL to fetch the detection job state")
+    result: Optional[SnakeDetectionResponse] = Field(None, description="Detection result served from the content-hash cache")
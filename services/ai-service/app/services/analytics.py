@@ -0,0 +1,144 @@
+"""
+Detection and chat analytics export
+
+Every detection and chat outcome is recorded as one event shaped like the
+backend's AnalyticsLog (event_type, metadata, user_id, session_id,
+timestamp). The metadata holds the species, confidence, model, latency, cache
+status and language. Events go to a bounded in-process queue, so recording
+never waits: when the queue is full the event is dropped and counted
+(snaktox_analytics_events_total{outcome="dropped"}).
+
+A background writer wakes every ANALYTICS_FLUSH_INTERVAL seconds and writes
+everything queued, ANALYTICS_BATCH_SIZE events at a time.
+Each batch becomes one gzip member of compact NDJSON, appended to an hourly
+file per worker::
+
+    <ANALYTICS_DIR>/<event date and hour>-<pid>.ndjson.gz
+
+Concatenated gzip members are a valid gzip file, so ``zcat`` or
+``pandas.read_json(path, lines=True)`` read it whole. Files are never
+appended to by two processes, and a finished hour can be shipped or loaded
+into the analytics_logs collection.
+"""
+
+import asyncio
+import gzip
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import ANALYTICS_EVENTS
+from app.services.usage import current_scope
+
+logger = get_logger(__name__)
+
+DETECTION_EVENT = "ai_detection"
+CHAT_EVENT = "ai_chat"
+
+class AnalyticsWriter:
+    """Queue of analytics events and the task that writes them out"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Dict[str, Any]] = []
+        # Write in progress; shielded so shutdown can let it finish
+        self._writing: Optional[asyncio.Future] = None
+
+    def record(self, event_type: str, session_id: Optional[str] = None, **metadata: Any) -> None:
+        """Queue an event; never blocks, drops when the queue is full"""
+        if not settings.ANALYTICS_DIR:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.ANALYTICS_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+        scope = current_scope()
+        event = {
+            "event_type": event_type,
+            "timestamp": time.time(),
+            "user_id": scope.user_id,
+            "session_id": session_id,
+            "metadata": {"route": scope.route, **metadata},
+        }
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            ANALYTICS_EVENTS.labels(event_type=event_type, outcome="dropped").inc()
+            return
+        ANALYTICS_EVENTS.labels(event_type=event_type, outcome="queued").inc()
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            self._batch.append(await self._queue.get())
+            await asyncio.sleep(settings.ANALYTICS_FLUSH_INTERVAL)
+            # Write everything queued, a batch at a time, before waiting again
+            while self._batch or not self._queue.empty():
+                while not self._queue.empty() and len(self._batch) < settings.ANALYTICS_BATCH_SIZE:
+                    self._batch.append(self._queue.get_nowait())
+                batch, self._batch = self._batch, []
+                self._writing = asyncio.ensure_future(self._flush(batch))
+                await asyncio.shield(self._writing)
+                self._writing = None
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            logger.warning("Analytics export failed", events=len(batch), error=str(e))
+            for event in batch:
+                ANALYTICS_EVENTS.labels(event_type=event["event_type"], outcome="failed").inc()
+            return
+        for event in batch:
+            ANALYTICS_EVENTS.labels(event_type=event["event_type"], outcome="written").inc()
+
+    @staticmethod
+    def _path(timestamp: float) -> str:
+        hour = datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%dT%H")
+        return os.path.join(settings.ANALYTICS_DIR, f"{hour}-{os.getpid()}.ndjson.gz")
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Append the batch to its hourly files, one gzip member per file"""
+        by_path: Dict[str, List[bytes]] = {}
+        for event in batch:
+            line = orjson.dumps({
+                **event,
+                "timestamp": datetime.fromtimestamp(event["timestamp"], timezone.utc).isoformat(),
+            })
+            by_path.setdefault(self._path(event["timestamp"]), []).append(line)
+        os.makedirs(settings.ANALYTICS_DIR, exist_ok=True)
+        for path, lines in by_path.items():
+            with open(path, "ab") as f:
+                f.write(gzip.compress(b"\n".join(lines) + b"\n", compresslevel=6))
+
+    async def shutdown(self) -> None:
+        """Write queued events and stop"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        if self._writing is not None:
+            # Cancelling the task left the batch being written running
+            await self._writing
+            self._writing = None
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            await self._flush(pending)
+        self._task = None
+        self._queue = None
+
+_writer: Optional[AnalyticsWriter] = None
+
+def get_analytics() -> AnalyticsWriter:
+    """Process-wide analytics writer"""
+    global _writer
+    if _writer is None:
+        _writer = AnalyticsWriter()
+    return _writer
@@ -0,0 +1,259 @@
+"""
+Precomputed multilingual answer pack
+
+Answers for each QueryType x language (en, sw, fr), plus first-aid and
+species answers for the species we detect most, compiled offline from
+app/data/answer_pack/source.json into a compact indexed file:
+
+    python -m app.services.answer_pack build [--fill]
+
+``--fill`` asks the configured text providers for any QueryType x language x
+species combination the source leaves out.
+
+File layout (little-endian)::
+
+    b"SNKPACK1" | entry count u32 | meta length u32 | meta JSON
+    | index: entry count x (key hash u64, offset u32, length u32), sorted by hash
+    | entry payloads (UTF-8 JSON)
+
+The file is memory-mapped, so lookups binary-search the index in place and
+decode only the matching entry, and preloaded workers share the pages.
+Rebuilds write a temporary file and rename it over the old one. The holder
+notices the new file (by inode and mtime, checked at most every
+ANSWER_PACK_REFRESH_SECONDS) and swaps it in with a single assignment, so
+refreshes need no restart.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.chatbot import QueryType
+
+logger = get_logger(__name__)
+
+MAGIC = b"SNKPACK1"
+_HEADER = struct.Struct("<8sII")
+_INDEX_ENTRY = struct.Struct("<QII")
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "answer_pack")
+_DEFAULT_SOURCE_PATH = os.path.normpath(os.path.join(_DATA_DIR, "source.json"))
+_DEFAULT_PACK_PATH = os.path.normpath(os.path.join(_DATA_DIR, "answers.pack"))
+
+# Species answers exist for first aid and species info; emergencies reuse the
+# first-aid answer and general questions naming a species get its description
+SPECIES_QUERY_TYPES = {
+    QueryType.FIRST_AID: QueryType.FIRST_AID,
+    QueryType.EMERGENCY: QueryType.FIRST_AID,
+    QueryType.SPECIES_INFO: QueryType.SPECIES_INFO,
+    QueryType.GENERAL: QueryType.SPECIES_INFO,
+}
+
+LANGUAGE_NAMES = {"en": "English", "sw": "Swahili", "fr": "French"}
+
+def pack_key(query_type: str, language: str, species: str = "") -> str:
+    return f"{query_type}|{language}|{species}"
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def normalize_language(language: Optional[str]) -> str:
+    """Primary subtag of a language tag: "sw-KE" -> "sw" """
+    return (language or "en").split("-")[0].split("_")[0].strip().lower() or "en"
+
+def write_pack(entries: List[Dict[str, Any]], meta: Dict[str, Any], path: str) -> str:
+    """Write entries to path atomically; returns the pack version"""
+    payloads = []
+    for entry in entries:
+        key = pack_key(entry["query_type"], entry["language"], entry.get("species", ""))
+        body = json.dumps({"key": key, **entry}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        payloads.append((_key_hash(key), body))
+    payloads.sort(key=lambda item: item[0])
+    version = hashlib.sha256(b"".join(body for _, body in payloads)).hexdigest()[:16]
+    meta_bytes = json.dumps({**meta, "version": version}, ensure_ascii=False).encode("utf-8")
+
+    offset = _HEADER.size + len(meta_bytes) + _INDEX_ENTRY.size * len(payloads)
+    index = bytearray()
+    for key_hash, body in payloads:
+        index += _INDEX_ENTRY.pack(key_hash, offset, len(body))
+        offset += len(body)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(payloads), len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(index)
+        for _, body in payloads:
+            f.write(body)
+    os.replace(tmp_path, path)
+    return version
+
+class AnswerPack:
+    """Read-only view of a memory-mapped pack file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, meta_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not an answer pack")
+        self.meta: Dict[str, Any] = json.loads(self._map[_HEADER.size:_HEADER.size + meta_length])
+        self.version: str = self.meta.get("version", "")
+        self._index_start = _HEADER.size + meta_length
+        # alias -> scientific name, longest first so "fira wa misri" wins over shorter aliases
+        aliases = {
+            alias.casefold(): name
+            for name, by_language in self.meta.get("species", {}).items()
+            for names in by_language.values()
+            for alias in [*names, name]
+        }
+        self._alias_patterns = [
+            (re.compile(rf"\b{re.escape(alias)}\b"), name)
+            for alias, name in sorted(aliases.items(), key=lambda item: -len(item[0]))
+        ]
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _find(self, key: str) -> Optional[Dict[str, Any]]:
+        target = _key_hash(key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key_hash, offset, length = _INDEX_ENTRY.unpack_from(self._map, self._index_start + mid * _INDEX_ENTRY.size)
+            if key_hash < target:
+                lo = mid + 1
+            elif key_hash > target:
+                hi = mid
+            else:
+                entry = json.loads(self._map[offset:offset + length])
+                return entry if entry["key"] == key else None
+        return None
+
+    def species_in(self, query: str) -> Optional[str]:
+        """Scientific name of a packed species mentioned in the query"""
+        text = query.casefold()
+        for pattern, name in self._alias_patterns:
+            if pattern.search(text):
+                return name
+        return None
+
+    def lookup(self, query_type: QueryType, language: str, species: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Species-specific entry when there is one, else the generic entry for the type"""
+        language = normalize_language(language)
+        generic = self._find(pack_key(query_type.value, language))
+        if species and query_type in SPECIES_QUERY_TYPES:
+            entry = self._find(pack_key(SPECIES_QUERY_TYPES[query_type].value, language, species))
+            if entry is not None:
+                # Species entries borrow the follow-ups of their type's generic entry
+                if not entry.get("follow_up_questions") and generic is not None:
+                    entry["follow_up_questions"] = generic.get("follow_up_questions")
+                return entry
+        return generic
+
+class AnswerPackHolder:
+    """Current pack for a file path, reopened when the file is replaced"""
+
+    def __init__(self, path: str, refresh_seconds: float):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.pack: Optional[AnswerPack] = None
+        self._stamp: Optional[Tuple[int, float]] = None
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> Optional[AnswerPack]:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return self.pack
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_ino, stat.st_mtime)
+            if stamp == self._stamp:
+                return self.pack
+            pack = AnswerPack(self.path)
+        except (OSError, ValueError) as e:
+            # Keep serving the last good pack
+            logger.warning("Answer pack not loaded", path=self.path, error=str(e))
+            return self.pack
+        previous, self.pack, self._stamp = self.pack, pack, stamp
+        if previous is not None:
+            previous.close()
+        logger.info("Answer pack loaded", version=pack.version, entries=pack.count,
+                    languages=pack.meta.get("languages"))
+        return self.pack
+
+_holder: Optional[AnswerPackHolder] = None
+
+def get_answer_pack() -> Optional[AnswerPack]:
+    """Current process-wide answer pack, or None when disabled or missing"""
+    global _holder
+    if not settings.ANSWER_PACK_ENABLED:
+        return None
+    if _holder is None:
+        _holder = AnswerPackHolder(settings.ANSWER_PACK_PATH or _DEFAULT_PACK_PATH, settings.ANSWER_PACK_REFRESH_SECONDS)
+        _holder.refresh(force=True)
+    return _holder.refresh()
+
+async def _fill_missing(source: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Generate entries the source leaves out with the configured text providers"""
+    from app.services.model_router import get_provider_router
+
+    router = get_provider_router()
+    have = {pack_key(e["query_type"], e["language"], e.get("species", "")) for e in source["entries"]}
+    wanted = [(qt.value, lang, "") for qt in QueryType for lang in source["languages"]]
+    wanted += [
+        (qt.value, lang, species)
+        for species in source["species"]
+        for qt in set(SPECIES_QUERY_TYPES.values())
+        for lang in source["languages"]
+    ]
+    generated = []
+    for query_type, language, species in wanted:
+        if pack_key(query_type, language, species) in have:
+            continue
+        subject = f"{query_type.replace('_', ' ')} for a {species} bite" if species else query_type.replace("_", " ")
+        prompt = (
+            f"Write a short, plain-text answer (under 120 words) about snakebite {subject} in Kenya, "
+            f"in {LANGUAGE_NAMES.get(language, language)}, following WHO guidance. "
+            "Always tell the reader to call 999 or 112 and go to a hospital with antivenom when bitten."
+        )
+        routed = await router.generate([prompt], tier="reliable")
+        generated.append({
+            "query_type": query_type, "language": language, "species": species,
+            "content": routed.text.strip(), "confidence": 0.7,
+            "sources": ["WHO Guidelines"], "generated_by": routed.model,
+        })
+        logger.info("Answer pack entry generated", key=pack_key(query_type, language, species))
+    return generated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the multilingual answer pack")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--source", default=_DEFAULT_SOURCE_PATH)
+    parser.add_argument("--output", default=settings.ANSWER_PACK_PATH or _DEFAULT_PACK_PATH)
+    parser.add_argument("--fill", action="store_true", help="Generate missing entries with the text providers")
+    args = parser.parse_args()
+
+    with open(args.source) as f:
+        source = json.load(f)
+    entries = list(source["entries"])
+    if args.fill:
+        entries += asyncio.run(_fill_missing(source))
+    version = write_pack(
+        entries,
+        {"languages": source["languages"], "species": source["species"],
+         "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+        args.output,
+    )
+    print(f"Packed {len(entries)} answers, version {version} -> {args.output}")
@@ -0,0 +1,320 @@
+"""
+On-disk snapshots of the detection and chat caches
+
+Without them every restart or deploy starts cold, and the first hour re-pays
+for answers the previous process already had. Each cache is written to
+CACHE_SNAPSHOT_DIR every CACHE_SNAPSHOT_INTERVAL_SECONDS and on graceful
+shutdown, one file per cache (layout little-endian)::
+
+    b"SNKSNAP1" | entry count u32 | meta length u32 | meta JSON
+    | index: entry count x (key hash u64, offset u32, length u32,
+      expires at f64 unix time), sorted by hash
+    | entry payloads (key UTF-8, b"\\n", encoded value)
+
+On startup the file is memory-mapped and set as the cache's loader, so
+nothing is decoded up front: a cache miss binary-searches the index and
+decodes just that entry. Entries keep their original expiry.
+
+A snapshot records a version derived from the prompt and the configured
+models (see ``detection_cache_version`` and ``chat_cache_version``). A file
+written under another version is ignored and replaced by the next write.
+
+Workers share the files. Writes hold an flock, merge in the entries already
+on disk that the writer neither holds nor has served, and rename a temporary
+file over the old one, so readers keep their mapping of the previous file.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import orjson
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import CACHE_SNAPSHOT_ENTRIES, CACHE_SNAPSHOT_RESTORED
+from app.utils.cache import TTLCache
+
+logger = get_logger(__name__)
+
+MAGIC = b"SNKSNAP1"
+_HEADER = struct.Struct("<8sII")
+_INDEX_ENTRY = struct.Struct("<QIId")
+
+V = TypeVar("V")
+
+# (key, encoded value, expires at as unix time)
+Entry = Tuple[str, bytes, float]
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def write_snapshot(path: str, meta: Dict[str, Any], entries: List[Entry]) -> None:
+    """Write entries to path atomically"""
+    payloads = sorted(
+        ((_key_hash(key), key.encode("utf-8") + b"\n" + data, expires_at) for key, data, expires_at in entries),
+        key=lambda item: item[0],
+    )
+    meta_bytes = json.dumps(meta).encode("utf-8")
+
+    offset = _HEADER.size + len(meta_bytes) + _INDEX_ENTRY.size * len(payloads)
+    index = bytearray()
+    for key_hash, body, expires_at in payloads:
+        index += _INDEX_ENTRY.pack(key_hash, offset, len(body), expires_at)
+        offset += len(body)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(payloads), len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(index)
+        for _, body, _ in payloads:
+            f.write(body)
+    os.replace(tmp_path, path)
+
+class SnapshotFile:
+    """Read-only view of a memory-mapped snapshot"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, meta_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a cache snapshot")
+        self.meta: Dict[str, Any] = json.loads(self._map[_HEADER.size:_HEADER.size + meta_length])
+        self.version: str = self.meta.get("version", "")
+        self._index_start = _HEADER.size + meta_length
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _entry(self, position: int) -> Tuple[int, int, int, float]:
+        return _INDEX_ENTRY.unpack_from(self._map, self._index_start + position * _INDEX_ENTRY.size)
+
+    def _split(self, offset: int, length: int) -> Tuple[str, bytes]:
+        body = self._map[offset:offset + length]
+        key, _, data = body.partition(b"\n")
+        return key.decode("utf-8"), data
+
+    def find(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Encoded value and expiry of key"""
+        target = _key_hash(key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key_hash, offset, length, expires_at = self._entry(mid)
+            if key_hash < target:
+                lo = mid + 1
+            elif key_hash > target:
+                hi = mid
+            else:
+                found, data = self._split(offset, length)
+                return (data, expires_at) if found == key else None
+        return None
+
+    def entries(self) -> Iterator[Entry]:
+        for position in range(self.count):
+            _, offset, length, expires_at = self._entry(position)
+            key, data = self._split(offset, length)
+            yield key, data, expires_at
+
+class CacheSnapshot(Generic[V]):
+    """Snapshot file backing one TTLCache"""
+
+    def __init__(
+        self,
+        name: str,
+        cache: TTLCache[str, V],
+        version: Callable[[], str],
+        encode: Callable[[V], bytes],
+        decode: Callable[[bytes], V],
+        keep: Callable[[V], bool] = lambda value: True,
+    ):
+        self.name = name
+        self.cache = cache
+        self.encode = encode
+        self.decode = decode
+        self.keep = keep
+        self._version_of = version
+        self.version = ""
+        self.path = ""
+        self.written = 0
+        self._file: Optional[SnapshotFile] = None
+        # Keys already handed to the cache; never served twice
+        self._served: Set[str] = set()
+
+    def _open(self) -> Optional[SnapshotFile]:
+        try:
+            snapshot = SnapshotFile(self.path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Cache snapshot unreadable, ignored", cache=self.name, path=self.path, error=str(e))
+            return None
+        if snapshot.version != self.version:
+            logger.info("Cache snapshot is stale, ignored", cache=self.name,
+                        snapshot_version=snapshot.version, version=self.version)
+            snapshot.close()
+            return None
+        return snapshot
+
+    def load(self, directory: str) -> None:
+        self.version = self._version_of()
+        self.path = os.path.join(directory, f"{self.name}.snap")
+        self._file = self._open()
+        self.cache.loader = self._lookup
+        if self._file is not None:
+            logger.info("Cache snapshot mapped", cache=self.name, entries=self._file.count)
+
+    def _lookup(self, key: str) -> Optional[Tuple[V, float]]:
+        if self._file is None or key in self._served:
+            return None
+        found = self._file.find(key)
+        if found is None:
+            return None
+        self._served.add(key)
+        data, expires_at = found
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None
+        try:
+            value = self.decode(data)
+        except Exception as e:
+            logger.warning("Cache snapshot entry undecodable", cache=self.name, error=str(e))
+            return None
+        CACHE_SNAPSHOT_RESTORED.labels(cache=self.name).inc()
+        return value, ttl
+
+    def collect(self) -> List[Entry]:
+        """Encoded live entries of the cache, newest first"""
+        now = time.time()
+        return [
+            (key, self.encode(value), now + ttl)
+            for key, value, ttl in reversed(list(self.cache.items()))
+            if self.keep(value)
+        ]
+
+    def write(self, entries: List[Entry], served: Set[str]) -> int:
+        """Merge entries with the file on disk and replace it; run off the event loop"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = {key: (key, data, expires_at) for key, data, expires_at in entries}
+            on_disk = self._open()
+            if on_disk is not None:
+                now = time.time()
+                carried = sorted(
+                    (entry for entry in on_disk.entries()
+                     if entry[2] > now and entry[0] not in merged and entry[0] not in served),
+                    key=lambda entry: -entry[2],
+                )
+                for entry in carried[:max(0, self.cache.maxsize - len(merged))]:
+                    merged[entry[0]] = entry
+                on_disk.close()
+            kept = list(merged.values())[:self.cache.maxsize]
+            write_snapshot(self.path, {"cache": self.name, "version": self.version, "written_at": time.time()}, kept)
+        return len(kept)
+
+    def swap(self) -> None:
+        """Map the file just written in place of the one loaded at startup"""
+        previous, self._file = self._file, self._open()
+        self._served = set()
+        if previous is not None:
+            previous.close()
+
+    async def save(self) -> int:
+        entries = self.collect()
+        self.written = await asyncio.to_thread(self.write, entries, set(self._served))
+        self.swap()
+        CACHE_SNAPSHOT_ENTRIES.labels(cache=self.name).set(self.written)
+        return self.written
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "mapped_entries": self._file.count if self._file is not None else 0,
+            "served": len(self._served),
+            "written": self.written,
+        }
+
+def _encode_chat(response: Dict[str, Any]) -> bytes:
+    # The prefetch marker belongs to this process's hit accounting
+    return orjson.dumps({k: v for k, v in response.items() if k != "prefetched"})
+
+class CacheSnapshots:
+    """Periodic and shutdown snapshots of a set of caches"""
+
+    def __init__(self, snapshots: List[CacheSnapshot]):
+        self.snapshots = snapshots
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if not settings.CACHE_SNAPSHOT_DIR or self._task is not None:
+            return
+        for snapshot in self.snapshots:
+            snapshot.load(settings.CACHE_SNAPSHOT_DIR)
+        self._task = asyncio.create_task(self._run())
+
+    async def save(self) -> None:
+        for snapshot in self.snapshots:
+            try:
+                written = await snapshot.save()
+                logger.info("Cache snapshot written", cache=snapshot.name, entries=written)
+            except Exception as e:
+                logger.error("Cache snapshot failed", cache=snapshot.name, error=str(e))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CACHE_SNAPSHOT_INTERVAL_SECONDS)
+            await self.save()
+
+    async def shutdown(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.save()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "caches": {snapshot.name: snapshot.snapshot() for snapshot in self.snapshots},
+        }
+
+_snapshots: Optional[CacheSnapshots] = None
+
+def get_cache_snapshots() -> CacheSnapshots:
+    """Process-wide snapshots of the detection and chat caches"""
+    global _snapshots
+    if _snapshots is None:
+        from app.models.snake_detection import DetectionResult
+        from app.services import chatbot_service, snake_detection_service
+        _snapshots = CacheSnapshots([
+            CacheSnapshot(
+                "detections",
+                snake_detection_service._detection_results,
+                snake_detection_service.detection_cache_version,
+                lambda result: result.model_dump_json().encode("utf-8"),
+                DetectionResult.model_validate_json,
+                keep=lambda result: not snake_detection_service.is_mock_result(result),
+            ),
+            CacheSnapshot(
+                "chat",
+                chatbot_service._chat_responses,
+                chatbot_service.chat_cache_version,
+                _encode_chat,
+                orjson.loads,
+            ),
+        ])
+    return _snapshots
@@ -3,7 +3,9 @@ Chatbot service using OpenAI API with WHO/CDC knowledge base
 """
 
 import asyncio
-from typing import Optional, Dict, Any, List
+import hashlib
+import json
+from typing import Optional, Dict, Any, List, Sequence
 from app.core.config import settings
 from app.core.exceptions import ChatbotError, ExternalAPIError
 from app.models.chatbot import (
@@ -13,36 +15,88 @@ from app.models.chatbot import (
     ChatbotContext
 )
 from app.core.logging import get_logger
+from app.core.metrics import CHAT_DIRECT_ANSWERS, CHAT_PACK_ANSWERS, PROMPT_TOKENS
+from app.core.singleflight import SingleFlight
+from app.core.tracing import span
+from app.services.analytics import CHAT_EVENT, get_analytics
+from app.services.answer_pack import get_answer_pack, normalize_language
+from app.services.context_store import get_context_store
+from app.services.model_router import get_provider_router
+from app.services.prefetch import get_prefetcher
+from app.services.prompts import PROMPT_TEMPLATES, CompiledPrompt
+from app.services.retrieval import Hit, get_guidance_index
+from app.services.usage import current_scope, get_usage_accountant
+from app.utils.cache import TTLCache
 
 logger = get_logger(__name__)
 
+# Provider tier per query type: cheap/fast for general chat, most reliable for emergencies
+QUERY_TIERS = {
+    QueryType.GENERAL: "fast",
+    QueryType.EMERGENCY: "reliable",
+    QueryType.FIRST_AID: "reliable",
+}
+
+# Process-wide coalescing of identical in-flight upstream calls
+_chat_flights = SingleFlight("chat")
+_classify_flights = SingleFlight("classify")
+
+# Recent upstream answers; also what chat degrades to once a token budget is spent
+_chat_responses: TTLCache[str, Dict[str, Any]] = TTLCache(
+    settings.CHAT_CACHE_MAX_ENTRIES, settings.CHAT_CACHE_TTL_SECONDS
+)
+
+def chat_cache_version() -> str:
+    """Changes whenever cached answers may no longer match: new prompts, guidance or text models"""
+    models = sorted(f"{p.name}={p.spec.model}" for p in get_provider_router().providers if p.supports("text"))
+    raw = "\n".join([PROMPT_TEMPLATES.version, get_guidance_index().corpus_sha256, *models])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, without trailing punctuation"""
+    return " ".join(query.casefold().split()).rstrip("?!. ")
+
+def chat_flight_key(query: str, query_type: QueryType, language: str, history: List[Dict[str, str]]) -> str:
+    """Key identifying chat requests that would produce the same upstream prompt"""
+    history_digest = hashlib.sha256(json.dumps(history, sort_keys=True).encode("utf-8")).hexdigest() if history else ""
+    raw = f"{query_type.value}|{language}|{history_digest}|{normalize_query(query)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def classify_by_keywords(query: str) -> Optional[QueryType]:
+    """Cheap keyword classification; None when no keyword matches"""
+    query_lower = query.lower()
+    
+    # English, then Swahili and French for the other supported languages
+    emergency_keywords = ['emergency', 'bitten', 'bite', 'urgent', 'help', 'now', 'immediately', 'victim',
+                          'nimeumwa', 'ameumwa', 'dharura', 'msaada', 'mordu', 'morsure', 'urgence']
+    first_aid_keywords = ['first aid', 'what to do', 'treatment', 'care', 'steps', 'how to help',
+                          'huduma ya kwanza', 'premiers secours', 'soins']
+    prevention_keywords = ['prevent', 'avoid', 'safety', 'protect', 'safe', 'precautions',
+                           'kuzuia', 'kuepuka', 'prévenir', 'éviter', 'protéger']
+    species_keywords = ['species', 'snake type', 'identify', 'what kind', 'which snake', 'mamba', 'cobra', 'adder',
+                        'aina ya nyoka', 'koboko', 'bafe', 'fira', 'espèce', 'vipère']
+    
+    if any(keyword in query_lower for keyword in emergency_keywords):
+        return QueryType.EMERGENCY
+    elif any(keyword in query_lower for keyword in first_aid_keywords):
+        return QueryType.FIRST_AID
+    elif any(keyword in query_lower for keyword in prevention_keywords):
+        return QueryType.PREVENTION
+    elif any(keyword in query_lower for keyword in species_keywords):
+        return QueryType.SPECIES_INFO
+    return None
+
 class ChatbotService:
     """Service for AI chatbot using OpenAI API with medical knowledge"""
     
     def __init__(self):
         self.gemini_api_key = settings.GEMINI_API_KEY
         self.chat_model = settings.GEMINI_MODEL
-        
-        # WHO/CDC knowledge base context
-        self.knowledge_base = """
-        You are a medical AI assistant specializing in snakebite emergency response and prevention.
-        Your knowledge is based on verified medical sources including:
-        - World Health Organization (WHO) Guidelines for Snakebite Prevention and Treatment
-        - Centers for Disease Control and Prevention (CDC) Snakebite Information
-        - Kenya Medical Research Institute (KEMRI) Research Data
-        
-        Key principles:
-        1. Always prioritize immediate medical attention for snakebites
-        2. Provide evidence-based first aid guidance
-        3. Never provide specific medical diagnoses or treatments
-        4. Always recommend contacting emergency services
-        5. Focus on prevention and awareness
-        
-        Emergency contacts for Kenya:
-        - Emergency Services: 999
-        - Ambulance: 112
-        - Police: 911
-        """
+        self.router = get_provider_router()
+        self.context_store = get_context_store()
+        self.templates = PROMPT_TEMPLATES
+        self.usage = get_usage_accountant()
+        self.guidance = get_guidance_index()
     
     async def process_query(self, request: ChatbotRequest) -> ChatbotResponse:
         """Process chatbot query using OpenAI API"""
@@ -52,16 +106,52 @@ class ChatbotService:
             logger.info("Processing chatbot query", query_type=request.query_type)
             
             # Determine query type if not provided
-            query_type = request.query_type or self._classify_query(request.query)
+            with span("chat.classify"):
+                query_type = request.query_type or await self._classify_query(request.query)
+            scope = current_scope()
+            scope.query_type = query_type.value
+            scope.critical = scope.critical or query_type == QueryType.EMERGENCY
+            
+            # Load earlier turns of this conversation, if any
+            with span("chat.context_load"):
+                context = (
+                    await self.context_store.get_owned(request.session_id, request.user_id)
+                    if request.session_id else None
+                )
+                history = context.conversation_history if context else []
             
             # Generate response based on query type
-            if self.gemini_api_key:
-                response = self._generate_response(request, query_type)
+            if self.router.has_provider("text"):
+                response = await self._generate_response(request, query_type, history)
             else:
                 # Mock response when no API key is available
                 response = self._generate_mock_response(request, query_type)
             
+            if request.session_id:
+                with span("chat.context_save"):
+                    saved = await self.context_store.append_turn(
+                        request.session_id, request.user_id, request.query, response["content"]
+                    )
+                if saved is None:
+                    logger.warning("Session belongs to another user, turn not recorded")
+            
+            # Warm the answers to the questions we are about to suggest
+            get_prefetcher().schedule_follow_ups(
+                response["follow_up_questions"], request.language, request.session_id
+            )
+            
             processing_time = asyncio.get_event_loop().time() - start_time
+            get_analytics().record(
+                CHAT_EVENT, request.session_id,
+                success=True,
+                query_type=query_type.value,
+                language=request.language,
+                confidence=response["confidence"],
+                model=response.get("model"),
+                latency_ms=round(processing_time * 1000, 2),
+                # "local" answers come from the pack, the guidance corpus or the fallback
+                cache=response.get("cache", "local"),
+            )
             
             return ChatbotResponse(
                 success=True,
@@ -77,6 +167,10 @@ class ChatbotService:
         except Exception as e:
             processing_time = asyncio.get_event_loop().time() - start_time
             logger.error("Chatbot query failed", error=str(e))
+            get_analytics().record(
+                CHAT_EVENT, request.session_id,
+                success=False, language=request.language, latency_ms=round(processing_time * 1000, 2),
+            )
             
             return ChatbotResponse(
                 success=False,
@@ -86,182 +180,168 @@ class ChatbotService:
                 processing_time=processing_time
             )
     
-    def _classify_query(self, query: str) -> QueryType:
+    async def _classify_query(self, query: str) -> QueryType:
         """Classify the type of query using keyword matching or Gemini if available"""
-        query_lower = query.lower()
-        
         # Simple keyword-based classification (works without API key)
-        emergency_keywords = ['emergency', 'bitten', 'bite', 'urgent', 'help', 'now', 'immediately', 'victim']
-        first_aid_keywords = ['first aid', 'what to do', 'treatment', 'care', 'steps', 'how to help']
-        prevention_keywords = ['prevent', 'avoid', 'safety', 'protect', 'safe', 'precautions']
-        species_keywords = ['species', 'snake type', 'identify', 'what kind', 'which snake', 'mamba', 'cobra', 'adder']
-        
-        if any(keyword in query_lower for keyword in emergency_keywords):
-            return QueryType.EMERGENCY
-        elif any(keyword in query_lower for keyword in first_aid_keywords):
-            return QueryType.FIRST_AID
-        elif any(keyword in query_lower for keyword in prevention_keywords):
-            return QueryType.PREVENTION
-        elif any(keyword in query_lower for keyword in species_keywords):
-            return QueryType.SPECIES_INFO
+        keyword_type = classify_by_keywords(query)
+        if keyword_type is not None:
+            return keyword_type
         
-        # If API key is available, try Gemini classification
-        if self.gemini_api_key:
+        # If a text provider is available, try LLM classification on the fast tier
+        if self.router.has_provider("text") and not self.usage.over_budget():
             try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.gemini_api_key)
-                model = genai.GenerativeModel(self.chat_model)
-                
-                classification_prompt = f"""
-                Classify this snakebite-related query into one of these categories:
-                - first_aid: Questions about immediate first aid for snakebites
-                - prevention: Questions about preventing snakebites
-                - species_info: Questions about specific snake species
-                - emergency: Urgent medical questions requiring immediate attention
-                - general: General questions about snakes or snakebites
-                
-                Query: "{query}"
-                
-                Return only the category name.
-                """
-                
-                response = model.generate_content(classification_prompt)
-                category = response.text.strip().lower()
+                classification_prompt = self.templates.classification(query)
+                routed = await _classify_flights.do(
+                    normalize_query(query),
+                    lambda: self.router.generate([classification_prompt], tier="fast")
+                )
+                category = routed.text.strip().lower()
                 return QueryType(category) if category in [e.value for e in QueryType] else QueryType.GENERAL
             except Exception as e:
-                logger.warning("Gemini classification failed, using keyword-based", error=str(e))
+                logger.warning("LLM classification failed, using keyword-based", error=str(e))
         
         # Default to general if no classification matches
         return QueryType.GENERAL
     
-    def _generate_response(self, request: ChatbotRequest, query_type: QueryType) -> Dict[str, Any]:
-        """Generate response based on query type using Gemini API"""
-        if not self.gemini_api_key:
-            # Fall back to mock if no API key
+    async def _generate_response(
+        self, request: ChatbotRequest, query_type: QueryType, history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Generate response based on query type using the routed text providers"""
+        if not self.router.has_provider("text"):
+            # Fall back to mock if no provider is configured
             return self._generate_mock_response(request, query_type)
         
-        import google.generativeai as genai
-        
         try:
-            genai.configure(api_key=self.gemini_api_key)
-            model = genai.GenerativeModel(self.chat_model)
+            key = chat_flight_key(request.query, query_type, request.language, history or [])
+            cached = _chat_responses.get(key)
+            if cached is not None:
+                prefetched = cached.pop("prefetched", None)
+                if prefetched:
+                    get_prefetcher().record(prefetched, "hit")
+                return dict(cached, cache="hit")
+            
+            # Follow-up turns depend on the conversation, so only fresh questions are answered directly
+            packed = None if history else self._answer_from_pack(request, query_type, "match", require_species=True)
+            if packed is not None:
+                return packed
+            
+            hits = self._retrieve(request.query)
+            # The guidance corpus is English, so other languages always go through the LLM.
+            # A passage on another topic (say species_info for an emergency) is context, never the answer.
+            if (hits and not history and normalize_language(request.language) == "en"
+                    and hits[0].passage.topic == query_type.value
+                    and hits[0].confidence >= settings.RETRIEVAL_ANSWER_CONFIDENCE):
+                CHAT_DIRECT_ANSWERS.labels(query_type=query_type.value).inc()
+                return self._answer_from_guidance(hits[0], query_type)
+            
+            budget = self.usage.over_budget()
+            if budget:
+                logger.info("Token budget exhausted, answering locally", query_type=query_type, budget=budget)
+                self.usage.degraded(budget)
+                return self._generate_mock_response(request, query_type)
             
             # Create context-specific prompt
-            prompt = self._create_prompt(request, query_type)
+            with span("chat.prompt") as prompt_span:
+                prompt = self._create_prompt(request, query_type, history or [], hits)
+                prompt_span.set_attribute("prompt.tokens", prompt.total_tokens)
+            PROMPT_TOKENS.labels(query_type=query_type.value).observe(prompt.total_tokens)
             
-            response = model.generate_content([
-                self.knowledge_base,
-                prompt
-            ])
+            # Identical questions asked concurrently share one upstream call
+            with span("chat.generate", query_type=query_type.value):
+                routed = await _chat_flights.do(
+                    key,
+                    lambda: self.router.generate(
+                        [prompt.body],
+                        tier=QUERY_TIERS.get(query_type),
+                        prefix=prompt.prefix,
+                    )
+                )
             
-            content = response.text
+            content = routed.text
+            logger.info("Chat response routed", query_type=query_type, **routed.metadata())
             
-            return {
+            response = {
                 "content": content,
                 "confidence": 0.85,  # Confidence score from AI
-                "sources": ["WHO Guidelines", "CDC Information", "KEMRI Research"],
+                "sources": sorted({hit.passage.source for hit in hits}) or ["WHO Guidelines", "CDC Information", "KEMRI Research"],
                 "follow_up_questions": self._generate_follow_up_questions(query_type),
-                "emergency_contact": self._get_emergency_contact(query_type)
+                "emergency_contact": self._get_emergency_contact(query_type),
+                "model": routed.model,
             }
+            _chat_responses.set(key, response)
+            return dict(response, cache="miss")
             
         except Exception as e:
-            logger.warning(f"Gemini API error, falling back to mock response: {str(e)}")
+            logger.warning(f"Text providers failed, falling back to mock response: {str(e)}")
             # Fall back to mock response if API fails
             return self._generate_mock_response(request, query_type)
     
-    def _create_prompt(self, request: ChatbotRequest, query_type: QueryType) -> str:
-        """Create context-specific prompt based on query type"""
-        base_prompt = f"User query: {request.query}\nLanguage: {request.language}"
+    async def warm(
+        self, query: str, language: str, session_id: Optional[str], kind: str, user_id: Optional[str] = None
+    ) -> str:
+        """Generate the answer to an expected request into the chat cache
         
-        if query_type == QueryType.EMERGENCY:
-            return f"""
-            {base_prompt}
-            
-            This is an EMERGENCY query about snakebites. Provide immediate first aid guidance
-            and strongly emphasize calling emergency services (999 in Kenya).
-            
-            IMPORTANT: Format your response with clean, professional structure:
-            - Use clear section headers without any special characters (e.g., "General Characteristics", "Venom Types", "Prevention")
-            - Use bullet points (•) for lists
-            - Use numbered lists (1., 2., 3.) for step-by-step instructions
-            - Separate different topics with double line breaks
-            - Keep paragraphs concise and readable
-            - NEVER use asterisks (*) or any markdown formatting symbols
-            - Write in a professional, medical tone
-            - Examples of clean headers: "General Characteristics", "Venom Types", "Emergency Response"
-            - Do not use any formatting symbols like *, **, or other special characters
-            """
-        elif query_type == QueryType.FIRST_AID:
-            return f"""
-            {base_prompt}
-            
-            Provide detailed first aid guidance for snakebites based on WHO guidelines.
-            Include step-by-step instructions and what NOT to do.
-            
-            IMPORTANT: Format your response with clean, professional structure:
-            - Use clear section headers without any special characters (e.g., "General Characteristics", "Venom Types", "Prevention")
-            - Use bullet points (•) for lists
-            - Use numbered lists (1., 2., 3.) for step-by-step instructions
-            - Separate different topics with double line breaks
-            - Keep paragraphs concise and readable
-            - NEVER use asterisks (*) or any markdown formatting symbols
-            - Write in a professional, medical tone
-            - Examples of clean headers: "General Characteristics", "Venom Types", "Emergency Response"
-            - Do not use any formatting symbols like *, **, or other special characters
-            """
-        elif query_type == QueryType.PREVENTION:
-            return f"""
-            {base_prompt}
-            
-            Provide prevention tips and awareness information about snakebites.
-            Focus on practical advice for avoiding snake encounters.
-            
-            IMPORTANT: Format your response with clean, professional structure:
-            - Use clear section headers without any special characters (e.g., "General Characteristics", "Venom Types", "Prevention")
-            - Use bullet points (•) for lists
-            - Use numbered lists (1., 2., 3.) for step-by-step instructions
-            - Separate different topics with double line breaks
-            - Keep paragraphs concise and readable
-            - NEVER use asterisks (*) or any markdown formatting symbols
-            - Write in a professional, medical tone
-            - Examples of clean headers: "General Characteristics", "Venom Types", "Emergency Response"
-            - Do not use any formatting symbols like *, **, or other special characters
-            """
-        elif query_type == QueryType.SPECIES_INFO:
-            return f"""
-            {base_prompt}
-            
-            Provide information about specific snake species, their characteristics,
-            venom types, and geographic distribution in Africa.
-            
-            IMPORTANT: Format your response with clean, professional structure:
-            - Use clear section headers without any special characters (e.g., "General Characteristics", "Venom Types", "Prevention")
-            - Use bullet points (•) for lists
-            - Use numbered lists (1., 2., 3.) for step-by-step instructions
-            - Separate different topics with double line breaks
-            - Keep paragraphs concise and readable
-            - NEVER use asterisks (*) or any markdown formatting symbols
-            - Write in a professional, medical tone
-            - Examples of clean headers: "General Characteristics", "Venom Types", "Emergency Response"
-            - Do not use any formatting symbols like *, **, or other special characters
-            """
-        else:
-            return f"""
-            {base_prompt}
-            
-            Provide helpful information about snakebites, safety, and emergency response.
-            
-            IMPORTANT: Format your response with clean, professional structure:
-            - Use clear section headers without any special characters (e.g., "General Characteristics", "Venom Types", "Prevention")
-            - Use bullet points (•) for lists
-            - Use numbered lists (1., 2., 3.) for step-by-step instructions
-            - Separate different topics with double line breaks
-            - Keep paragraphs concise and readable
-            - NEVER use asterisks (*) or any markdown formatting symbols
-            - Write in a professional, medical tone
-            - Examples of clean headers: "General Characteristics", "Venom Types", "Emergency Response"
-            - Do not use any formatting symbols like *, **, or other special characters
-            """
+        Returns "cached" when it is already there, "warmed" when it was generated
+        and "local" when it is answered without an upstream call anyway.
+        """
+        request = ChatbotRequest(query=query, language=language, session_id=session_id, user_id=user_id)
+        query_type = await self._classify_query(query)
+        current_scope().query_type = query_type.value
+        context = await self.context_store.get_owned(session_id, user_id) if session_id else None
+        history = context.conversation_history if context else []
+        
+        key = chat_flight_key(query, query_type, language, history)
+        if key in _chat_responses:
+            return "cached"
+        await self._generate_response(request, query_type, history)
+        cached = _chat_responses.get(key)
+        if cached is None:
+            return "local"
+        cached["prefetched"] = kind
+        return "warmed"
+    
+    def _retrieve(self, query: str) -> List[Hit]:
+        """Guidance passages relevant to the query, best first"""
+        if not settings.RETRIEVAL_ENABLED:
+            return []
+        with span("chat.retrieve") as retrieve_span:
+            hits = self.guidance.search(query, settings.RETRIEVAL_TOP_K)
+            retrieve_span.set_attribute("retrieval.hits", len(hits))
+        return hits
+    
+    def _answer_from_guidance(self, hit: Hit, query_type: QueryType) -> Dict[str, Any]:
+        """Response built from a retrieved passage, without an upstream call"""
+        logger.info("Chat answered from guidance", query_type=query_type,
+                   passage=hit.passage.id, retrieval_confidence=round(hit.confidence, 2))
+        return {
+            "content": f"{hit.passage.title}\n\n{hit.passage.text}",
+            "confidence": round(min(hit.confidence, 0.95), 2),
+            "sources": [hit.passage.source],
+            "follow_up_questions": self._generate_follow_up_questions(query_type),
+            "emergency_contact": self._get_emergency_contact(query_type)
+        }
+    
+    def _create_prompt(
+        self,
+        request: ChatbotRequest,
+        query_type: QueryType,
+        history: List[Dict[str, str]],
+        passages: Sequence[Hit] = ()
+    ) -> CompiledPrompt:
+        """Create context-specific prompt from the precompiled templates"""
+        prompt = self.templates.render(
+            request.query,
+            request.language,
+            query_type,
+            history,
+            budget=settings.PROMPT_TOKEN_BUDGET,
+            passages=passages
+        )
+        logger.debug("Prompt compiled",
+                    query_type=query_type,
+                    prefix_tokens=prompt.prefix_tokens,
+                    body_tokens=prompt.body_tokens)
+        return prompt
     
     def _generate_follow_up_questions(self, query_type: QueryType) -> List[str]:
         """Generate relevant follow-up questions based on query type"""
@@ -300,8 +380,34 @@ class ChatbotService:
             return "Emergency Services: 999 (Kenya) | Ambulance: 112 | Police: 911"
         return None
     
+    def _answer_from_pack(
+        self, request: ChatbotRequest, query_type: QueryType, reason: str, require_species: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Precomputed answer in the request's language, if the pack has one"""
+        pack = get_answer_pack()
+        if pack is None:
+            return None
+        species = pack.species_in(request.query)
+        if require_species and species is None:
+            return None
+        entry = pack.lookup(query_type, request.language, species)
+        if entry is None or (require_species and not entry.get("species")):
+            return None
+        CHAT_PACK_ANSWERS.labels(language=entry["language"], reason=reason).inc()
+        return {
+            "content": entry["content"],
+            "confidence": entry["confidence"],
+            "sources": entry["sources"],
+            "follow_up_questions": entry.get("follow_up_questions") or self._generate_follow_up_questions(query_type),
+            "emergency_contact": self._get_emergency_contact(query_type)
+        }
+    
     def _generate_mock_response(self, request: ChatbotRequest, query_type: QueryType) -> Dict[str, Any]:
-        """Generate mock response when no API key is available"""
+        """Local answer when no provider is available, it failed or the token budget is spent"""
+        packed = self._answer_from_pack(request, query_type, "degraded")
+        if packed is not None:
+            return packed
+        
         mock_responses = {
             QueryType.EMERGENCY: {
                 "content": "🚨 EMERGENCY: If you've been bitten by a snake, call 999 immediately! Keep the victim calm, immobilize the affected limb, and get to the nearest hospital with antivenom. Do NOT apply a tourniquet or try to suck out the venom.",
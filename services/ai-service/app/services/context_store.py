@@ -0,0 +1,229 @@
+"""
+Conversation context store keyed by session_id
+
+Sessions expire after CONTEXT_TTL_SECONDS of inactivity and keep at most
+CONTEXT_MAX_TURNS history entries. The in-process backend also bounds the total
+number of sessions with LRU eviction; the Redis backend shares sessions between
+workers and relies on key TTLs (plus the server's maxmemory policy) instead.
+
+A context belongs to the user_id that created it. Sessions without one belong
+to "anonymous", which the context endpoints never accept. ``update`` changes a
+context only for its owner. Its read-modify-write is atomic, so concurrent
+turns are never lost.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.chatbot import ChatbotContext
+from app.utils.tokens import estimate_tokens, truncate_to_tokens
+
+logger = get_logger(__name__)
+
+ANONYMOUS = "anonymous"
+
+def owner_of(user_id: Optional[str]) -> str:
+    return user_id or ANONYMOUS
+
+class ContextStore:
+    """Base class for conversation context backends"""
+
+    def __init__(self, ttl: int, max_turns: int, max_turn_chars: int):
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_turn_chars = max_turn_chars
+
+    async def get(self, session_id: str) -> Optional[ChatbotContext]:
+        raise NotImplementedError
+
+    async def put(self, context: ChatbotContext) -> None:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def _cap(self, context: ChatbotContext) -> ChatbotContext:
+        """Apply the per-session memory caps"""
+        history = context.conversation_history[-self.max_turns:]
+        context.conversation_history = [
+            {k: v[: self.max_turn_chars] if isinstance(v, str) else v for k, v in turn.items()}
+            for turn in history
+        ]
+        return context
+
+    async def get_owned(self, session_id: str, user_id: Optional[str]) -> Optional[ChatbotContext]:
+        """Context of a session, if user_id owns it"""
+        context = await self.get(session_id)
+        if context is None or context.user_id != owner_of(user_id):
+            return None
+        return context
+
+    @staticmethod
+    def _apply(
+        context: Optional[ChatbotContext],
+        session_id: str,
+        user_id: Optional[str],
+        change: Callable[[ChatbotContext], None],
+    ) -> Optional[ChatbotContext]:
+        if context is None:
+            context = ChatbotContext(user_id=owner_of(user_id), session_id=session_id)
+        elif context.user_id != owner_of(user_id):
+            return None
+        change(context)
+        return context
+
+    async def update(
+        self, session_id: str, user_id: Optional[str], change: Callable[[ChatbotContext], None]
+    ) -> Optional[ChatbotContext]:
+        """Apply change to a session's context, creating it for user_id if needed
+
+        Returns the stored context, or None when another user owns the session.
+        """
+        # Nothing awaits between the read and the write, so this is atomic in-process
+        context = self._apply(await self.get(session_id), session_id, user_id, change)
+        if context is not None:
+            await self.put(context)
+        return context
+
+    async def append_turn(
+        self, session_id: str, user_id: Optional[str], query: str, response: str
+    ) -> Optional[ChatbotContext]:
+        """Record one user/assistant exchange for a session"""
+        turn = [{"role": "user", "content": query}, {"role": "assistant", "content": response}]
+        return await self.update(
+            session_id, user_id, lambda context: context.conversation_history.extend(turn)
+        )
+
+class InMemoryContextStore(ContextStore):
+    """Single-process store with TTL expiry and an LRU bound on sessions"""
+
+    def __init__(self, ttl: int, max_turns: int, max_turn_chars: int, max_sessions: int):
+        super().__init__(ttl, max_turns, max_turn_chars)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, ChatbotContext]]" = OrderedDict()
+
+    async def get(self, session_id: str) -> Optional[ChatbotContext]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, context = entry
+        if expires_at < time.monotonic():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return context.model_copy(deep=True)
+
+    async def put(self, context: ChatbotContext) -> None:
+        self._sessions[context.session_id] = (time.monotonic() + self.ttl, self._cap(context))
+        self._sessions.move_to_end(context.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class RedisContextStore(ContextStore):
+    """Redis-backed store shared by every worker"""
+
+    key_prefix = "snaktox:ai:context:"
+    max_update_attempts = 5
+
+    def __init__(self, url: str, ttl: int, max_turns: int, max_turn_chars: int):
+        super().__init__(ttl, max_turns, max_turn_chars)
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def get(self, session_id: str) -> Optional[ChatbotContext]:
+        raw = await self._redis.get(self.key_prefix + session_id)
+        if raw is None:
+            return None
+        return ChatbotContext.model_validate_json(raw)
+
+    async def put(self, context: ChatbotContext) -> None:
+        await self._redis.set(
+            self.key_prefix + context.session_id, self._cap(context).model_dump_json(), ex=self.ttl
+        )
+
+    async def delete(self, session_id: str) -> bool:
+        return bool(await self._redis.delete(self.key_prefix + session_id))
+
+    async def update(
+        self, session_id: str, user_id: Optional[str], change: Callable[[ChatbotContext], None]
+    ) -> Optional[ChatbotContext]:
+        """WATCH/MULTI read-modify-write, retried when another worker changed the key"""
+        from redis.exceptions import WatchError
+
+        key = self.key_prefix + session_id
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for _ in range(self.max_update_attempts):
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    current = ChatbotContext.model_validate_json(raw) if raw is not None else None
+                    context = self._apply(current, session_id, user_id, change)
+                    if context is None:
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.set(key, self._cap(context).model_dump_json(), ex=self.ttl)
+                    await pipe.execute()
+                    return context
+                except WatchError:
+                    continue
+        raise RuntimeError(f"Context for session {session_id} kept changing, update abandoned")
+
+def summarize_history(history: List[Dict[str, str]], max_tokens: int) -> str:
+    """Compact summary of the most recent turns that fits in max_tokens
+
+    Walks backwards from the latest turn, clipping each message, and stops when
+    the budget is spent so the newest context always survives.
+    """
+    if not history or max_tokens <= 0:
+        return ""
+    header = "Conversation so far (most recent last):"
+    budget = max_tokens - estimate_tokens(header)
+    per_turn = max(16, max_tokens // 4)
+    lines: List[str] = []
+    for turn in reversed(history):
+        role = "User" if turn.get("role") == "user" else "Assistant"
+        content = " ".join(str(turn.get("content", "")).split())
+        line = f"{role}: {truncate_to_tokens(content, per_turn)}"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        lines.append(line)
+        budget -= cost
+    if not lines:
+        return ""
+    return "\n".join([header, *reversed(lines)])
+
+_store: Optional[ContextStore] = None
+
+def get_context_store() -> ContextStore:
+    """Process-wide context store for the configured backend"""
+    global _store
+    if _store is None:
+        if settings.CONTEXT_STORE_BACKEND == "redis" and settings.REDIS_URL:
+            _store = RedisContextStore(
+                settings.REDIS_URL,
+                ttl=settings.CONTEXT_TTL_SECONDS,
+                max_turns=settings.CONTEXT_MAX_TURNS,
+                max_turn_chars=settings.CONTEXT_MAX_TURN_CHARS,
+            )
+        else:
+            if settings.CONTEXT_STORE_BACKEND == "redis":
+                logger.warning("REDIS_URL not set, using in-memory context store")
+            _store = InMemoryContextStore(
+                ttl=settings.CONTEXT_TTL_SECONDS,
+                max_turns=settings.CONTEXT_MAX_TURNS,
+                max_turn_chars=settings.CONTEXT_MAX_TURN_CHARS,
+                max_sessions=settings.CONTEXT_MAX_SESSIONS,
+            )
+    return _store
@@ -0,0 +1,337 @@
+"""
+In-memory spatial index of hospitals and their antivenom stock
+
+Facilities come from a JSON snapshot in the format of prisma/seed/hospitals.json
+(an exported Hospital collection, optionally with each hospital's stockUpdates).
+A copy ships in app/data/hospitals so the service image is self-contained.
+Stock updates past their expiryDate are not counted as stock.
+Coordinates are mapped to points on the unit sphere and kept in one KD-tree per
+antivenom type, holding only facilities that currently stock it. Straight-line
+distance between unit vectors grows monotonically with great-circle distance,
+so the tree's Euclidean pruning gives exact nearest-by-distance answers.
+
+The snapshot file is re-read when its modification time changes or the
+earliest counted stock update expires, checked at most every
+HOSPITAL_REFRESH_SECONDS; the rebuilt index replaces the old one in
+a single assignment, so queries never see a half-built index.
+"""
+
+import bisect
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Stock entries that are bookkeeping rather than antivenom quantities
+_STOCK_META_KEYS = {"lastUpdated", "last_updated"}
+
+# Snapshot bundled with the service, used when HOSPITAL_DATA_PATH is unset
+_DEFAULT_DATA_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "hospitals", "hospitals.json")
+)
+
+Vector = Tuple[float, float, float]
+
+def to_unit_vector(lat: float, lng: float) -> Vector:
+    phi, lam = math.radians(lat), math.radians(lng)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+def chord_to_km(chord: float) -> float:
+    """Great-circle distance for a straight-line distance between unit vectors"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+def parse_location(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse "lat,lng" or a JSON {"lat", "lng"} object; None when absent or invalid
+
+    The backend forwards the client's location as JSON.
+
+    >>> parse_location("-1.2921,36.8219")
+    (-1.2921, 36.8219)
+    >>> parse_location('{"lat": -1.2921, "lng": 36.8219}')
+    (-1.2921, 36.8219)
+    >>> parse_location('{"latitude": 6.5, "longitude": 3.4}')
+    (6.5, 3.4)
+    >>> parse_location('{"lat": 91, "lng": 0}') is None
+    True
+    """
+    if not location:
+        return None
+    try:
+        if location.lstrip().startswith("{"):
+            data = json.loads(location)
+            lat = float(data["lat"] if "lat" in data else data["latitude"])
+            lng = float(data["lng"] if "lng" in data else data["longitude"])
+        else:
+            lat_text, lng_text = location.split(",", 1)
+            lat, lng = float(lat_text), float(lng_text)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    return lat, lng
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """Unix time of an exported DateTime (ISO string or {"$date": ...}); None if unreadable"""
+    if isinstance(value, dict):
+        value = value.get("$date")
+    if isinstance(value, (int, float)):
+        return value / 1000.0  # extended JSON epoch milliseconds
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+@dataclass
+class Facility:
+    """A hospital with its current antivenom stock"""
+    name: str
+    address: str
+    country: str
+    lat: float
+    lng: float
+    stock: Dict[str, int]
+    phone: Optional[str] = None
+    emergency_phone: Optional[str] = None
+    emergency_services: bool = True
+    verified_status: str = "PENDING"
+    # Earliest expiry among the stock updates counted in stock
+    stock_expires_at: Optional[float] = None
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], now: Optional[float] = None) -> Optional["Facility"]:
+        """Build from an exported Hospital document; None if it has no coordinates"""
+        now = time.time() if now is None else now
+        coordinates = record.get("coordinates") or {}
+        try:
+            lat, lng = float(coordinates["lat"]), float(coordinates["lng"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        stock: Dict[str, int] = {}
+        for name, quantity in (record.get("antivenomStock") or {}).items():
+            if name in _STOCK_META_KEYS:
+                continue
+            try:
+                stock[name.lower()] = int(quantity)
+            except (TypeError, ValueError):
+                continue
+        # Stock updates, when exported, are more current than the embedded summary
+        updates: Dict[str, int] = {}
+        stock_expires_at: Optional[float] = None
+        for update in record.get("stockUpdates") or []:
+            if update.get("status", "AVAILABLE") != "AVAILABLE":
+                continue
+            kind = str(update.get("antivenomType", "")).lower()
+            if not kind:
+                continue
+            expires_at = _parse_timestamp(update.get("expiryDate"))
+            if expires_at is not None:
+                if expires_at <= now:
+                    # Expired vials are no use to a patient, whatever the count says
+                    updates.setdefault(kind, 0)
+                    continue
+                stock_expires_at = min(expires_at, stock_expires_at or expires_at)
+            updates[kind] = updates.get(kind, 0) + int(update.get("quantity") or 0)
+        stock.update(updates)
+
+        contact = record.get("contactInfo") or {}
+        return cls(
+            name=record.get("name", "Unknown facility"),
+            address=record.get("location", ""),
+            country=record.get("country", ""),
+            lat=lat,
+            lng=lng,
+            stock=stock,
+            phone=contact.get("phone"),
+            emergency_phone=contact.get("emergency"),
+            emergency_services=bool(record.get("emergencyServices", True)),
+            verified_status=record.get("verifiedStatus", "PENDING"),
+            stock_expires_at=stock_expires_at,
+        )
+
+class KDTree:
+    """Static 3-d tree over unit vectors, stored as an implicit balanced array"""
+
+    __slots__ = ("_points", "_items")
+
+    def __init__(self, points: Sequence[Vector], items: Sequence[Any]):
+        order = list(range(len(points)))
+        self._points: List[Vector] = [(0.0, 0.0, 0.0)] * len(points)
+        self._items: List[Any] = [None] * len(points)
+        self._build(order, 0, len(order), 0, points, items)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _build(self, order: List[int], lo: int, hi: int, axis: int,
+               points: Sequence[Vector], items: Sequence[Any]) -> None:
+        if lo >= hi:
+            return
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+        mid = (lo + hi) // 2
+        self._points[mid] = points[order[mid]]
+        self._items[mid] = items[order[mid]]
+        next_axis = (axis + 1) % 3
+        self._build(order, lo, mid, next_axis, points, items)
+        self._build(order, mid + 1, hi, next_axis, points, items)
+
+    def nearest(self, target: Vector, k: int, max_chord: float = 2.0) -> List[Tuple[float, Any]]:
+        """Up to k (chord distance, item) pairs within max_chord, closest first"""
+        best: List[Tuple[float, int]] = []  # sorted (squared distance, index)
+        bound = max_chord * max_chord
+        points = self._points
+        # (lo, hi, axis, squared distance from target to the subtree's splitting plane)
+        stack = [(0, len(points), 0, 0.0)]
+        while stack:
+            lo, hi, axis, plane = stack.pop()
+            if lo >= hi or plane > bound:
+                continue
+            mid = (lo + hi) // 2
+            point = points[mid]
+            dx, dy, dz = point[0] - target[0], point[1] - target[1], point[2] - target[2]
+            dist = dx * dx + dy * dy + dz * dz
+            if dist <= bound:
+                bisect.insort(best, (dist, mid))
+                if len(best) > k:
+                    best.pop()
+                if len(best) == k:
+                    bound = best[-1][0]
+            delta = target[axis] - point[axis]
+            next_axis = (axis + 1) % 3
+            # Far side pushed first so the near side is searched (and tightens the bound) first
+            if delta < 0:
+                stack.append((mid + 1, hi, next_axis, delta * delta))
+                stack.append((lo, mid, next_axis, plane))
+            else:
+                stack.append((lo, mid, next_axis, delta * delta))
+                stack.append((mid + 1, hi, next_axis, plane))
+        return [(math.sqrt(dist), self._items[i]) for dist, i in best]
+
+class HospitalIndex:
+    """Nearest-facility queries over one snapshot of hospitals"""
+
+    def __init__(self, facilities: List[Facility]):
+        self.facilities = facilities
+        vectors = [to_unit_vector(f.lat, f.lng) for f in facilities]
+        self._trees: Dict[str, KDTree] = {}
+        for kind in sorted({kind for f in facilities for kind in f.stock}):
+            stocked = [i for i, f in enumerate(facilities) if f.stock.get(kind, 0) > 0]
+            self._trees[kind] = KDTree([vectors[i] for i in stocked], [facilities[i] for i in stocked])
+        self._all = KDTree(vectors, facilities)
+        # When the earliest counted stock update expires and the index must be rebuilt
+        self.expires_at = min(
+            (f.stock_expires_at for f in facilities if f.stock_expires_at is not None), default=None
+        )
+
+    @property
+    def antivenom_types(self) -> List[str]:
+        return list(self._trees)
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        antivenoms: Optional[Sequence[str]] = None,
+        k: int = 3,
+        max_km: Optional[float] = None,
+    ) -> List[Tuple[float, Facility]]:
+        """k nearest facilities stocking any of the antivenoms, as (km, facility)"""
+        target = to_unit_vector(lat, lng)
+        max_chord = 2.0
+        if max_km:
+            max_chord = 2 * math.sin(min(max_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+        if antivenoms is None:
+            trees = [self._all]
+        else:
+            trees = [self._trees[kind] for kind in antivenoms if kind in self._trees]
+
+        found: Dict[int, Tuple[float, Facility]] = {}
+        for tree in trees:
+            for chord, facility in tree.nearest(target, k, max_chord):
+                key = id(facility)
+                if key not in found or chord < found[key][0]:
+                    found[key] = (chord, facility)
+        ranked = sorted(found.values(), key=lambda pair: pair[0])[:k]
+        return [(chord_to_km(chord), facility) for chord, facility in ranked]
+
+def load_facilities(path: str) -> List[Facility]:
+    """Read a hospital snapshot: {"hospitals": [...]} or a bare list"""
+    with open(path) as f:
+        data = json.load(f)
+    records = data.get("hospitals", []) if isinstance(data, dict) else data
+    facilities = []
+    for record in records:
+        facility = Facility.from_record(record)
+        if facility is not None:
+            facilities.append(facility)
+    return facilities
+
+class HospitalIndexHolder:
+    """Current index for the snapshot file, rebuilt when the file changes or stock expires"""
+
+    def __init__(self, path: Optional[str], refresh_seconds: float):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.index = HospitalIndex([])
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> HospitalIndex:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return self.index
+        self._checked_at = now
+        if not self.path:
+            return self.index
+        try:
+            mtime = os.path.getmtime(self.path)
+            expired = self.index.expires_at is not None and self.index.expires_at <= time.time()
+            if mtime == self._mtime and not expired:
+                return self.index
+            facilities = load_facilities(self.path)
+        except (OSError, ValueError) as e:
+            if self._mtime is None:
+                logger.error("Hospital snapshot not loaded, nearby facilities unavailable",
+                             path=self.path, error=str(e))
+            else:
+                # Keep serving the last good snapshot
+                logger.warning("Hospital snapshot not reloaded", path=self.path, error=str(e))
+            return self.index
+        self.index = HospitalIndex(facilities)
+        self._mtime = mtime
+        logger.info("Hospital index loaded", facilities=len(facilities),
+                    antivenoms=self.index.antivenom_types)
+        return self.index
+
+    def get(self) -> HospitalIndex:
+        return self.refresh()
+
+_holder: Optional[HospitalIndexHolder] = None
+
+def get_hospital_index() -> HospitalIndex:
+    """Current process-wide hospital index"""
+    global _holder
+    if _holder is None:
+        path = settings.HOSPITAL_DATA_PATH or _DEFAULT_DATA_PATH
+        _holder = HospitalIndexHolder(path, settings.HOSPITAL_REFRESH_SECONDS)
+        _holder.refresh(force=True)
+    return _holder.get()
@@ -0,0 +1,322 @@
+"""
+Asynchronous detection jobs
+
+Submitting a job returns immediately; a bounded pool of background workers runs
+the detection and stores the outcome in a TTL store, from which clients poll,
+long-poll, or receive it via webhook. Queued jobs hold their image bytes, so the
+queue is bounded both in jobs (JOBS_QUEUE_SIZE) and in bytes
+(JOBS_QUEUE_MAX_BYTES); a submission that does not fit is shed with 503.
+Submissions carrying a client key are
+idempotent on user, image hash and client key, so a retried submission attaches
+to the job already running; without a key every submission is a new job.
+
+Webhooks must be https URLs on a public host (or on JOBS_WEBHOOK_ALLOWED_HOSTS),
+checked when the job is submitted and again before delivery. Polls and webhook
+bodies carry the public DetectionJob, without the submitter's ids or webhook.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.admission import Priority, get_admission_controller
+from app.core.config import settings
+from app.core.exceptions import OverloadedError
+from app.core.lifecycle import inflight
+from app.core.logging import get_logger
+from app.core.memory_budget import get_image_budget, image_footprint
+from app.core.metrics import JOBS_QUEUE_BYTES, JOBS_QUEUE_DEPTH, JOBS_TOTAL
+from app.models.jobs import JobRecord, JobStatus
+from app.services.snake_detection_service import SnakeDetectionService
+from app.services.usage import usage_scope
+from app.utils.cache import TTLCache
+from app.utils.urls import UnsafeURLError, check_public_url
+
+logger = get_logger(__name__)
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class JobStore:
+    """Base class for job state backends"""
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        raise NotImplementedError
+
+    async def save(self, job: JobRecord) -> None:
+        raise NotImplementedError
+
+    async def claim_key(self, idempotency_key: str, job_id: str) -> Optional[str]:
+        """Bind an idempotency key to job_id; returns the existing job id if already bound"""
+        raise NotImplementedError
+
+    async def release_key(self, idempotency_key: str) -> None:
+        raise NotImplementedError
+
+class InMemoryJobStore(JobStore):
+    """Per-process job store"""
+
+    def __init__(self, ttl: int, max_jobs: int):
+        self._jobs: TTLCache[str, JobRecord] = TTLCache(max_jobs, ttl)
+        self._keys: TTLCache[str, str] = TTLCache(max_jobs, ttl)
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        job = self._jobs.get(job_id)
+        return job.model_copy() if job else None
+
+    async def save(self, job: JobRecord) -> None:
+        self._jobs.set(job.job_id, job.model_copy())
+
+    async def claim_key(self, idempotency_key: str, job_id: str) -> Optional[str]:
+        existing = self._keys.get(idempotency_key)
+        if existing is not None:
+            return existing
+        self._keys.set(idempotency_key, job_id)
+        return None
+
+    async def release_key(self, idempotency_key: str) -> None:
+        self._keys.pop(idempotency_key)
+
+class RedisJobStore(JobStore):
+    """Redis-backed job store, so any worker can answer polls"""
+
+    key_prefix = "snaktox:ai:jobs:"
+
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        raw = await self._redis.get(self.key_prefix + job_id)
+        return JobRecord.model_validate_json(raw) if raw else None
+
+    async def save(self, job: JobRecord) -> None:
+        await self._redis.set(self.key_prefix + job.job_id, job.model_dump_json(), ex=self.ttl)
+
+    async def claim_key(self, idempotency_key: str, job_id: str) -> Optional[str]:
+        key = self.key_prefix + "key:" + idempotency_key
+        if await self._redis.set(key, job_id, ex=self.ttl, nx=True):
+            return None
+        existing = await self._redis.get(key)
+        return existing.decode() if existing else None
+
+    async def release_key(self, idempotency_key: str) -> None:
+        await self._redis.delete(self.key_prefix + "key:" + idempotency_key)
+
+class JobService:
+    """Queue, run and track asynchronous detection jobs"""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Image bytes in the queue; bounded by JOBS_QUEUE_MAX_BYTES as well as the job count
+        self._queued_bytes = 0
+        # Webhook deliveries, run apart from the workers so a dead webhook holds no worker
+        self._notifications: Set[asyncio.Task] = set()
+        # Completion events for long-polls served by this process
+        self._done_events: Dict[str, asyncio.Event] = {}
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.JOBS_QUEUE_SIZE)
+            self._workers = [
+                asyncio.create_task(self._worker(i)) for i in range(settings.JOBS_CONCURRENCY)
+            ]
+        return self._queue
+
+    async def submit(
+        self,
+        image_data: bytes,
+        mime_type: str,
+        client_key: str = "",
+        webhook_url: Optional[str] = None,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        confidence_threshold: float = 0.7,
+        location: Optional[str] = None,
+    ) -> Tuple[JobRecord, bool]:
+        """Create a job, or return the same user's existing one for the same image and client key"""
+        image_sha256 = hashlib.sha256(image_data).hexdigest()
+        # Scoped to the user, so nobody attaches to another user's job
+        idempotency_key = f"{user_id or ''}:{image_sha256}:{client_key}" if client_key else None
+        job_id = uuid.uuid4().hex
+
+        if idempotency_key is not None:
+            existing_id = await self.store.claim_key(idempotency_key, job_id)
+            if existing_id is not None:
+                existing = await self.store.get(existing_id)
+                if existing is not None and existing.status != JobStatus.FAILED:
+                    JOBS_TOTAL.labels(outcome="attached").inc()
+                    return existing, False
+                # Failed or expired job: let the retry start a fresh one
+                await self.store.release_key(idempotency_key)
+                await self.store.claim_key(idempotency_key, job_id)
+
+        queue = self._ensure_workers()
+        if queue.full() or self._queued_bytes + len(image_data) > settings.JOBS_QUEUE_MAX_BYTES:
+            if idempotency_key is not None:
+                await self.store.release_key(idempotency_key)
+            JOBS_TOTAL.labels(outcome="rejected").inc()
+            raise OverloadedError(retry_after=settings.ADMISSION_RETRY_AFTER, message="Detection job queue is full")
+
+        now = _now()
+        job = JobRecord(
+            job_id=job_id,
+            status=JobStatus.QUEUED,
+            created_at=now,
+            updated_at=now,
+            image_sha256=image_sha256,
+            client_key=client_key or None,
+            user_id=user_id,
+            session_id=session_id,
+            webhook_url=webhook_url,
+        )
+        await self.store.save(job)
+        self._done_events[job_id] = asyncio.Event()
+        options = {"confidence_threshold": confidence_threshold, "location": location}
+        queue.put_nowait((job_id, image_data, mime_type, options))
+        self._queued_bytes += len(image_data)
+        JOBS_QUEUE_DEPTH.set(queue.qsize())
+        JOBS_QUEUE_BYTES.set(self._queued_bytes)
+        JOBS_TOTAL.labels(outcome="submitted").inc()
+        logger.info("Detection job submitted", job_id=job_id, image_sha256=image_sha256[:16])
+        return job, True
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        return await self.store.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[JobRecord]:
+        """Long-poll: return once the job is finished or timeout seconds pass"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.store.get(job_id)
+            remaining = deadline - loop.time()
+            if job is None or job.status.is_terminal or remaining <= 0:
+                return job
+            event = self._done_events.get(job_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), remaining)
+                else:
+                    # Job owned by another worker process: poll the shared store
+                    await asyncio.sleep(min(0.5, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, index: int) -> None:
+        assert self._queue is not None
+        service = SnakeDetectionService()
+        while True:
+            job_id, image_data, mime_type, options = await self._queue.get()
+            self._queued_bytes -= len(image_data)
+            JOBS_QUEUE_DEPTH.set(self._queue.qsize())
+            JOBS_QUEUE_BYTES.set(self._queued_bytes)
+            try:
+                async with inflight.track("job"):
+                    await self._run(service, job_id, image_data, mime_type, options)
+            except Exception as e:
+                logger.error("Detection job worker error", job_id=job_id, worker=index, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run(
+        self,
+        service: SnakeDetectionService,
+        job_id: str,
+        image_data: bytes,
+        mime_type: str,
+        options: Dict[str, Any],
+    ) -> None:
+        job = await self.store.get(job_id)
+        if job is None:
+            return
+        job.status = JobStatus.RUNNING
+        job.updated_at = _now()
+        await self.store.save(job)
+
+        try:
+            with usage_scope("jobs", job.user_id, critical=True):
+                async with get_image_budget().reserve(image_footprint(len(image_data))):
+                    async with get_admission_controller().slot(Priority.CRITICAL):
+                        result = await service.detect_image(image_data, mime_type, **options)
+            job.result = result
+            job.status = JobStatus.SUCCEEDED if result.success else JobStatus.FAILED
+            job.error = result.error
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        job.updated_at = _now()
+        await self.store.save(job)
+        JOBS_TOTAL.labels(outcome=job.status.value).inc()
+        logger.info("Detection job finished", job_id=job_id, status=job.status.value)
+
+        event = self._done_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+        if job.webhook_url:
+            task = asyncio.create_task(self._notify(job))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    async def _notify(self, job: JobRecord) -> None:
+        """POST the finished job to its webhook, signed with SECRET_KEY"""
+        import httpx
+
+        try:
+            # Checked again in case the host now resolves elsewhere
+            await check_public_url(job.webhook_url, settings.JOBS_WEBHOOK_ALLOWED_HOSTS)
+        except UnsafeURLError as e:
+            logger.warning("Job webhook not delivered", job_id=job.job_id, error=str(e))
+            return
+        body = job.public().model_dump_json().encode("utf-8")
+        signature = hmac.new(settings.SECRET_KEY.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        headers = {"Content-Type": "application/json", "X-SnaKTox-Signature": f"sha256={signature}"}
+        async with httpx.AsyncClient(timeout=settings.JOBS_WEBHOOK_TIMEOUT) as client:
+            for attempt in range(1, settings.JOBS_WEBHOOK_RETRIES + 1):
+                try:
+                    response = await client.post(job.webhook_url, content=body, headers=headers)
+                    if response.status_code < 500:
+                        return
+                    error = f"HTTP {response.status_code}"
+                except httpx.HTTPError as e:
+                    error = str(e)
+                logger.warning("Job webhook delivery failed", job_id=job.job_id, attempt=attempt, error=error)
+                if attempt < settings.JOBS_WEBHOOK_RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+
+    async def shutdown(self) -> None:
+        """Stop the workers; call after in-flight jobs have drained"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._notifications:
+            # Give deliveries in progress one more attempt's time, then give up on them
+            _, pending = await asyncio.wait(self._notifications, timeout=settings.JOBS_WEBHOOK_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._queued_bytes = 0
+
+_service: Optional[JobService] = None
+
+def get_job_service() -> JobService:
+    """Process-wide job service for the configured backend"""
+    global _service
+    if _service is None:
+        if settings.JOBS_BACKEND == "redis" and settings.REDIS_URL:
+            store: JobStore = RedisJobStore(settings.REDIS_URL, ttl=settings.JOBS_RESULT_TTL_SECONDS)
+        else:
+            if settings.JOBS_BACKEND == "redis":
+                logger.warning("REDIS_URL not set, using in-memory job store")
+            store = InMemoryJobStore(ttl=settings.JOBS_RESULT_TTL_SECONDS, max_jobs=settings.JOBS_MAX_STORED)
+        _service = JobService(store)
+    return _service
@@ -0,0 +1,184 @@
+"""
+Latency-aware routing across model providers
+
+Each provider keeps an EWMA of its latency and error rate. Requests are sent to
+the best-scoring provider for their capability and tier, and fail over to the
+next candidate when a call raises.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ExternalAPIError
+from app.core.logging import get_logger
+from app.core.metrics import PROVIDER_LATENCY, PROVIDER_REQUESTS, ROUTER_DECISIONS, ROUTER_FAILOVERS
+from app.core.tracing import span
+from app.services.providers import ModelProvider, PromptPart, Usage, load_providers
+from app.services.usage import get_usage_accountant
+
+logger = get_logger(__name__)
+
+@dataclass
+class ProviderStats:
+    """Live EWMA statistics for one provider"""
+    ewma_latency: float = 0.0
+    ewma_error: float = 0.0
+    calls: int = 0
+    consecutive_failures: int = 0
+    last_failure: float = 0.0
+
+@dataclass
+class RoutedResult:
+    """Text returned by a provider plus the routing decision that produced it"""
+    text: str
+    provider: str
+    model: str
+    tier: str
+    attempts: int
+    latency: float
+    usage: Usage = field(default_factory=Usage)
+
+    def metadata(self) -> Dict[str, Any]:
+        """Routing summary for response metadata"""
+        return {
+            "provider": self.provider,
+            "tier": self.tier,
+            "attempts": self.attempts,
+            "failover": self.attempts > 1,
+            "upstream_latency_ms": round(self.latency * 1000, 2),
+            "upstream_tokens": self.usage.total_tokens,
+        }
+
+class ProviderRouter:
+    """Pick a provider per request from live latency, error rate and cost"""
+
+    def __init__(self, providers: List[ModelProvider]):
+        self.providers = providers
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in providers}
+        self.alpha = settings.ROUTER_EWMA_ALPHA
+        self.latency_weight = settings.ROUTER_LATENCY_WEIGHT
+        self.error_weight = settings.ROUTER_ERROR_WEIGHT
+        self.cost_weight = settings.ROUTER_COST_WEIGHT
+        self.max_attempts = settings.ROUTER_MAX_ATTEMPTS
+        self.cooldown = settings.ROUTER_ERROR_COOLDOWN
+        self.cooldown_failures = settings.ROUTER_COOLDOWN_FAILURES
+
+    def has_provider(self, capability: str) -> bool:
+        return any(p.supports(capability) for p in self.providers)
+
+    def _score(self, provider: ModelProvider, tier: str) -> float:
+        stats = self.stats[provider.name]
+        if tier == "reliable":
+            # Emergencies ignore cost and weigh errors twice as heavily
+            return self.latency_weight * stats.ewma_latency + 2 * self.error_weight * stats.ewma_error
+        return (
+            self.latency_weight * stats.ewma_latency
+            + self.error_weight * stats.ewma_error
+            + self.cost_weight * provider.spec.cost
+        )
+
+    def _cooling_down(self, provider: ModelProvider, now: float) -> bool:
+        stats = self.stats[provider.name]
+        return stats.consecutive_failures >= self.cooldown_failures and now - stats.last_failure < self.cooldown
+
+    def candidates(self, capability: str, tier: str = "standard") -> List[ModelProvider]:
+        """Eligible providers ordered best first"""
+        now = time.monotonic()
+        eligible = [p for p in self.providers if p.supports(capability)]
+        return sorted(
+            eligible,
+            key=lambda p: (self._cooling_down(p, now), p.spec.tier != tier, self._score(p, tier)),
+        )
+
+    def _record(self, provider: ModelProvider, latency: float, ok: bool) -> None:
+        stats = self.stats[provider.name]
+        alpha = self.alpha if stats.calls else 1.0
+        stats.calls += 1
+        stats.ewma_latency = alpha * latency + (1 - alpha) * stats.ewma_latency
+        stats.ewma_error = alpha * (0.0 if ok else 1.0) + (1 - alpha) * stats.ewma_error
+        if ok:
+            stats.consecutive_failures = 0
+        else:
+            stats.consecutive_failures += 1
+            stats.last_failure = time.monotonic()
+        PROVIDER_REQUESTS.labels(provider=provider.name, outcome="success" if ok else "error").inc()
+        PROVIDER_LATENCY.labels(provider=provider.name).observe(latency)
+
+    async def generate(
+        self,
+        parts: List[PromptPart],
+        capability: str = "text",
+        tier: Optional[str] = None,
+        prefix: Optional[str] = None,
+    ) -> RoutedResult:
+        """Run the prompt on the best provider, failing over on errors"""
+        tier = tier or "standard"
+        candidates = self.candidates(capability, tier)[: self.max_attempts]
+        if not candidates:
+            raise ExternalAPIError(f"No provider configured for {capability}", "router", status_code=503)
+
+        last_error: Optional[Exception] = None
+        for attempt, provider in enumerate(candidates, start=1):
+            start = time.perf_counter()
+            try:
+                with span("provider.generate", provider=provider.name, attempt=attempt):
+                    response = await provider.generate(parts, prefix=prefix)
+            except Exception as e:
+                self._record(provider, time.perf_counter() - start, ok=False)
+                logger.warning("Provider call failed", provider=provider.name, attempt=attempt, error=str(e))
+                last_error = e
+                continue
+
+            latency = time.perf_counter() - start
+            self._record(provider, latency, ok=True)
+            ROUTER_DECISIONS.labels(capability=capability, tier=tier, provider=provider.name).inc()
+            if attempt > 1:
+                ROUTER_FAILOVERS.labels(capability=capability).inc()
+            get_usage_accountant().record(response.usage, provider.spec.cost)
+            return RoutedResult(
+                text=response.text,
+                provider=provider.name,
+                model=provider.spec.model,
+                tier=tier,
+                attempts=attempt,
+                latency=latency,
+                usage=response.usage,
+            )
+
+        raise ExternalAPIError(f"All providers failed: {last_error}", "router")
+
+    async def warm_up(self) -> None:
+        """Pre-connect every provider; failures are logged and otherwise ignored"""
+        for provider in self.providers:
+            start = time.perf_counter()
+            try:
+                await provider.warm_up()
+                logger.info("Provider warmed up", provider=provider.name,
+                            duration_ms=round((time.perf_counter() - start) * 1000, 2))
+            except Exception as e:
+                logger.warning("Provider warm-up failed", provider=provider.name, error=str(e))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current per-provider statistics"""
+        return {
+            p.name: {
+                "model": p.spec.model,
+                "tier": p.spec.tier,
+                "capabilities": p.spec.capabilities,
+                "ewma_latency_ms": round(self.stats[p.name].ewma_latency * 1000, 2),
+                "ewma_error_rate": round(self.stats[p.name].ewma_error, 4),
+                "calls": self.stats[p.name].calls,
+            }
+            for p in self.providers
+        }
+
+_router: Optional[ProviderRouter] = None
+
+def get_provider_router() -> ProviderRouter:
+    """Process-wide router so provider statistics survive across requests"""
+    global _router
+    if _router is None:
+        _router = ProviderRouter(load_providers())
+    return _router
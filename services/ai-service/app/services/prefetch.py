@@ -0,0 +1,163 @@
+"""
+Speculative prefetch of likely next chat answers
+
+After a chat answer the user usually taps one of its follow-up questions, and
+after a detection of a dangerous species they ask how to treat its bite. The
+prefetcher generates those answers into the chat cache in the background, so
+the next request is a cache hit.
+
+Prefetching is strictly best effort:
+
+- one worker, and it only starts an item when admission control has idle
+  low-priority capacity; otherwise the item is dropped
+- a bounded queue; items that do not fit are dropped
+- upstream calls are charged to the "prefetch" usage route and stop for the
+  day at PREFETCH_DAILY_TOKEN_BUDGET (the global budget applies as well)
+
+A warmed answer counts as a hit the first time a user request is served from
+it, so snaktox_chat_prefetch_total{outcome="hit"} over {outcome="warmed"} is
+the hit rate. /admin/prefetch reports the same for one worker.
+"""
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Set
+
+from app.core.admission import Priority, get_admission_controller
+from app.core.config import settings
+from app.core.exceptions import OverloadedError
+from app.core.logging import get_logger
+from app.core.metrics import CHAT_PREFETCH
+from app.models.snake_detection import SeverityLevel, SnakeSpecies
+from app.services.model_router import get_provider_router
+from app.services.usage import current_scope, get_usage_accountant, usage_scope
+
+logger = get_logger(__name__)
+
+PREFETCH_ROUTE = "prefetch"
+
+# Detections of these species are followed by a first-aid question
+FIRST_AID_SEVERITIES = {SeverityLevel.SEVERE, SeverityLevel.CRITICAL}
+
+def species_first_aid_query(species: SnakeSpecies) -> str:
+    """Chat question suggested after detecting a species"""
+    return f"What is the first aid for a {species.common_name} bite?"
+
+@dataclass(frozen=True)
+class PrefetchItem:
+    """A chat request we expect next"""
+    kind: str  # "follow_up" or "species"
+    query: str
+    language: str = "en"
+    session_id: Optional[str] = None
+    user_id: Optional[str] = None  # owner of the session's context
+
+class Prefetcher:
+    """Background warming of the chat answer cache"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Set[PrefetchItem] = set()
+        self.counts: Counter = Counter()
+
+    def record(self, kind: str, outcome: str) -> None:
+        CHAT_PREFETCH.labels(kind=kind, outcome=outcome).inc()
+        self.counts[(kind, outcome)] += 1
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.PREFETCH_QUEUE_SIZE)
+            self._worker = asyncio.create_task(self._work())
+        return self._queue
+
+    def schedule(self, items: Iterable[PrefetchItem]) -> None:
+        """Queue items for warming; never blocks the caller"""
+        if not settings.PREFETCH_ENABLED or not get_provider_router().has_provider("text"):
+            return
+        queue = self._ensure_worker()
+        for item in items:
+            if item in self._pending:
+                continue
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.record(item.kind, "dropped")
+                continue
+            self._pending.add(item)
+            self.record(item.kind, "queued")
+
+    def schedule_follow_ups(self, questions: Iterable[str], language: str, session_id: Optional[str]) -> None:
+        self.schedule(
+            PrefetchItem("follow_up", question, language, session_id, current_scope().user_id)
+            for question in list(questions)[:settings.PREFETCH_MAX_FOLLOW_UPS]
+        )
+
+    def schedule_species(self, species: SnakeSpecies, session_id: Optional[str] = None) -> None:
+        if species.severity in FIRST_AID_SEVERITIES:
+            self.schedule([PrefetchItem(
+                "species", species_first_aid_query(species), session_id=session_id, user_id=current_scope().user_id
+            )])
+
+    def _over_budget(self) -> bool:
+        budget = settings.PREFETCH_DAILY_TOKEN_BUDGET
+        if budget and get_usage_accountant().route_tokens(PREFETCH_ROUTE) >= budget:
+            return True
+        return get_usage_accountant().over_budget() is not None
+
+    async def _work(self) -> None:
+        from app.services.chatbot_service import ChatbotService
+
+        assert self._queue is not None
+        service = ChatbotService()
+        admission = get_admission_controller()
+        while True:
+            item = await self._queue.get()
+            try:
+                with usage_scope(PREFETCH_ROUTE):
+                    if not admission.has_idle_capacity(Priority.LOW):
+                        outcome = "busy"
+                    elif self._over_budget():
+                        outcome = "budget"
+                    else:
+                        async with admission.slot(Priority.LOW):
+                            outcome = await service.warm(
+                                item.query, item.language, item.session_id, item.kind, item.user_id
+                            )
+            except OverloadedError:
+                outcome = "busy"
+            except Exception as e:
+                logger.warning("Prefetch failed", kind=item.kind, error=str(e))
+                outcome = "failed"
+            finally:
+                self._pending.discard(item)
+                self._queue.task_done()
+            self.record(item.kind, outcome)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Outcome counts and hit rate per kind in this worker"""
+        kinds: Dict[str, Dict[str, float]] = {}
+        for (kind, outcome), count in self.counts.items():
+            kinds.setdefault(kind, {})[outcome] = count
+        for counts in kinds.values():
+            warmed = counts.get("warmed", 0)
+            counts["hit_rate"] = round(counts.get("hit", 0) / warmed, 3) if warmed else 0.0
+        return kinds
+
+    async def shutdown(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._queue = None
+        self._pending.clear()
+
+_prefetcher: Optional[Prefetcher] = None
+
+def get_prefetcher() -> Prefetcher:
+    """Process-wide prefetcher"""
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher()
+    return _prefetcher
@@ -0,0 +1,170 @@
+"""
+Precompiled chatbot prompt templates
+
+Every chat prompt is split into a static prefix (knowledge base plus formatting
+rules, identical for all requests, so upstream context caching can reuse it) and
+a small per-request body (conversation summary, user query and the instruction
+for its query type). Templates are compiled once at import time.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+from app.core.config import settings
+from app.models.chatbot import QueryType
+from app.services.context_store import summarize_history
+from app.services.retrieval import Hit, format_passages
+from app.utils.tokens import estimate_tokens, truncate_to_tokens
+
+# WHO/CDC knowledge base context
+KNOWLEDGE_BASE = """You are a medical AI assistant specializing in snakebite emergency response and prevention.
+Your knowledge is based on verified medical sources including:
+- World Health Organization (WHO) Guidelines for Snakebite Prevention and Treatment
+- Centers for Disease Control and Prevention (CDC) Snakebite Information
+- Kenya Medical Research Institute (KEMRI) Research Data
+
+Key principles:
+1. Always prioritize immediate medical attention for snakebites
+2. Provide evidence-based first aid guidance
+3. Never provide specific medical diagnoses or treatments
+4. Always recommend contacting emergency services
+5. Focus on prevention and awareness
+
+Emergency contacts for Kenya:
+- Emergency Services: 999
+- Ambulance: 112
+- Police: 911"""
+
+FORMATTING_RULES = """IMPORTANT: Format your response with clean, professional structure:
+- Use clear section headers without any special characters (e.g., "General Characteristics", "Venom Types", "Prevention")
+- Use bullet points (•) for lists
+- Use numbered lists (1., 2., 3.) for step-by-step instructions
+- Separate different topics with double line breaks
+- Keep paragraphs concise and readable
+- NEVER use asterisks (*) or any markdown formatting symbols
+- Write in a professional, medical tone
+- Examples of clean headers: "General Characteristics", "Venom Types", "Emergency Response"
+- Do not use any formatting symbols like *, **, or other special characters"""
+
+TYPE_INSTRUCTIONS: Dict[QueryType, str] = {
+    QueryType.EMERGENCY: (
+        "This is an EMERGENCY query about snakebites. Provide immediate first aid guidance\n"
+        "and strongly emphasize calling emergency services (999 in Kenya)."
+    ),
+    QueryType.FIRST_AID: (
+        "Provide detailed first aid guidance for snakebites based on WHO guidelines.\n"
+        "Include step-by-step instructions and what NOT to do."
+    ),
+    QueryType.PREVENTION: (
+        "Provide prevention tips and awareness information about snakebites.\n"
+        "Focus on practical advice for avoiding snake encounters."
+    ),
+    QueryType.SPECIES_INFO: (
+        "Provide information about specific snake species, their characteristics,\n"
+        "venom types, and geographic distribution in Africa."
+    ),
+    QueryType.GENERAL: "Provide helpful information about snakebites, safety, and emergency response.",
+}
+
+CLASSIFICATION_TEMPLATE = """Classify this snakebite-related query into one of these categories:
+- first_aid: Questions about immediate first aid for snakebites
+- prevention: Questions about preventing snakebites
+- species_info: Questions about specific snake species
+- emergency: Urgent medical questions requiring immediate attention
+- general: General questions about snakes or snakebites
+
+Query: "{query}"
+
+Return only the category name."""
+
+@dataclass
+class CompiledPrompt:
+    """A chat prompt ready to send, with its token accounting"""
+    prefix: str
+    body: str
+    prefix_tokens: int
+    body_tokens: int
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prefix_tokens + self.body_tokens
+
+class PromptTemplates:
+    """Static prefix and per-type suffixes, compiled once"""
+
+    def __init__(self, prefix: str, suffixes: Dict[QueryType, str]):
+        self.prefix = prefix
+        self.prefix_tokens = estimate_tokens(prefix)
+        self.suffixes = suffixes
+        self.suffix_tokens = {qt: estimate_tokens(s) for qt, s in suffixes.items()}
+        digest = hashlib.sha256(prefix.encode("utf-8"))
+        for qt in sorted(suffixes, key=lambda q: q.value):
+            digest.update(suffixes[qt].encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+
+    @classmethod
+    def compile(cls) -> "PromptTemplates":
+        prefix = f"{KNOWLEDGE_BASE}\n\n{FORMATTING_RULES}"
+        templates = cls(prefix, dict(TYPE_INSTRUCTIONS))
+        templates.check_budget(settings.PROMPT_TOKEN_BUDGET)
+        return templates
+
+    def check_budget(self, budget: int) -> None:
+        """Refuse a budget that cannot hold the fixed prompt and the minimum query slice"""
+        needed = (
+            self.prefix_tokens
+            + max(self.suffix_tokens.values())
+            + estimate_tokens("Language: xx\n\nUser query: \n")
+            + settings.PROMPT_MIN_QUERY_TOKENS
+        )
+        if budget < needed:
+            raise ValueError(
+                f"PROMPT_TOKEN_BUDGET is {budget} tokens, but the fixed prompt and "
+                f"PROMPT_MIN_QUERY_TOKENS need {needed}"
+            )
+
+    def render(
+        self,
+        query: str,
+        language: str,
+        query_type: QueryType,
+        history: List[Dict[str, str]],
+        budget: int,
+        passages: Sequence[Hit] = (),
+    ) -> CompiledPrompt:
+        """Build the per-request body, fitting passages, history and query into the token budget
+
+        Retrieved passages get up to RETRIEVAL_TOKEN_BUDGET of what the prefix,
+        instruction and query leave over, and history is summarized with the
+        rest; if the query alone does not fit, it is truncated, but never below
+        PROMPT_MIN_QUERY_TOKENS.
+        """
+        suffix = self.suffixes.get(query_type, self.suffixes[QueryType.GENERAL])
+        head = f"Language: {language}\n\n{suffix}"
+        fixed = self.prefix_tokens + estimate_tokens(head) + estimate_tokens("User query: \n")
+        query_budget = max(budget - fixed, settings.PROMPT_MIN_QUERY_TOKENS)
+        query = truncate_to_tokens(query, query_budget)
+
+        remaining = query_budget - estimate_tokens(query)
+        guidance = format_passages(passages, min(settings.RETRIEVAL_TOKEN_BUDGET, remaining))
+        remaining -= estimate_tokens(guidance)
+        history_budget = min(settings.CONTEXT_SUMMARY_TOKENS, remaining)
+        summary = summarize_history(history, history_budget)
+
+        body = f"User query: {query}\n{head}"
+        if guidance:
+            body = f"{guidance}\n\n{body}"
+        if summary:
+            body = f"{summary}\n\n{body}"
+        return CompiledPrompt(
+            prefix=self.prefix,
+            body=body,
+            prefix_tokens=self.prefix_tokens,
+            body_tokens=estimate_tokens(body),
+        )
+
+    def classification(self, query: str) -> str:
+        return CLASSIFICATION_TEMPLATE.format(query=query)
+
+PROMPT_TEMPLATES = PromptTemplates.compile()
@@ -0,0 +1,295 @@
+"""
+Model provider backends for SnaKTox AI Service
+
+A provider wraps one upstream model (a Gemini model, a local model server or a
+local stand-in used in tests) behind a common async ``generate`` call.
+"""
+
+import asyncio
+import base64
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+from app.core.config import settings
+from app.core.exceptions import ExternalAPIError
+from app.core.logging import get_logger
+from app.core.metrics import PROMPT_PREFIX_CACHE
+from app.utils.tokens import IMAGE_TOKENS, estimate_tokens
+
+logger = get_logger(__name__)
+
+# A prompt is a list of parts: plain text or {"mime_type": ..., "data": bytes}
+PromptPart = Union[str, Dict[str, Any]]
+
+TIERS = ("fast", "standard", "reliable")
+
+@dataclass
+class Usage:
+    """Tokens consumed by one upstream call"""
+    prompt_tokens: int = 0
+    image_tokens: int = 0
+    output_tokens: int = 0
+    # True when counted locally because the upstream reported no usage
+    estimated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.image_tokens + self.output_tokens
+
+    @classmethod
+    def estimate(cls, parts: List[PromptPart], prefix: Optional[str], output: str) -> "Usage":
+        images = sum(1 for p in parts if not isinstance(p, str))
+        text = "".join(p for p in parts if isinstance(p, str)) + (prefix or "")
+        return cls(estimate_tokens(text), images * IMAGE_TOKENS, estimate_tokens(output), estimated=True)
+
+    @classmethod
+    def from_counts(
+        cls, parts: List[PromptPart], prompt_total: int, output: int, image_total: Optional[int] = None
+    ) -> "Usage":
+        """Split an upstream prompt count into text and image tokens"""
+        if image_total is None:
+            image_total = IMAGE_TOKENS * sum(1 for p in parts if not isinstance(p, str))
+        image_total = min(image_total, prompt_total)
+        return cls(prompt_total - image_total, image_total, output)
+
+@dataclass
+class ProviderResponse:
+    """Generated text and the tokens it cost"""
+    text: str
+    usage: Usage
+
+@dataclass
+class ProviderSpec:
+    """Static description of a provider, usually loaded from settings"""
+    name: str
+    kind: str
+    model: str
+    tier: str = "standard"
+    capabilities: List[str] = field(default_factory=lambda: ["text"])
+    cost: float = 1.0
+    base_url: Optional[str] = None
+    timeout: float = 30.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProviderSpec":
+        """Build a spec from a MODEL_PROVIDERS entry"""
+        tier = data.get("tier", "standard")
+        if tier not in TIERS:
+            raise ValueError(f"Unknown provider tier: {tier}")
+        return cls(
+            name=data.get("name") or data["model"],
+            kind=data.get("kind", "gemini"),
+            model=data["model"],
+            tier=tier,
+            capabilities=list(data.get("capabilities", ["text"])),
+            cost=float(data.get("cost", 1.0)),
+            base_url=data.get("base_url"),
+            timeout=float(data.get("timeout", 30.0)),
+        )
+
+class ModelProvider:
+    """Base class for model providers"""
+
+    def __init__(self, spec: ProviderSpec):
+        self.spec = spec
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.spec.capabilities
+
+    async def generate(self, parts: List[PromptPart], prefix: Optional[str] = None) -> ProviderResponse:
+        """Generate a text completion for the given prompt parts
+
+        ``prefix`` is a static system instruction shared across requests;
+        providers that support upstream context caching send it only once.
+        """
+        raise NotImplementedError
+
+    async def warm_up(self) -> None:
+        """Import client libraries and open upstream connections ahead of traffic"""
+
+class GeminiProvider(ModelProvider):
+    """Google Gemini through the google-generativeai SDK"""
+
+    def __init__(self, spec: ProviderSpec, api_key: str):
+        super().__init__(spec)
+        self.api_key = api_key
+        self._model = None
+        # Models bound to an upstream cached prefix, keyed by prefix hash
+        self._cached_models: Dict[str, Any] = {}
+        self._caching_supported = True
+
+    def _get_model(self):
+        if self._model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.spec.model)
+        return self._model
+
+    async def _get_cached_model(self, prefix: str):
+        """Model backed by an upstream cached prefix, or None if unavailable
+
+        Context caching needs a newer SDK than 0.3.x and a minimum prefix size
+        upstream; on any failure caching is switched off for this provider.
+        """
+        if not self._caching_supported or not settings.PROMPT_CONTEXT_CACHING:
+            return None
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        model = self._cached_models.get(key)
+        if model is not None:
+            PROMPT_PREFIX_CACHE.labels(provider=self.name, outcome="hit").inc()
+            return model
+        try:
+            import datetime
+            import google.generativeai as genai
+            from google.generativeai import caching
+
+            genai.configure(api_key=self.api_key)
+            cached = await asyncio.to_thread(
+                caching.CachedContent.create,
+                model=self.spec.model,
+                system_instruction=prefix,
+                ttl=datetime.timedelta(seconds=settings.PROMPT_CACHE_TTL_SECONDS),
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+        except Exception as e:
+            logger.info("Context caching unavailable, sending prefix inline", provider=self.name, error=str(e))
+            self._caching_supported = False
+            PROMPT_PREFIX_CACHE.labels(provider=self.name, outcome="unsupported").inc()
+            return None
+        self._cached_models[key] = model
+        PROMPT_PREFIX_CACHE.labels(provider=self.name, outcome="miss").inc()
+        return model
+
+    async def warm_up(self) -> None:
+        # Importing the SDK and building the gRPC channel dominate the first call
+        model = await asyncio.to_thread(self._get_model)
+        await model.count_tokens_async("ping")
+
+    async def generate(self, parts: List[PromptPart], prefix: Optional[str] = None) -> ProviderResponse:
+        model = await self._get_cached_model(prefix) if prefix else None
+        if model is None:
+            # First use imports the SDK, which must not happen on the event loop
+            model = self._model or await asyncio.to_thread(self._get_model)
+            if prefix:
+                parts = [prefix, *parts]
+        response = await model.generate_content_async(parts)
+        text = response.text
+        # usage_metadata only exists on newer SDK releases
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is None:
+            return ProviderResponse(text, Usage.estimate(parts, None, text))
+        return ProviderResponse(text, Usage.from_counts(
+            parts, metadata.prompt_token_count, metadata.candidates_token_count
+        ))
+
+class HTTPProvider(ModelProvider):
+    """Gemini REST-compatible HTTP endpoint (local model server or test stand-in)"""
+
+    def __init__(self, spec: ProviderSpec, api_key: Optional[str] = None):
+        super().__init__(spec)
+        if not spec.base_url:
+            raise ValueError(f"Provider {spec.name} requires base_url")
+        self.api_key = api_key
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(base_url=self.spec.base_url, timeout=self.spec.timeout)
+        return self._client
+
+    async def warm_up(self) -> None:
+        # Any response means the TCP (and TLS) connection is now pooled
+        await self._get_client().get("/")
+
+    @staticmethod
+    def _to_rest_part(part: PromptPart) -> Dict[str, Any]:
+        if isinstance(part, str):
+            return {"text": part}
+        return {
+            "inline_data": {
+                "mime_type": part["mime_type"],
+                "data": base64.b64encode(part["data"]).decode("ascii"),
+            }
+        }
+
+    async def generate(self, parts: List[PromptPart], prefix: Optional[str] = None) -> ProviderResponse:
+        payload: Dict[str, Any] = {"contents": [{"role": "user", "parts": [self._to_rest_part(p) for p in parts]}]}
+        if prefix:
+            payload["systemInstruction"] = {"parts": [{"text": prefix}]}
+        params = {"key": self.api_key} if self.api_key else None
+        response = await self._get_client().post(
+            f"/v1beta/models/{self.spec.model}:generateContent", json=payload, params=params
+        )
+        if response.status_code >= 400:
+            raise ExternalAPIError(f"HTTP {response.status_code}", self.name, status_code=502)
+        data = response.json()
+        try:
+            candidate_parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError) as e:
+            raise ExternalAPIError(f"Malformed response: {e}", self.name)
+        text = "".join(p.get("text", "") for p in candidate_parts)
+
+        metadata = data.get("usageMetadata")
+        if not metadata:
+            return ProviderResponse(text, Usage.estimate(parts, prefix, text))
+        image_total = None
+        for detail in metadata.get("promptTokensDetails", []):
+            if detail.get("modality") == "IMAGE":
+                image_total = detail.get("tokenCount", 0)
+        return ProviderResponse(text, Usage.from_counts(
+            parts,
+            metadata.get("promptTokenCount", 0),
+            metadata.get("candidatesTokenCount", 0),
+            image_total,
+        ))
+
+def default_provider_specs() -> List[Dict[str, Any]]:
+    """Provider list derived from the legacy GEMINI_* settings"""
+    if not settings.GEMINI_API_KEY:
+        return []
+    return [
+        {
+            "name": "gemini-vision",
+            "kind": "gemini",
+            "model": settings.GEMINI_VISION_MODEL,
+            "tier": "reliable",
+            # Vision models answer text prompts poorly or not at all; chat goes to gemini-text
+            "capabilities": ["vision"],
+        },
+        {
+            "name": "gemini-text",
+            "kind": "gemini",
+            "model": settings.GEMINI_MODEL,
+            "tier": "reliable",
+            "capabilities": ["text"],
+        },
+    ]
+
+def build_provider(spec: ProviderSpec) -> ModelProvider:
+    """Instantiate a provider for a spec"""
+    if spec.kind == "gemini":
+        if not settings.GEMINI_API_KEY:
+            raise ValueError(f"Provider {spec.name} requires GEMINI_API_KEY")
+        return GeminiProvider(spec, settings.GEMINI_API_KEY)
+    if spec.kind == "http":
+        return HTTPProvider(spec)
+    raise ValueError(f"Unknown provider kind: {spec.kind}")
+
+def load_providers() -> List[ModelProvider]:
+    """Build the configured providers, skipping invalid entries"""
+    entries = settings.MODEL_PROVIDERS or default_provider_specs()
+    providers = []
+    for entry in entries:
+        try:
+            providers.append(build_provider(ProviderSpec.from_dict(entry)))
+        except (KeyError, ValueError) as e:
+            logger.error("Skipping invalid model provider", provider=entry, error=str(e))
+    return providers
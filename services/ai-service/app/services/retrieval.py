@@ -0,0 +1,244 @@
+"""
+Retrieval over the bundled snakebite guidance corpus
+
+The corpus (app/data/guidance/corpus.json) holds short passages from the WHO,
+CDC and KEMRI guidance the chatbot cites. An offline build turns it into a
+BM25 inverted index in which each posting already carries the term's BM25
+contribution for that passage, so scoring a query is a handful of dict
+lookups and additions:
+
+    python -m app.services.retrieval build
+    python -m app.services.retrieval bench
+
+The built index records a hash of the corpus. If it is missing or stale, the
+index is rebuilt in memory at load time and a warning is logged.
+
+Each hit also gets a confidence: the share of the query's IDF weight that the
+passage covers. Query terms not in the corpus count at the highest IDF, so
+off-topic questions score low however well one common word matches.
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import statistics
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import RETRIEVAL_LATENCY
+from app.utils.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "guidance")
+_DEFAULT_CORPUS_PATH = os.path.normpath(os.path.join(_DATA_DIR, "corpus.json"))
+_DEFAULT_INDEX_PATH = os.path.normpath(os.path.join(_DATA_DIR, "bm25.json"))
+
+INDEX_FORMAT = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being but by can could did do does doing
+for from had has have how i if in into is it its just me my no not of on or our out should so some
+than that the their them then there these they this to up very was we were what when where which who
+why will with would you your
+""".split())
+
+def _stem(token: str) -> str:
+    """Strip common English suffixes so "bites"/"bite" and "swelling"/"swell" match"""
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3 and not token.endswith("ss"):
+            return token[: -len(suffix)]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+@dataclass
+class Passage:
+    """One retrievable piece of guidance"""
+    id: str
+    source: str
+    topic: str
+    title: str
+    text: str
+
+@dataclass
+class Hit:
+    passage: Passage
+    score: float
+    confidence: float
+
+# term -> [(passage index, BM25 weight)]
+Postings = Dict[str, List[Tuple[int, float]]]
+
+class GuidanceIndex:
+    """BM25 index with precomputed per-posting weights"""
+
+    def __init__(self, passages: List[Passage], postings: Postings, idf: Dict[str, float], corpus_sha256: str = ""):
+        self.passages = passages
+        self.postings = postings
+        self.idf = idf
+        self.max_idf = max(idf.values(), default=1.0)
+        self.corpus_sha256 = corpus_sha256
+
+    @classmethod
+    def build(cls, passages: List[Passage], corpus_sha256: str = "", k1: float = 1.2, b: float = 0.75) -> "GuidanceIndex":
+        docs = [Counter(tokenize(f"{p.title} {p.title} {p.text}")) for p in passages]
+        lengths = [sum(d.values()) for d in docs]
+        avg_length = sum(lengths) / len(lengths) if lengths else 1.0
+        df = Counter(term for d in docs for term in d)
+        n = len(docs)
+        idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+        postings: Postings = {}
+        for i, (doc, length) in enumerate(zip(docs, lengths)):
+            norm = k1 * (1 - b + b * length / avg_length)
+            for term, tf in doc.items():
+                postings.setdefault(term, []).append((i, round(idf[term] * tf * (k1 + 1) / (tf + norm), 5)))
+        return cls(passages, postings, idf, corpus_sha256)
+
+    def search(self, query: str, k: int) -> List[Hit]:
+        """Top k passages for the query, best first"""
+        start = time.perf_counter()
+        terms = set(tokenize(query))
+        scores: Dict[int, float] = {}
+        covered: Dict[int, float] = {}
+        for term in terms:
+            weight = self.idf.get(term)
+            if weight is None:
+                continue
+            for doc, contribution in self.postings[term]:
+                scores[doc] = scores.get(doc, 0.0) + contribution
+                covered[doc] = covered.get(doc, 0.0) + weight
+        query_weight = sum(self.idf.get(term, self.max_idf) for term in terms)
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        hits = [Hit(self.passages[doc], score, covered[doc] / query_weight) for doc, score in top]
+        RETRIEVAL_LATENCY.observe(time.perf_counter() - start)
+        return hits
+
+    def to_dict(self) -> Dict:
+        return {
+            "format": INDEX_FORMAT,
+            "corpus_sha256": self.corpus_sha256,
+            "passages": [asdict(p) for p in self.passages],
+            "idf": self.idf,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GuidanceIndex":
+        if data.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format {data.get('format')}")
+        postings = {term: [(doc, weight) for doc, weight in entries] for term, entries in data["postings"].items()}
+        return cls([Passage(**p) for p in data["passages"]], postings, data["idf"], data["corpus_sha256"])
+
+def format_passages(hits: Sequence[Hit], max_tokens: int) -> str:
+    """Prompt section quoting as many whole passages as fit in max_tokens"""
+    header = "Relevant guidance (prefer it over general knowledge and name the source):"
+    budget = max_tokens - estimate_tokens(header)
+    lines: List[str] = []
+    for hit in hits:
+        line = f"[{hit.passage.source}] {hit.passage.title}: {hit.passage.text}"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        lines.append(line)
+        budget -= cost
+    return "\n".join([header, *lines]) if lines else ""
+
+def _read_corpus(path: str) -> Tuple[List[Passage], str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return [Passage(**p) for p in json.loads(raw)], hashlib.sha256(raw).hexdigest()
+
+def build_index(corpus_path: str, index_path: str) -> GuidanceIndex:
+    """Build the index for a corpus and write it next to it"""
+    passages, digest = _read_corpus(corpus_path)
+    index = GuidanceIndex.build(passages, digest)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp_path, index_path)
+    return index
+
+def load_index(corpus_path: str, index_path: str) -> GuidanceIndex:
+    """Prebuilt index, or one built in memory when it is missing or stale"""
+    with open(corpus_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    try:
+        with open(index_path) as f:
+            index = GuidanceIndex.from_dict(json.load(f))
+        if index.corpus_sha256 == digest:
+            return index
+        logger.warning("Guidance index is stale, rebuilding in memory", path=index_path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Guidance index not loaded, rebuilding in memory", path=index_path, error=str(e))
+    passages, digest = _read_corpus(corpus_path)
+    return GuidanceIndex.build(passages, digest)
+
+_index: Optional[GuidanceIndex] = None
+
+def get_guidance_index() -> GuidanceIndex:
+    """Process-wide guidance index, loaded on first use"""
+    global _index
+    if _index is None:
+        corpus_path = settings.GUIDANCE_CORPUS_PATH or _DEFAULT_CORPUS_PATH
+        index_path = settings.GUIDANCE_INDEX_PATH or _DEFAULT_INDEX_PATH
+        try:
+            _index = load_index(corpus_path, index_path)
+            logger.info("Guidance index loaded", passages=len(_index.passages), terms=len(_index.idf))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Guidance corpus not loaded, retrieval disabled", path=corpus_path, error=str(e))
+            _index = GuidanceIndex([], {}, {})
+    return _index
+
+BENCH_QUERIES = [
+    "I was bitten by a puff adder what should I do",
+    "how do I keep snakes out of my house",
+    "black mamba",
+    "venom in my eyes from a cobra",
+    "should I use a tourniquet",
+    "is the green snake in my tree dangerous",
+    "which antivenom treats boomslang bites",
+    "what time of year are snakes most active on farms",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or benchmark the guidance retrieval index")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--corpus", default=settings.GUIDANCE_CORPUS_PATH or _DEFAULT_CORPUS_PATH)
+    parser.add_argument("--index", default=settings.GUIDANCE_INDEX_PATH or _DEFAULT_INDEX_PATH)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        built = build_index(args.corpus, args.index)
+        print(f"Indexed {len(built.passages)} passages, {len(built.idf)} terms -> {args.index}")
+    else:
+        index = load_index(args.corpus, args.index)
+        timings = []
+        for _ in range(args.rounds):
+            for query in BENCH_QUERIES:
+                start = time.perf_counter()
+                index.search(query, settings.RETRIEVAL_TOP_K)
+                timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{len(timings)} searches: p50 {statistics.median(timings) * 1e6:.1f} µs, "
+              f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} µs, max {timings[-1] * 1e6:.1f} µs")
+        for query in BENCH_QUERIES:
+            hits = index.search(query, 1)
+            if hits:
+                print(f"  {query!r} -> {hits[0].passage.id} (confidence {hits[0].confidence:.2f})")
+            else:
+                print(f"  {query!r} -> no match")
@@ -0,0 +1,233 @@
+"""
+Shadow evaluation of a candidate vision model
+
+Lets a faster or cheaper vision model be judged on live traffic without it
+ever answering a user. SHADOW_PROVIDER is a MODEL_PROVIDERS-style entry for
+the candidate; it is built outside the router, so live detections never route
+to it. After a detection has been answered by the primary providers,
+SHADOW_SAMPLE_RATE of the upstream (not cached) detections are queued, and
+the candidate runs the same prompt on the same image in the background.
+
+Shadow work is strictly best effort, like prefetching:
+
+- at most SHADOW_CONCURRENCY calls at once, from a queue of SHADOW_QUEUE_SIZE
+  images (which also bounds the image memory it holds); images that do not
+  fit are dropped
+- a call only starts when admission control has idle low-priority capacity
+- calls are charged to the "shadow" usage route and stop for the day at
+  SHADOW_DAILY_TOKEN_BUDGET (the global budget applies as well)
+
+Each comparison records whether the species agree and the confidence and
+upstream latency of both models, in snaktox_shadow_* metrics and in a window
+of recent comparisons that /admin/shadow summarizes.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.admission import Priority, get_admission_controller
+from app.core.config import settings
+from app.core.exceptions import OverloadedError
+from app.core.logging import get_logger
+from app.core.metrics import SHADOW_CONFIDENCE, SHADOW_LATENCY, SHADOW_OUTCOMES
+from app.models.snake_detection import DetectionResult
+from app.services.model_router import RoutedResult
+from app.services.providers import ModelProvider, ProviderSpec, build_provider
+from app.services.usage import get_usage_accountant, usage_scope
+
+logger = get_logger(__name__)
+
+SHADOW_ROUTE = "shadow"
+
+@dataclass
+class ShadowItem:
+    """A detection answered by the primary, to repeat on the candidate"""
+    image_data: bytes
+    mime_type: str
+    confidence_threshold: float
+    primary: DetectionResult
+
+@dataclass
+class Comparison:
+    agree: bool
+    primary_species: str
+    candidate_species: str
+    primary_confidence: float
+    candidate_confidence: float
+    primary_latency: float
+    candidate_latency: float
+
+def _quantile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+        "p50": round(_quantile(values, 0.5), 4),
+        "p95": round(_quantile(values, 0.95), 4),
+    }
+
+class ShadowEvaluator:
+    """Background comparison of a candidate vision model against the primary"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._candidate: Optional[ModelProvider] = None
+        self._invalid = False
+        self.counts: Counter = Counter()
+        self.recent: Deque[Comparison] = deque(maxlen=settings.SHADOW_REPORT_WINDOW)
+
+    @property
+    def candidate(self) -> Optional[ModelProvider]:
+        if self._candidate is None and settings.SHADOW_PROVIDER and not self._invalid:
+            try:
+                self._candidate = build_provider(ProviderSpec.from_dict(settings.SHADOW_PROVIDER))
+            except (KeyError, ValueError) as e:
+                logger.error("Invalid shadow provider, shadow evaluation off", error=str(e))
+                self._invalid = True
+        return self._candidate
+
+    def record(self, outcome: str) -> None:
+        SHADOW_OUTCOMES.labels(outcome=outcome).inc()
+        self.counts[outcome] += 1
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.SHADOW_QUEUE_SIZE)
+            self._workers = [asyncio.create_task(self._work()) for _ in range(settings.SHADOW_CONCURRENCY)]
+        return self._queue
+
+    def submit(self, image_data: bytes, mime_type: str, confidence_threshold: float, primary: DetectionResult) -> None:
+        """Sample a primary detection for the candidate; never blocks the caller"""
+        if primary.detection_metadata.get("api_used") == "mock":
+            # The mock fallback is not the primary model's answer
+            return
+        if self.candidate is None or random.random() >= settings.SHADOW_SAMPLE_RATE:
+            return
+        try:
+            self._ensure_workers().put_nowait(ShadowItem(image_data, mime_type, confidence_threshold, primary))
+        except asyncio.QueueFull:
+            self.record("dropped")
+            return
+        self.record("queued")
+
+    def _over_budget(self) -> bool:
+        budget = settings.SHADOW_DAILY_TOKEN_BUDGET
+        if budget and get_usage_accountant().route_tokens(SHADOW_ROUTE) >= budget:
+            return True
+        return get_usage_accountant().over_budget() is not None
+
+    async def _run_candidate(self, item: ShadowItem) -> Comparison:
+        from app.services.snake_detection_service import DETECTION_PROMPT, SnakeDetectionService
+
+        candidate = self.candidate
+        assert candidate is not None
+        start = time.monotonic()
+        response = await candidate.generate([DETECTION_PROMPT, {"mime_type": item.mime_type, "data": item.image_data}])
+        latency = time.monotonic() - start
+        get_usage_accountant().record(response.usage, candidate.spec.cost)
+        routed = RoutedResult(
+            text=response.text, provider=candidate.name, model=candidate.spec.model,
+            tier=candidate.spec.tier, attempts=1, latency=latency, usage=response.usage,
+        )
+        result = SnakeDetectionService()._parse_gemini_response(response.text, item.confidence_threshold, routed)
+        if result.detection_metadata.get("api_used") == "mock":
+            # Unparseable output falls back to the mock species, which says nothing about the model
+            raise ValueError("Candidate response could not be parsed")
+
+        routing = item.primary.detection_metadata.get("routing") or {}
+        primary_species = item.primary.species.scientific_name
+        return Comparison(
+            agree=result.species.scientific_name.casefold() == primary_species.casefold(),
+            primary_species=primary_species,
+            candidate_species=result.species.scientific_name,
+            primary_confidence=item.primary.confidence,
+            candidate_confidence=result.confidence,
+            primary_latency=routing.get("upstream_latency_ms", 0.0) / 1000,
+            candidate_latency=latency,
+        )
+
+    def _observe(self, comparison: Comparison) -> None:
+        self.recent.append(comparison)
+        for role, confidence, latency in (
+            ("primary", comparison.primary_confidence, comparison.primary_latency),
+            ("candidate", comparison.candidate_confidence, comparison.candidate_latency),
+        ):
+            SHADOW_CONFIDENCE.labels(role=role).observe(confidence)
+            SHADOW_LATENCY.labels(role=role).observe(latency)
+
+    async def _work(self) -> None:
+        assert self._queue is not None
+        admission = get_admission_controller()
+        while True:
+            item = await self._queue.get()
+            try:
+                with usage_scope(SHADOW_ROUTE):
+                    if not admission.has_idle_capacity(Priority.LOW):
+                        outcome = "busy"
+                    elif self._over_budget():
+                        outcome = "budget"
+                    else:
+                        async with admission.slot(Priority.LOW):
+                            comparison = await self._run_candidate(item)
+                        self._observe(comparison)
+                        outcome = "agree" if comparison.agree else "disagree"
+            except OverloadedError:
+                outcome = "busy"
+            except Exception as e:
+                logger.warning("Shadow detection failed", error=str(e))
+                outcome = "failed"
+            finally:
+                self._queue.task_done()
+            self.record(outcome)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Outcome counts and a summary of the recent comparisons in this worker"""
+        recent = list(self.recent)
+        disagreements = Counter(
+            (c.primary_species, c.candidate_species) for c in recent if not c.agree
+        )
+        candidate = self.candidate
+        return {
+            "candidate": {"name": candidate.name, "model": candidate.spec.model} if candidate else None,
+            "sample_rate": settings.SHADOW_SAMPLE_RATE,
+            "outcomes": dict(self.counts),
+            "compared": len(recent),
+            "agreement": round(sum(c.agree for c in recent) / len(recent), 3) if recent else 0.0,
+            "confidence": {
+                "primary": _distribution([c.primary_confidence for c in recent]),
+                "candidate": _distribution([c.candidate_confidence for c in recent]),
+            },
+            "latency_seconds": {
+                "primary": _distribution([c.primary_latency for c in recent]),
+                "candidate": _distribution([c.candidate_latency for c in recent]),
+            },
+            "top_disagreements": [
+                {"primary": primary, "candidate": other, "count": count}
+                for (primary, other), count in disagreements.most_common(10)
+            ],
+        }
+
+    async def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+_evaluator: Optional[ShadowEvaluator] = None
+
+def get_shadow_evaluator() -> ShadowEvaluator:
+    """Process-wide shadow evaluator"""
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = ShadowEvaluator()
+    return _evaluator
@@ -2,55 +2,238 @@
 Snake detection service using external APIs
 """
 
-import httpx
 import asyncio
-from typing import Optional, Dict, Any
+import hashlib
+import json
+import re
+from contextlib import AsyncExitStack
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 from app.core.config import settings
-from app.core.exceptions import SnakeDetectionError, ExternalAPIError
+from app.core.exceptions import BudgetExhaustedError, OverloadedError, SnakeDetectionError, ExternalAPIError
 from app.models.snake_detection import (
     SnakeDetectionRequest, 
     SnakeDetectionResponse, 
     DetectionResult,
+    NearbyFacility,
     SnakeSpecies,
     VenomType,
     SeverityLevel
 )
+from app.core.lifecycle import inflight
 from app.core.logging import get_logger
+from app.core.memory_budget import get_image_budget, image_footprint
+from app.core.singleflight import SingleFlight
+from app.core.tracing import span
+from app.services.analytics import DETECTION_EVENT, get_analytics
+from app.services.hospital_index import get_hospital_index, parse_location
+from app.services.model_router import RoutedResult, get_provider_router
+from app.services.prefetch import FIRST_AID_SEVERITIES, get_prefetcher, species_first_aid_query
+from app.services.shadow import get_shadow_evaluator
+from app.services.usage import get_usage_accountant, seconds_until_reset
+from app.utils.cache import TTLCache
+from app.utils.data_url import decode_data_url, describe_image_url
 
 logger = get_logger(__name__)
 
+# Returns (image bytes, MIME type), possibly after a download
+ImageLoader = Callable[[], Awaitable[Tuple[bytes, str]]]
+
+# Answers to the caller in their own right, never replaced by the mock species
+_REFUSALS = (BudgetExhaustedError, OverloadedError, SnakeDetectionError)
+
+# Process-wide coalescing of identical in-flight work
+_detection_flights = SingleFlight("detection")
+_image_fetch_flights = SingleFlight("image_fetch")
+
+# Provider results by image content hash, so re-sent photos skip the upstream call
+_detection_results: TTLCache[str, DetectionResult] = TTLCache(
+    settings.DETECTION_CACHE_MAX_ENTRIES, settings.DETECTION_CACHE_TTL_SECONDS
+)
+
+def detection_cache_key(image_sha256: str, confidence_threshold: float) -> str:
+    return f"{image_sha256}:{confidence_threshold}"
+
+def is_mock_result(result: DetectionResult) -> bool:
+    """Placeholder species from the mock fallback, not an identification"""
+    return result.detection_metadata.get("api_used") == "mock"
+
+def cached_detection(image_sha256: str, confidence_threshold: float = 0.7) -> Optional[DetectionResult]:
+    """Previously computed detection for an image hash, if still cached"""
+    result = _detection_results.get(detection_cache_key(image_sha256, confidence_threshold))
+    return result.model_copy(deep=True) if result is not None else None
+
+# Antivenom stock types that treat a genus; anything else needs polyvalent
+ANTIVENOMS_BY_GENUS = {
+    "Dispholidus": ["monovalent"],  # boomslang: only the monovalent antivenom works
+}
+
+def required_antivenoms(species: SnakeSpecies) -> Optional[List[str]]:
+    """Antivenom types to look for, or None when no antivenom lookup applies"""
+    if species.scientific_name == "Unknown":
+        return None
+    return ANTIVENOMS_BY_GENUS.get(species.genus, ["polyvalent"])
+
+def nearby_facilities(species: SnakeSpecies, location: Optional[str]) -> List[NearbyFacility]:
+    """Nearest facilities stocking antivenom for species, from a "lat,lng" location"""
+    coordinates = parse_location(location)
+    antivenoms = required_antivenoms(species)
+    if coordinates is None or antivenoms is None:
+        return []
+    matches = get_hospital_index().nearest(
+        coordinates[0],
+        coordinates[1],
+        antivenoms,
+        k=settings.NEARBY_FACILITIES_K,
+        max_km=settings.NEARBY_FACILITIES_MAX_KM,
+    )
+    return [
+        NearbyFacility(
+            name=facility.name,
+            address=facility.address,
+            country=facility.country,
+            distance_km=round(distance_km, 2),
+            coordinates={"lat": facility.lat, "lng": facility.lng},
+            antivenom_stock=facility.stock,
+            phone=facility.phone,
+            emergency_phone=facility.emergency_phone,
+            emergency_services=facility.emergency_services,
+            verified_status=facility.verified_status,
+        )
+        for distance_km, facility in matches
+    ]
+
+# Prompt for snake identification, shared by every vision provider
+DETECTION_PROMPT = """Analyze this image and identify if it contains a snake. If it does, provide detailed information about the snake species.
+
+Focus on snakes commonly found in Sub-Saharan Africa, particularly Kenya.
+
+IMPORTANT: You must respond with ONLY valid JSON in this exact format:
+{
+    "scientific_name": "string",
+    "common_name": "string", 
+    "family": "string",
+    "genus": "string",
+    "venom_type": "neurotoxic|hemotoxic|cytotoxic|mixed|unknown",
+    "severity": "mild|moderate|severe|critical",
+    "distribution": ["string"],
+    "description": "string",
+    "first_aid_notes": "string",
+    "antivenom_available": true,
+    "confidence": 0.85
+}
+
+If no snake is detected, return:
+{
+    "scientific_name": "Unknown",
+    "common_name": "No snake detected", 
+    "family": "Unknown",
+    "genus": "Unknown",
+    "venom_type": "unknown",
+    "severity": "mild",
+    "distribution": [],
+    "description": "No snake detected in image",
+    "first_aid_notes": "No action required",
+    "antivenom_available": false,
+    "confidence": 0.0
+}
+
+Respond with ONLY the JSON, no other text."""
+
+def detection_cache_version() -> str:
+    """Changes whenever cached detections may no longer match: new prompt or vision models"""
+    models = sorted(f"{p.name}={p.spec.model}" for p in get_provider_router().providers if p.supports("vision"))
+    return hashlib.sha256("\n".join([DETECTION_PROMPT, *models]).encode("utf-8")).hexdigest()[:16]
+
 class SnakeDetectionService:
     """Service for snake detection using external APIs"""
     
     def __init__(self):
         self.gemini_api_key = settings.GEMINI_API_KEY
         self.confidence_threshold = settings.VISION_CONFIDENCE_THRESHOLD
+        self.router = get_provider_router()
         logger.info("SnakeDetectionService initialized", 
                    has_api_key=bool(self.gemini_api_key),
-                   api_key_length=len(self.gemini_api_key) if self.gemini_api_key else 0)
+                   has_vision_provider=self.router.has_provider("vision"))
         
     async def detect_snake(self, request: SnakeDetectionRequest) -> SnakeDetectionResponse:
         """Detect snake species from image using external APIs"""
+        logger.info("Starting snake detection", image_url=describe_image_url(request.image_url))
+        # Tracked so a graceful shutdown waits for running detections
+        async with inflight.track("detection"), AsyncExitStack() as reservations:
+            async def load_image() -> Tuple[bytes, str]:
+                image_data, mime_type = await self._load_image(request)
+                if not request.image_url.startswith("data:"):
+                    # A downloaded image was not in the body the endpoint reserved memory for
+                    await reservations.enter_async_context(
+                        get_image_budget().reserve(image_footprint(len(image_data)))
+                    )
+                return image_data, mime_type
+            
+            return await self._detect(load_image, request.confidence_threshold, request.location, request.session_id)
+    
+    async def detect_image(
+        self,
+        image_data: bytes,
+        mime_type: str,
+        confidence_threshold: float = 0.7,
+        location: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> SnakeDetectionResponse:
+        """Detect snake species from raw image bytes"""
+        async def load_image() -> Tuple[bytes, str]:
+            return image_data, mime_type
+        
+        logger.info("Starting snake detection", image_bytes=len(image_data), mime_type=mime_type)
+        async with inflight.track("detection"):
+            return await self._detect(load_image, confidence_threshold, location, session_id)
+    
+    async def _detect(
+        self,
+        load_image: ImageLoader,
+        confidence_threshold: float,
+        location: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> SnakeDetectionResponse:
         start_time = asyncio.get_event_loop().time()
+        cache = "local"
         
         try:
-            logger.info("Starting snake detection", image_url=str(request.image_url))
-            
-            # Use Google Gemini API
-            if self.gemini_api_key:
-                logger.info("Using Gemini API for snake detection", api_key_length=len(self.gemini_api_key))
+            # Use the routed vision providers
+            if self.router.has_provider("vision"):
                 try:
-                    result = await self._detect_with_gemini(request)
-                    logger.info("Gemini API detection completed successfully")
+                    result, cache = await self._detect_with_providers(load_image, confidence_threshold)
+                    logger.info("Vision provider detection completed successfully")
+                except _REFUSALS:
+                    raise
                 except Exception as e:
-                    logger.error("Gemini API failed, falling back to mock", error=str(e))
-                    result = self._generate_mock_detection_result(request)
+                    logger.error("Vision providers failed, falling back to mock", error=str(e))
+                    result = self._generate_mock_detection_result(None)
             else:
-                logger.warning("No Gemini API key available, using mock response")
-                # Mock response when no API key is available
-                result = self._generate_mock_detection_result(request)
+                logger.warning("No vision provider available, using mock response")
+                # Mock response when no provider is configured
+                result = self._generate_mock_detection_result(None)
+            
+            # result is this caller's own copy, never the shared cached one
+            with span("detection.nearby_facilities"):
+                result.nearby_facilities = nearby_facilities(result.species, location)
+            
+            # A dangerous species is usually followed by a first-aid question; start answering it now.
+            # Not for the mock fallback, whose species nobody photographed.
+            if result.species.severity in FIRST_AID_SEVERITIES and not is_mock_result(result):
+                result.follow_up_questions = [species_first_aid_query(result.species)]
+                get_prefetcher().schedule_species(result.species, session_id)
             
             processing_time = asyncio.get_event_loop().time() - start_time
+            get_analytics().record(
+                DETECTION_EVENT, session_id,
+                success=True,
+                species=result.species.scientific_name,
+                severity=result.species.severity.value,
+                confidence=result.confidence,
+                model=result.detection_metadata.get("model"),
+                latency_ms=round(processing_time * 1000, 2),
+                cache=cache,
+            )
             
             return SnakeDetectionResponse(
                 success=True,
@@ -61,6 +244,13 @@ class SnakeDetectionService:
         except Exception as e:
             processing_time = asyncio.get_event_loop().time() - start_time
             logger.error("Snake detection failed", error=str(e))
+            get_analytics().record(
+                DETECTION_EVENT, session_id,
+                success=False, latency_ms=round(processing_time * 1000, 2), cache=cache,
+            )
+            if isinstance(e, _REFUSALS):
+                # Over budget, overloaded or a bad image: say so rather than name a species
+                raise
             
             return SnakeDetectionResponse(
                 success=False,
@@ -68,91 +258,109 @@ class SnakeDetectionService:
                 processing_time=processing_time
             )
     
-    async def _detect_with_gemini(self, request: SnakeDetectionRequest) -> DetectionResult:
-        """Detect snake using Google Gemini API"""
-        import google.generativeai as genai
-        
-        # Configure Gemini
-        genai.configure(api_key=self.gemini_api_key)
-        model = genai.GenerativeModel(settings.GEMINI_VISION_MODEL)
-        
-        # Create a detailed prompt for snake identification
-        prompt = """Analyze this image and identify if it contains a snake. If it does, provide detailed information about the snake species.
-
-Focus on snakes commonly found in Sub-Saharan Africa, particularly Kenya.
-
-IMPORTANT: You must respond with ONLY valid JSON in this exact format:
-{
-    "scientific_name": "string",
-    "common_name": "string", 
-    "family": "string",
-    "genus": "string",
-    "venom_type": "neurotoxic|hemotoxic|cytotoxic|mixed|unknown",
-    "severity": "mild|moderate|severe|critical",
-    "distribution": ["string"],
-    "description": "string",
-    "first_aid_notes": "string",
-    "antivenom_available": true,
-    "confidence": 0.85
-}
-
-If no snake is detected, return:
-{
-    "scientific_name": "Unknown",
-    "common_name": "No snake detected", 
-    "family": "Unknown",
-    "genus": "Unknown",
-    "venom_type": "unknown",
-    "severity": "mild",
-    "distribution": [],
-    "description": "No snake detected in image",
-    "first_aid_notes": "No action required",
-    "antivenom_available": false,
-    "confidence": 0.0
-}
-
-Respond with ONLY the JSON, no other text."""
+    async def _detect_with_providers(
+        self, load_image: ImageLoader, confidence_threshold: float
+    ) -> Tuple[DetectionResult, str]:
+        """Detect snake using the routed vision providers
         
+        Returns the result and whether it was a cache "hit" or "miss".
+        """
         try:
-            # Handle both regular URLs and data URLs
-            if str(request.image_url).startswith('data:'):
-                # Handle data URL (base64 encoded image)
-                import base64
-                header, data = str(request.image_url).split(',', 1)
-                mime_type = header.split(';')[0].split(':')[1]
-                image_data = base64.b64decode(data)
-            else:
-                # Download image from URL
-                import httpx
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(str(request.image_url))
-                    image_data = response.content
-                    mime_type = "image/jpeg"  # Default to JPEG
-            
-            # Generate content with Gemini
-            response = model.generate_content([
-                prompt,
-                {
-                    "mime_type": mime_type,
-                    "data": image_data
-                }
-            ])
+            with span("detection.load_image") as load_span:
+                image_data, mime_type = await load_image()
+                load_span.set_attribute("image.bytes", len(image_data))
+            
+            with span("detection.cache_lookup") as lookup_span:
+                key = detection_cache_key(hashlib.sha256(image_data).hexdigest(), confidence_threshold)
+                cached = _detection_results.get(key)
+                lookup_span.set_attribute("cache.hit", cached is not None)
+            if cached is not None:
+                return cached.model_copy(deep=True), "hit"
             
-            # Parse the response and create detection result
-            content = response.text
-            logger.info("Gemini API response received", 
-                       response_length=len(content),
-                       response_preview=content[:200] if content else "Empty response")
-            return self._parse_gemini_response(content, request.confidence_threshold)
+            # Over budget, only cached answers are served
+            budget = get_usage_accountant().over_budget()
+            if budget:
+                get_usage_accountant().degraded(budget)
+                raise BudgetExhaustedError(budget, seconds_until_reset())
             
+            async def detect_once() -> DetectionResult:
+                result = await self._run_vision(image_data, mime_type, confidence_threshold)
+                # An unparseable provider answer falls back to the mock species; never remember
+                # or evaluate that. Done by the flight leader, once per upstream call.
+                if not is_mock_result(result):
+                    _detection_results.set(key, result)
+                    # Compared against the candidate model after this request is answered
+                    get_shadow_evaluator().submit(image_data, mime_type, confidence_threshold, result)
+                return result
+            
+            # Identical images detected concurrently share one upstream call
+            with span("detection.vision"):
+                result = await _detection_flights.do(key, detect_once)
+            return result.model_copy(deep=True), "miss"
+            
+        except (ExternalAPIError, *_REFUSALS):
+            raise
         except Exception as e:
-            raise ExternalAPIError(f"Gemini API error: {str(e)}", "Gemini")
+            raise ExternalAPIError(f"Vision provider error: {str(e)}", "router")
     
-    def _parse_gemini_response(self, content: str, confidence: float) -> DetectionResult:
-        """Parse Gemini response and create detection result"""
-        import json
-        import re
+    async def _load_image(self, request: SnakeDetectionRequest) -> Tuple[bytes, str]:
+        """Return image bytes and MIME type for a data URL or remote URL"""
+        image_url = request.image_url
+        if image_url.startswith('data:'):
+            # Handle data URL (base64 encoded image)
+            image = decode_data_url(image_url, settings.UPLOAD_MAX_BYTES)
+            return image.data, image.mime_type
         
+        # Download image from URL, once per URL however many requests ask for it
+        image_data = await _image_fetch_flights.do(image_url, lambda: self._fetch_image(image_url))
+        return image_data, "image/jpeg"  # Default to JPEG
+    
+    async def _fetch_image(self, image_url: str) -> bytes:
+        """Download an image, streamed and capped at UPLOAD_MAX_BYTES"""
+        import httpx
+        
+        limit = settings.UPLOAD_MAX_BYTES
+        try:
+            async with httpx.AsyncClient(timeout=settings.IMAGE_FETCH_TIMEOUT) as client:
+                async with client.stream("GET", image_url) as response:
+                    if not response.is_success:
+                        raise SnakeDetectionError(f"Image URL returned HTTP {response.status_code}")
+                    declared = response.headers.get("content-length")
+                    if declared and declared.isdigit() and int(declared) > limit:
+                        raise SnakeDetectionError(f"Image exceeds {limit} bytes", 413)
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body += chunk
+                        if len(body) > limit:
+                            raise SnakeDetectionError(f"Image exceeds {limit} bytes", 413)
+        except httpx.HTTPError as e:
+            # Timeouts carry no message of their own
+            raise SnakeDetectionError(f"Image could not be downloaded: {str(e) or type(e).__name__}")
+        if not body:
+            raise SnakeDetectionError("Image URL returned no data")
+        return bytes(body)
+    
+    async def _run_vision(self, image_data: bytes, mime_type: str, confidence: float) -> DetectionResult:
+        # Emergency detections always go to the most reliable tier
+        routed = await self.router.generate(
+            [DETECTION_PROMPT, {"mime_type": mime_type, "data": image_data}],
+            capability="vision",
+            tier="reliable",
+        )
+        
+        # Parse the response and create detection result
+        content = routed.text
+        logger.info("Vision provider response received", 
+                   provider=routed.provider,
+                   response_length=len(content),
+                   response_preview=content[:200] if content else "Empty response")
+        with span("detection.parse"):
+            return self._parse_gemini_response(content, confidence, routed)
+    
+    def _parse_gemini_response(
+        self, content: str, confidence: float, routed: Optional[RoutedResult] = None
+    ) -> DetectionResult:
+        """Parse Gemini-format JSON response and create detection result"""
         try:
             # Clean the response - remove markdown code blocks if present
             cleaned_content = content.strip()
@@ -203,8 +411,9 @@ Respond with ONLY the JSON, no other text."""
                 species=species,
                 confidence=data.get("confidence", confidence),
                 detection_metadata={
-                    "api_used": "gemini",
-                    "model": settings.GEMINI_VISION_MODEL,
+                    "api_used": routed.provider if routed else "gemini",
+                    "model": routed.model if routed else settings.GEMINI_VISION_MODEL,
+                    "routing": routed.metadata() if routed else None,
                     "raw_response": content[:200] + "..." if len(content) > 200 else content
                 }
             )
@@ -0,0 +1,323 @@
+"""
+Resumable chunked image uploads
+
+Clients create an upload with the total size (and ideally the image SHA-256),
+then PATCH chunks at the current offset. Chunks are spooled straight to disk
+while a running SHA-256 is kept, so completing an upload needs no second pass
+over the file. If the declared hash is already in the detection cache the
+result is returned before any bytes are sent; otherwise the final chunk hands
+the image to the detection job queue.
+
+Upload metadata lives next to the spool file, so an upload can be resumed on
+any worker that shares the upload directory. A worker that did not receive the
+earlier chunks rebuilds the running hash from the spooled bytes.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.core.exceptions import UploadError
+from app.core.logging import get_logger
+from app.models.snake_detection import SnakeDetectionResponse
+from app.models.uploads import UploadCreateRequest, UploadStatus
+from app.services.job_service import get_job_service
+from app.services.snake_detection_service import cached_detection, nearby_facilities
+from app.utils.urls import UnsafeURLError, check_public_url
+
+logger = get_logger(__name__)
+
+# How often stale spool files are swept, in seconds
+_SWEEP_INTERVAL = 300
+
+@dataclass
+class UploadSession:
+    """Persisted state of one upload"""
+    upload_id: str
+    size: int
+    mime_type: str
+    confidence_threshold: float
+    created_at: float
+    offset: int = 0
+    sha256: Optional[str] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+    location: Optional[str] = None
+    client_key: Optional[str] = None
+    webhook_url: Optional[str] = None
+    job_id: Optional[str] = None
+
+class UploadService:
+    """Spool, verify and hand off resumable uploads"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Running hashes for uploads whose chunks arrived at this process, keyed by upload id
+        self._hashers: Dict[str, "hashlib._Hash"] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last_sweep = 0.0
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def _save(self, session: UploadSession) -> None:
+        tmp_path = self._meta_path(session.upload_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(session), f)
+        os.replace(tmp_path, self._meta_path(session.upload_id))
+
+    @staticmethod
+    def _check_id(upload_id: str) -> None:
+        # Ids are generated by us; anything else cannot name a spool file
+        if len(upload_id) != 32 or not upload_id.isalnum():
+            raise UploadError("Upload not found", 404)
+
+    def _load(self, upload_id: str) -> UploadSession:
+        self._check_id(upload_id)
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                return UploadSession(**json.load(f))
+        except FileNotFoundError:
+            raise UploadError("Upload not found or expired", 404)
+
+    def _discard(self, upload_id: str) -> None:
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        for path in (self._data_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _sweep(self) -> None:
+        """Remove spool files of uploads abandoned for longer than UPLOAD_TTL_SECONDS"""
+        now = time.time()
+        if now - self._last_sweep < _SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > settings.UPLOAD_TTL_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+        # Uploads that finished, expired or never existed leave no metadata behind
+        for upload_id in list(self._hashers):
+            if not os.path.exists(self._meta_path(upload_id)):
+                del self._hashers[upload_id]
+        for upload_id, lock in list(self._locks.items()):
+            if not lock.locked() and not os.path.exists(self._meta_path(upload_id)):
+                del self._locks[upload_id]
+
+    def _hash_spooled(self, upload_id: str, length: int) -> "hashlib._Hash":
+        """Hash of the first length spooled bytes; run off the event loop"""
+        hasher = hashlib.sha256()
+        with open(self._data_path(upload_id), "rb") as f:
+            remaining = length
+            while remaining:
+                block = f.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    async def _hasher(self, session: UploadSession) -> "hashlib._Hash":
+        """Running hash of the bytes received so far"""
+        hasher = self._hashers.get(session.upload_id)
+        if hasher is None:
+            # Earlier chunks went to another process or a previous run
+            hasher = await asyncio.to_thread(self._hash_spooled, session.upload_id, session.offset)
+            self._hashers[session.upload_id] = hasher
+        return hasher
+
+    def _release_spool(self, upload_id: str) -> None:
+        """Drop the bytes of a finished upload; the metadata stays so retried final chunks still see it"""
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        try:
+            os.remove(self._data_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def _read_spooled(self, upload_id: str) -> bytes:
+        with open(self._data_path(upload_id), "rb") as f:
+            return f.read()
+
+    def _status(self, session: UploadSession, result: Optional[SnakeDetectionResponse] = None) -> UploadStatus:
+        complete = session.offset == session.size
+        return UploadStatus(
+            upload_id=session.upload_id,
+            offset=session.offset,
+            size=session.size,
+            complete=complete,
+            sha256=session.sha256 if complete else None,
+            job_id=session.job_id,
+            poll_url=f"/api/v1/jobs/{session.job_id}" if session.job_id else None,
+            result=result,
+        )
+
+    async def create(self, request: UploadCreateRequest) -> UploadStatus:
+        """Start an upload, or answer straight from the cache when the hash is known"""
+        if request.size > settings.UPLOAD_MAX_BYTES:
+            raise UploadError(f"Image exceeds {settings.UPLOAD_MAX_BYTES} bytes", 413)
+        if request.webhook_url:
+            # Checked now, as for /jobs, rather than dropped silently at delivery
+            try:
+                await check_public_url(request.webhook_url, settings.JOBS_WEBHOOK_ALLOWED_HOSTS)
+            except UnsafeURLError as e:
+                raise UploadError(f"Invalid webhook_url: {e}", 422)
+
+        sha256 = request.sha256.lower() if request.sha256 else None
+        if sha256:
+            cached = cached_detection(sha256, request.confidence_threshold)
+            if cached is not None:
+                logger.info("Upload short-circuited by detection cache", sha256=sha256[:16])
+                cached.nearby_facilities = nearby_facilities(cached.species, request.location)
+                return UploadStatus(
+                    offset=0,
+                    size=request.size,
+                    complete=True,
+                    sha256=sha256,
+                    result=SnakeDetectionResponse(success=True, result=cached, processing_time=0.0),
+                )
+
+        self._sweep()
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            size=request.size,
+            mime_type=request.mime_type,
+            confidence_threshold=request.confidence_threshold,
+            created_at=time.time(),
+            sha256=sha256,
+            user_id=request.user_id,
+            session_id=request.session_id,
+            location=request.location,
+            client_key=request.client_key,
+            webhook_url=request.webhook_url,
+        )
+        open(self._data_path(session.upload_id), "wb").close()
+        self._save(session)
+        self._hashers[session.upload_id] = hashlib.sha256()
+        logger.info("Upload created", upload_id=session.upload_id, size=session.size)
+        return self._status(session)
+
+    def status(self, upload_id: str) -> UploadStatus:
+        return self._status(self._load(upload_id))
+
+    async def append(
+        self,
+        upload_id: str,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        chunk_sha256: Optional[str] = None,
+    ) -> UploadStatus:
+        """Spool one chunk at offset; the final chunk starts detection
+
+        With a chunk checksum the chunk is all-or-nothing. Without one, bytes
+        received before a dropped connection are kept so the client can resume
+        from the new offset.
+        """
+        # Validate before creating a lock, so unknown ids cannot grow the lock table
+        self._check_id(upload_id)
+        if not os.path.exists(self._meta_path(upload_id)):
+            raise UploadError("Upload not found or expired", 404)
+        self._sweep()
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            session = self._load(upload_id)
+            if session.offset == session.size:
+                return self._status(session)
+            if offset != session.offset:
+                raise UploadError("Offset does not match bytes received", 409, offset=session.offset)
+
+            running = (await self._hasher(session)).copy()
+            chunk_hasher = hashlib.sha256()
+            received = 0
+            with open(self._data_path(upload_id), "r+b") as f:
+                f.seek(offset)
+                try:
+                    async for piece in chunks:
+                        received += len(piece)
+                        if received > settings.UPLOAD_MAX_CHUNK_BYTES or offset + received > session.size:
+                            f.truncate(offset)
+                            raise UploadError("Chunk too large", 413, offset=offset)
+                        f.write(piece)
+                        running.update(piece)
+                        chunk_hasher.update(piece)
+                except UploadError:
+                    raise
+                except Exception as e:
+                    if chunk_sha256:
+                        f.truncate(offset)
+                        raise UploadError(f"Chunk interrupted: {e}", 400, offset=offset)
+                    logger.warning("Upload chunk interrupted", upload_id=upload_id,
+                                   received=received, error=str(e))
+
+                if chunk_sha256 and chunk_hasher.hexdigest() != chunk_sha256.lower():
+                    f.truncate(offset)
+                    raise UploadError("Chunk checksum mismatch", 400, offset=offset)
+
+            session.offset = offset + received
+            if session.offset < session.size:
+                self._hashers[upload_id] = running
+                self._save(session)
+                return self._status(session)
+            # The running hash is not kept for the final chunk: if finishing fails
+            # (say the job queue is full), the retried chunk is hashed afresh
+            return await self._finish(session, running.hexdigest())
+
+    async def _finish(self, session: UploadSession, sha256: str) -> UploadStatus:
+        """Verify the completed image and start its detection"""
+        if session.sha256 and session.sha256 != sha256:
+            self._discard(session.upload_id)
+            raise UploadError("Image checksum mismatch, upload discarded", 400)
+        session.sha256 = sha256
+
+        cached = cached_detection(sha256, session.confidence_threshold)
+        if cached is not None:
+            cached.nearby_facilities = nearby_facilities(cached.species, session.location)
+            self._save(session)
+            self._release_spool(session.upload_id)
+            return self._status(
+                session, SnakeDetectionResponse(success=True, result=cached, processing_time=0.0)
+            )
+
+        image_data = await asyncio.to_thread(self._read_spooled, session.upload_id)
+        job, _ = await get_job_service().submit(
+            image_data,
+            session.mime_type,
+            client_key=session.client_key or session.upload_id,
+            webhook_url=session.webhook_url,
+            user_id=session.user_id,
+            session_id=session.session_id,
+            confidence_threshold=session.confidence_threshold,
+            location=session.location,
+        )
+        session.job_id = job.job_id
+        self._save(session)
+        self._release_spool(session.upload_id)
+        logger.info("Upload complete, detection queued", upload_id=session.upload_id, job_id=job.job_id)
+        return self._status(session)
+
+_service: Optional[UploadService] = None
+
+def get_upload_service() -> UploadService:
+    """Process-wide upload service"""
+    global _service
+    if _service is None:
+        directory = settings.UPLOAD_DIR or os.path.join(tempfile.gettempdir(), "snaktox-uploads")
+        _service = UploadService(directory)
+    return _service
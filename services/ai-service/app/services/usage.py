@@ -0,0 +1,218 @@
+"""
+Upstream token accounting and budgets
+
+Every successful provider call is charged to the current usage scope: the API
+route, the chat query type and the user, per UTC day. Counters live in memory
+and are flushed periodically to the log and, if USAGE_FLUSH_PATH is set, as
+NDJSON deltas that can be summed offline.
+
+Daily token budgets (global, per route and per user) are checked before
+upstream calls. Over budget, callers degrade to cached or local answers (a
+detection with no cached answer is refused with 429 until the reset);
+critical work (detections and emergency chats) is exempt unless
+USAGE_BUDGET_EXEMPT_CRITICAL is turned off.
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import BUDGET_DEGRADED, UPSTREAM_TOKENS
+from app.services.providers import Usage
+
+logger = get_logger(__name__)
+
+@dataclass
+class UsageScope:
+    """What the upstream calls made in this context are charged to"""
+    route: str
+    user_id: Optional[str] = None
+    query_type: Optional[str] = None
+    critical: bool = False
+
+_scope: contextvars.ContextVar[Optional[UsageScope]] = contextvars.ContextVar("snaktox_usage_scope", default=None)
+
+@contextmanager
+def usage_scope(route: str, user_id: Optional[str] = None, critical: bool = False) -> Iterator[UsageScope]:
+    """Charge upstream calls inside the block to route and user"""
+    scope = UsageScope(route=route, user_id=user_id, critical=critical)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+def current_scope() -> UsageScope:
+    return _scope.get() or UsageScope(route="unscoped")
+
+@dataclass
+class UsageCounters:
+    requests: int = 0
+    prompt_tokens: int = 0
+    image_tokens: int = 0
+    output_tokens: int = 0
+    estimated_requests: int = 0
+    cost_units: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.image_tokens + self.output_tokens
+
+    def add(self, usage: Usage, cost_units: float) -> None:
+        self.requests += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.image_tokens += usage.image_tokens
+        self.output_tokens += usage.output_tokens
+        self.estimated_requests += int(usage.estimated)
+        self.cost_units += cost_units
+
+# (day, route, query type, user)
+UsageKey = Tuple[str, str, str, str]
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+def seconds_until_reset() -> int:
+    """Seconds until the daily budgets reset at UTC midnight"""
+    return 86400 - int(time.time()) % 86400
+
+class UsageAccountant:
+    """In-memory usage counters with daily budgets"""
+
+    def __init__(self):
+        self.day = _today()
+        self._totals: Dict[UsageKey, UsageCounters] = {}
+        self._unflushed: Dict[UsageKey, UsageCounters] = {}
+        # Today's running totals for budget checks
+        self._global = 0
+        self._by_route: Dict[str, int] = {}
+        self._by_user: Dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _roll_day(self) -> None:
+        today = _today()
+        if today != self.day:
+            self.day = today
+            self._totals = {k: v for k, v in self._totals.items() if k[0] == today}
+            self._global = 0
+            self._by_route.clear()
+            self._by_user.clear()
+
+    def record(self, usage: Usage, cost_weight: float = 1.0) -> None:
+        """Charge one upstream call to the current scope"""
+        self._roll_day()
+        scope = current_scope()
+        key = (self.day, scope.route, scope.query_type or "-", scope.user_id or "anonymous")
+        cost_units = usage.total_tokens / 1000 * cost_weight
+        for counters in (self._totals, self._unflushed):
+            counters.setdefault(key, UsageCounters()).add(usage, cost_units)
+
+        tokens = usage.total_tokens
+        self._global += tokens
+        self._by_route[scope.route] = self._by_route.get(scope.route, 0) + tokens
+        if scope.user_id:
+            self._by_user[scope.user_id] = self._by_user.get(scope.user_id, 0) + tokens
+        UPSTREAM_TOKENS.labels(route=scope.route, kind="prompt").inc(usage.prompt_tokens)
+        UPSTREAM_TOKENS.labels(route=scope.route, kind="image").inc(usage.image_tokens)
+        UPSTREAM_TOKENS.labels(route=scope.route, kind="output").inc(usage.output_tokens)
+        self._ensure_flusher()
+
+    def over_budget(self) -> Optional[str]:
+        """Name of the exhausted budget for the current scope, or None"""
+        scope = current_scope()
+        if scope.critical and settings.USAGE_BUDGET_EXEMPT_CRITICAL:
+            return None
+        self._roll_day()
+        reason = None
+        if settings.USAGE_DAILY_TOKEN_BUDGET and self._global >= settings.USAGE_DAILY_TOKEN_BUDGET:
+            reason = "global"
+        route_budget = settings.USAGE_ROUTE_DAILY_TOKEN_BUDGETS.get(scope.route)
+        if reason is None and route_budget and self._by_route.get(scope.route, 0) >= route_budget:
+            reason = "route"
+        if (reason is None and scope.user_id and settings.USAGE_USER_DAILY_TOKEN_BUDGET
+                and self._by_user.get(scope.user_id, 0) >= settings.USAGE_USER_DAILY_TOKEN_BUDGET):
+            reason = "user"
+        return reason
+
+    def degraded(self, budget: str) -> None:
+        """Count a request answered without its upstream call because budget ran out
+
+        Kept apart from over_budget(), which background work polls as well.
+        """
+        BUDGET_DEGRADED.labels(route=current_scope().route, budget=budget).inc()
+
+    def route_tokens(self, route: str) -> int:
+        """Tokens charged to a route today"""
+        self._roll_day()
+        return self._by_route.get(route, 0)
+
+    def _ensure_flusher(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+            except RuntimeError:
+                pass  # No loop (scripts, tests); flush() can still be called directly
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.USAGE_FLUSH_SECONDS)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Log and persist counters accumulated since the last flush"""
+        pending, self._unflushed = self._unflushed, {}
+        if not pending:
+            return
+        lines = [
+            json.dumps({"day": day, "route": route, "query_type": query_type, "user": user, **asdict(counters)})
+            for (day, route, query_type, user), counters in pending.items()
+        ]
+        logger.info("Upstream usage", entries=len(lines),
+                    tokens=sum(c.total_tokens for c in pending.values()),
+                    requests=sum(c.requests for c in pending.values()))
+        if settings.USAGE_FLUSH_PATH:
+            try:
+                await asyncio.to_thread(self._append, settings.USAGE_FLUSH_PATH, "\n".join(lines) + "\n")
+            except OSError as e:
+                logger.warning("Usage flush failed", path=settings.USAGE_FLUSH_PATH, error=str(e))
+
+    @staticmethod
+    def _append(path: str, text: str) -> None:
+        with open(path, "a") as f:
+            f.write(text)
+
+    async def shutdown(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def snapshot(self, group_by: str = "route") -> Dict[str, Dict[str, float]]:
+        """Today's totals grouped by route, query_type or user"""
+        self._roll_day()
+        index = {"route": 1, "query_type": 2, "user": 3}[group_by]
+        grouped: Dict[str, UsageCounters] = {}
+        for key, counters in self._totals.items():
+            total = grouped.setdefault(key[index], UsageCounters())
+            for field_name in asdict(counters):
+                setattr(total, field_name, getattr(total, field_name) + getattr(counters, field_name))
+        return {
+            name: {**asdict(c), "total_tokens": c.total_tokens, "cost_units": round(c.cost_units, 4)}
+            for name, c in sorted(grouped.items(), key=lambda item: -item[1].total_tokens)
+        }
+
+_accountant: Optional[UsageAccountant] = None
+
+def get_usage_accountant() -> UsageAccountant:
+    """Process-wide usage accountant"""
+    global _accountant
+    if _accountant is None:
+        _accountant = UsageAccountant()
+    return _accountant
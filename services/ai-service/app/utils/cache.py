@@ -0,0 +1,68 @@
+"""
+In-process TTL + LRU cache
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class TTLCache(Generic[K, V]):
+    """Bounded mapping whose entries expire ttl seconds after being set
+
+    Reads refresh recency but not expiry; when full, the least recently used
+    entry is evicted. Not thread-safe, meant for use from the event loop.
+
+    A loader, when set, is asked for keys the cache does not hold and returns
+    (value, seconds to expiry) or None; what it returns is cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.loader: Optional[Callable[[K], Optional[Tuple[V, float]]]] = None
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            return self._load(key, default)
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def _load(self, key: K, default: Optional[V]) -> Optional[V]:
+        loaded = self.loader(key) if self.loader is not None else None
+        if loaded is None:
+            return default
+        value, ttl = loaded
+        self.set(key, value, ttl)
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None  # type: ignore[arg-type]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self) -> Iterator[Tuple[K, V, float]]:
+        """Live (key, value, seconds to expiry) entries, oldest first"""
+        now = time.monotonic()
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at >= now:
+                yield key, value, expires_at - now
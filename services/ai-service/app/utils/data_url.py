@@ -0,0 +1,307 @@
+"""
+Incremental decoding of base64 data URLs
+
+Detection requests can carry the image as a data URL inside a JSON body. The
+usual parse holds the raw body, the decoded JSON string, the base64 slice and
+the decoded image in memory at once. ``DataURLBodyParser`` instead scans the
+JSON object as it streams in and decodes the base64 of one data-URL field
+straight into a buffer capped at the image size limit. The other (small)
+fields are parsed normally. Malformed input and oversized images are rejected
+as soon as they are seen.
+"""
+
+import binascii
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class DataURLError(ValueError):
+    """Malformed data URL or request body"""
+
+class ImageTooLarge(DataURLError):
+    """Decoded image exceeds the size limit"""
+
+@dataclass
+class DecodedImage:
+    data: bytes
+    mime_type: str
+
+_NOT_BASE64 = re.compile(rb"[^A-Za-z0-9+/=]")
+_WHITESPACE = b" \t\r\n"
+_MAX_HEADER_BYTES = 256
+
+def _json_string(raw: bytes, what: str) -> str:
+    """Decode the inside of a JSON string literal"""
+    try:
+        return json.loads(b'"' + raw + b'"')
+    except ValueError:
+        raise DataURLError(f"Invalid {what}")
+
+class Base64Decoder:
+    """Incremental base64 decoder with a cap on the decoded size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._out = bytearray()
+        self._tail = b""
+        self._padded = False
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        if self._padded:
+            raise DataURLError("Data after base64 padding")
+        if _NOT_BASE64.search(data):
+            raise DataURLError("Invalid base64 character")
+        data = self._tail + data
+        usable = len(data) - len(data) % 4
+        # Checked before decoding, so oversized input never gets a buffer
+        if len(self._out) + usable // 4 * 3 > self.max_bytes + 2:
+            raise ImageTooLarge(f"Image exceeds {self.max_bytes} bytes")
+        block, self._tail = data[:usable], data[usable:]
+        padding = block.find(b"=")
+        if padding != -1:
+            if padding < usable - 2 or block[padding:].strip(b"="):
+                raise DataURLError("Misplaced base64 padding")
+            self._padded = True
+        self._out += binascii.a2b_base64(block)
+        if len(self._out) > self.max_bytes:
+            raise ImageTooLarge(f"Image exceeds {self.max_bytes} bytes")
+
+    def finish(self) -> bytes:
+        if self._tail:
+            raise DataURLError("Truncated base64")
+        if not self._out:
+            raise DataURLError("Empty image")
+        return bytes(self._out)
+
+def parse_header(header: str) -> str:
+    """MIME type of a "data:<mime>;base64" header"""
+    if not header.startswith("data:") or not header.endswith(";base64"):
+        raise DataURLError("Only base64 data URLs are supported")
+    return header[5:].split(";")[0] or "text/plain"
+
+def decode_data_url(url: str, max_bytes: int, block_chars: int = 1 << 20) -> DecodedImage:
+    """Decode a data URL string, a block at a time"""
+    comma = url.find(",", 0, _MAX_HEADER_BYTES)
+    if comma == -1:
+        raise DataURLError("Data URL has no data")
+    mime_type = parse_header(url[:comma])
+    if (len(url) - comma - 1) // 4 * 3 > max_bytes + 2:
+        raise ImageTooLarge(f"Image exceeds {max_bytes} bytes")
+    decoder = Base64Decoder(max_bytes)
+    for start in range(comma + 1, len(url), block_chars):
+        try:
+            decoder.feed(url[start:start + block_chars].encode("ascii"))
+        except UnicodeEncodeError:
+            raise DataURLError("Invalid base64 character")
+    return DecodedImage(decoder.finish(), mime_type)
+
+def describe_image_url(url: str) -> str:
+    """Loggable form of an image URL: data URLs become their header and size"""
+    if url.startswith("data:"):
+        comma = url.find(",", 0, _MAX_HEADER_BYTES)
+        header = url[:comma] if comma != -1 else url[:32]
+        return f"{header},<{len(url) - comma - 1} chars>"
+    return url
+
+class DataURLBodyParser:
+    """Streaming parser for a JSON object with one large data-URL field
+
+    Feed the body chunk by chunk, then call ``close()`` for the other fields
+    and the decoded image. When the field holds a data URL, the fields get its
+    header alone ("data:image/jpeg;base64,") in its place. Any other value of
+    the field, such as an https URL, is kept as it is.
+    """
+
+    def __init__(self, field: str, max_image_bytes: int, max_value_bytes: int = 64 * 1024):
+        self.field = field
+        self.max_image_bytes = max_image_bytes
+        self.max_value_bytes = max_value_bytes
+        self.fields: Dict[str, Any] = {}
+        self.image: Optional[DecodedImage] = None
+        self._state: Callable[[bytes, int], int] = self._start
+        self._buf = bytearray()
+        self._key = ""
+        self._decoder: Optional[Base64Decoder] = None
+        self._mime_type = ""
+        # Raw value scanning
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: bytes) -> None:
+        i = 0
+        while i < len(chunk):
+            i = self._state(chunk, i)
+
+    def close(self) -> Tuple[Dict[str, Any], Optional[DecodedImage]]:
+        if self._state != self._done:
+            raise DataURLError("Truncated JSON body")
+        return self.fields, self.image
+
+    def _take(self, data: bytes) -> None:
+        self._buf += data
+        if len(self._buf) > self.max_value_bytes:
+            raise DataURLError(f"Field {self._key!r} is too long")
+
+    @staticmethod
+    def _expect(chunk: bytes, i: int, allowed: bytes) -> Optional[int]:
+        """Next non-whitespace byte if it is one of allowed; None on whitespace"""
+        c = chunk[i]
+        if c in _WHITESPACE:
+            return None
+        if c not in allowed:
+            raise DataURLError(f"Unexpected {chr(c)!r} in JSON body")
+        return c
+
+    def _start(self, chunk: bytes, i: int) -> int:
+        if self._expect(chunk, i, b"{") is not None:
+            self._state = self._key_or_end
+        return i + 1
+
+    def _key_or_end(self, chunk: bytes, i: int) -> int:
+        c = self._expect(chunk, i, b'"}')
+        if c == ord('"'):
+            self._buf.clear()
+            self._state = self._key_chars
+        elif c == ord("}"):
+            self._state = self._done
+        return i + 1
+
+    def _next_key(self, chunk: bytes, i: int) -> int:
+        if self._expect(chunk, i, b'"') is not None:
+            self._buf.clear()
+            self._state = self._key_chars
+        return i + 1
+
+    def _key_chars(self, chunk: bytes, i: int) -> int:
+        c = chunk[i]
+        if c == ord('"') and not self._escaped:
+            self._key = _json_string(bytes(self._buf), "key")
+            self._state = self._colon
+        else:
+            self._escaped = c == ord("\\") and not self._escaped
+            if len(self._buf) >= _MAX_HEADER_BYTES:
+                raise DataURLError("Key is too long")
+            self._buf.append(c)
+        return i + 1
+
+    def _colon(self, chunk: bytes, i: int) -> int:
+        if self._expect(chunk, i, b":") is not None:
+            self._state = self._value
+        return i + 1
+
+    def _value(self, chunk: bytes, i: int) -> int:
+        c = chunk[i]
+        if c in _WHITESPACE:
+            return i + 1
+        self._buf.clear()
+        if self._key == self.field and c == ord('"'):
+            self._escaped = False
+            self._state = self._url_head
+            return i + 1
+        self._depth, self._in_string, self._escaped = 0, False, False
+        self._state = self._raw_value
+        return i
+
+    def _url_head(self, chunk: bytes, i: int) -> int:
+        """Bytes of the field before its data, to tell data URLs from others"""
+        c = chunk[i]
+        if len(self._buf) >= 5 and not self._buf.startswith(b"data:"):
+            # An ordinary URL: scan it as a plain JSON string
+            self._buf[:0] = b'"'
+            # Still inside the string, possibly right after a backslash
+            self._depth, self._in_string = 0, True
+            self._state = self._raw_value
+            return i
+        if self._escaped:
+            self._escaped = False
+            self._buf.append(c)
+        elif c == ord(",") and self._buf.startswith(b"data:"):
+            header = _json_string(bytes(self._buf), "data URL header")
+            self._mime_type = parse_header(header)
+            self._decoder = Base64Decoder(self.max_image_bytes)
+            self._state = self._url_data
+        elif c == ord('"') and self._buf.startswith(b"data:"):
+            raise DataURLError("Data URL has no data")
+        elif c == ord('"'):
+            # Short non-data value
+            self.fields[self._key] = _json_string(bytes(self._buf), f"value for {self._key!r}")
+            self._state = self._after_value
+        else:
+            if len(self._buf) >= _MAX_HEADER_BYTES:
+                raise DataURLError("Data URL header is too long")
+            self._escaped = c == ord("\\")
+            self._buf.append(c)
+        return i + 1
+
+    def _url_data(self, chunk: bytes, i: int) -> int:
+        assert self._decoder is not None
+        if self._escaped:
+            self._escaped = False
+            c = chunk[i]
+            if c == ord("/"):
+                self._decoder.feed(b"/")
+            elif c not in b"nr":  # line-wrapped base64
+                raise DataURLError("Invalid escape in data URL")
+            return i + 1
+        quote = chunk.find(b'"', i)
+        end = len(chunk) if quote == -1 else quote
+        backslash = chunk.find(b"\\", i, end)
+        if backslash != -1:
+            self._decoder.feed(chunk[i:backslash])
+            self._escaped = True
+            return backslash + 1
+        self._decoder.feed(chunk[i:end])
+        if quote == -1:
+            return end
+        self.image = DecodedImage(self._decoder.finish(), self._mime_type)
+        self._decoder = None
+        self.fields[self._key] = f"data:{self._mime_type};base64,"
+        self._state = self._after_value
+        return quote + 1
+
+    def _raw_value(self, chunk: bytes, i: int) -> int:
+        """Any other value, up to the comma or brace that ends it"""
+        start = i
+        while i < len(chunk):
+            c = chunk[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == ord("\\"):
+                    self._escaped = True
+                elif c == ord('"'):
+                    self._in_string = False
+            elif c == ord('"'):
+                self._in_string = True
+            elif c in b"[{":
+                self._depth += 1
+            elif self._depth:
+                if c in b"]}":
+                    self._depth -= 1
+            elif c in b",}":
+                self._take(chunk[start:i])
+                try:
+                    self.fields[self._key] = json.loads(bytes(self._buf))
+                except ValueError:
+                    raise DataURLError(f"Invalid value for {self._key!r}")
+                self._state = self._after_value
+                return i
+            i += 1
+        self._take(chunk[start:i])
+        return i
+
+    def _after_value(self, chunk: bytes, i: int) -> int:
+        c = self._expect(chunk, i, b",}")
+        if c == ord(","):
+            self._state = self._next_key
+        elif c == ord("}"):
+            self._state = self._done
+        return i + 1
+
+    def _done(self, chunk: bytes, i: int) -> int:
+        self._expect(chunk, i, b"")
+        return i + 1
@@ -0,0 +1,27 @@
+"""
+Token estimation helpers
+
+Gemini bills by tokens, not characters. Calling the tokenizer on every request
+would cost an extra round-trip, so these helpers use the usual ~4 characters
+per token approximation for budgeting.
+"""
+
+CHARS_PER_TOKEN = 4
+
+# Gemini counts each inline image as a fixed number of prompt tokens
+IMAGE_TOKENS = 258
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for a piece of text"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """Cut text so that it fits in roughly max_tokens tokens"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= len(suffix):
+        return ""
+    return text[: max_chars - len(suffix)].rstrip() + suffix
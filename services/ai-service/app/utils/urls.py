@@ -0,0 +1,53 @@
+"""
+Checks for caller-supplied URLs the service will request itself
+
+A URL from a client (such as a job webhook) must not let the client aim
+server-side requests at loopback, private networks or cloud metadata
+addresses. ``check_public_url`` requires https and either a host on an
+allowlist or one whose every address is publicly routable.
+"""
+
+import asyncio
+import ipaddress
+import socket
+from typing import Sequence
+from urllib.parse import urlsplit
+
+class UnsafeURLError(ValueError):
+    """URL the service refuses to request"""
+
+def host_allowed(host: str, allowed_hosts: Sequence[str]) -> bool:
+    """Whether host is one of allowed_hosts or a subdomain of one"""
+    host = host.lower().rstrip(".")
+    return any(host == allowed or host.endswith(f".{allowed}") for allowed in (h.lower() for h in allowed_hosts))
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+async def check_public_url(url: str, allowed_hosts: Sequence[str] = ()) -> None:
+    """Raise UnsafeURLError unless url is https on an allowed or public host"""
+    try:
+        parsed = urlsplit(url)
+        port = parsed.port or 443
+    except ValueError:
+        raise UnsafeURLError("Malformed URL")
+    if parsed.scheme != "https":
+        raise UnsafeURLError("URL must use https")
+    host = parsed.hostname
+    if not host or parsed.username or parsed.password:
+        raise UnsafeURLError("URL must name a host and carry no credentials")
+    if allowed_hosts:
+        if not host_allowed(host, allowed_hosts):
+            raise UnsafeURLError(f"Host {host} is not allowed")
+        return
+
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeURLError(f"Host {host} cannot be resolved")
+    addresses = {info[4][0] for info in infos}
+    if not addresses or not all(_is_public(address) for address in addresses):
+        raise UnsafeURLError(f"Host {host} resolves to a non-public address")
@@ -0,0 +1,187 @@
+"""
+Local stand-in for the Gemini REST API
+
+Serves ``POST /v1beta/models/{model}:generateContent`` with canned responses so
+the service can be benchmarked and load-tested without the real upstream.
+Requests carrying ``inline_data`` get a species identification, classification
+prompts get a category name, and anything else gets a chat answer. Latency is
+drawn from a configurable distribution and a configurable fraction of calls
+fail, so routing, failover and shedding can be exercised.
+
+Point the service at it with an ``http`` provider, for example::
+
+    MODEL_PROVIDERS='[{"name": "fake", "kind": "http", "model": "fake-vision",
+      "tier": "reliable", "capabilities": ["text", "vision"],
+      "base_url": "http://127.0.0.1:9100"}]'
+
+Usage:
+    python -m benchmarks.fake_upstream [--port 9100] [--latency lognormal:0.8:0.4]
+                                       [--error-rate 0.02] [--responses canned.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+VISION_RESPONSE = {
+    "scientific_name": "Dendroaspis polylepis",
+    "common_name": "Black Mamba",
+    "family": "Elapidae",
+    "genus": "Dendroaspis",
+    "venom_type": "neurotoxic",
+    "severity": "critical",
+    "distribution": ["Kenya", "Tanzania", "Uganda"],
+    "description": "Long, slender, grey-brown snake with an inky black mouth lining.",
+    "first_aid_notes": "Keep the victim calm and still, remove tight items and get to a hospital immediately.",
+    "antivenom_available": True,
+    "confidence": 0.91,
+}
+
+TEXT_RESPONSE = (
+    "**Immediate steps:**\n"
+    "- Keep the person calm and still\n"
+    "- Remove rings, watches and tight clothing near the bite\n"
+    "- Do not cut, suck or apply a tourniquet\n"
+    "- Go to the nearest hospital with antivenom now\n"
+)
+
+@dataclass
+class LatencyModel:
+    """Seconds to wait before answering
+
+    Spec strings: ``fixed:S``, ``uniform:LO:HI`` or ``lognormal:MEDIAN:SIGMA``.
+    """
+    kind: str = "fixed"
+    params: tuple = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, *values = spec.split(":")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Bad latency spec: {spec}")
+        return cls(kind, tuple(float(v) for v in values))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+@dataclass
+class FakeUpstreamConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    error_status: int = 503
+    # Per-model overrides of the canned text, keyed by model name then by "vision"/"text"/"classify"
+    responses: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    seed: Optional[int] = None
+
+def _prompt_kind(payload: Dict[str, Any]) -> str:
+    parts = [p for content in payload.get("contents", []) for p in content.get("parts", [])]
+    if any("inline_data" in p or "inlineData" in p for p in parts):
+        return "vision"
+    text = " ".join(p.get("text", "") for p in parts)
+    if text.startswith("Classify this snakebite-related query"):
+        return "classify"
+    return "text"
+
+def _classify(payload: Dict[str, Any]) -> str:
+    text = payload["contents"][0]["parts"][0].get("text", "").lower()
+    if any(word in text for word in ("bitten", "bite", "help", "emergency")):
+        return "emergency"
+    if "prevent" in text:
+        return "prevention"
+    return "general"
+
+def _usage(payload: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """usageMetadata as Gemini reports it, at ~4 characters per token and 258 per image"""
+    parts = [p for content in payload.get("contents", []) for p in content.get("parts", [])]
+    parts += payload.get("systemInstruction", {}).get("parts", [])
+    text_tokens = sum(len(p.get("text", "")) for p in parts) // 4
+    image_tokens = 258 * sum(1 for p in parts if "inline_data" in p or "inlineData" in p)
+    output_tokens = len(text) // 4
+    return {
+        "promptTokenCount": text_tokens + image_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": text_tokens + image_tokens + output_tokens,
+        "promptTokensDetails": [
+            {"modality": "TEXT", "tokenCount": text_tokens},
+            {"modality": "IMAGE", "tokenCount": image_tokens},
+        ],
+    }
+
+def create_app(config: FakeUpstreamConfig) -> FastAPI:
+    app = FastAPI(title="Fake Gemini upstream", docs_url=None, redoc_url=None)
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "errors": 0}
+
+    @app.get("/")
+    async def root():
+        return {"service": "fake-upstream", **stats}
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(config.latency.sample(rng))
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"code": config.error_status, "message": "injected failure"}},
+                                status_code=config.error_status)
+
+        kind = _prompt_kind(payload)
+        text = config.responses.get(model, {}).get(kind)
+        if text is None:
+            if kind == "vision":
+                text = json.dumps(VISION_RESPONSE)
+            elif kind == "classify":
+                text = _classify(payload)
+            else:
+                text = TEXT_RESPONSE
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": _usage(payload, text),
+            "modelVersion": model,
+        }
+
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:0.8:0.4", help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--responses", help="JSON file of {model: {vision|text|classify: text}} overrides")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    responses = {}
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+    config = FakeUpstreamConfig(
+        latency=LatencyModel.parse(args.latency),
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        responses=responses,
+        seed=args.seed,
+    )
+
+    import uvicorn
+
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+End-to-end load benchmark
+
+Starts the fake Gemini upstream and the service (or targets a running one),
+then drives each scenario at a fixed concurrency and reports throughput,
+p50/p95/p99 latency, service memory per request and event-loop lag. Results
+are written as JSON; pass --baseline with an earlier result to print the
+change per scenario.
+
+Event-loop lag is estimated by probing /health/live every 50 ms during each
+scenario: the handler does no work, so its latency is time spent waiting for
+the loop.
+
+Usage:
+    python -m benchmarks.load [--scenarios health,predict,upload,chat] [--concurrency 32]
+                              [--requests 500] [--latency lognormal:0.8:0.4] [--error-rate 0.01]
+                              [--target http://127.0.0.1:8000] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+
+CHAT_QUERIES = [
+    "I was just bitten by a snake, what do I do?",
+    "How do I prevent snakebites when walking at night?",
+    "What does a puff adder look like?",
+    "Is a black mamba bite dangerous?",
+    "What first aid should I give for a snakebite?",
+    "Which snakes in Kenya are venomous?",
+]
+
+Scenario = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _rss_bytes(pid: Optional[int]) -> Optional[int]:
+    """Resident set size of a process (Linux only)"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _image(index: int, unique: bool) -> bytes:
+    # Unique bytes defeat the detection cache so every request reaches the upstream
+    seed = index if unique else 0
+    return b"\xff\xd8\xff\xe0" + random.Random(seed).randbytes(16 * 1024) + b"\xff\xd9"
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def build_scenarios(unique_images: bool) -> Dict[str, Scenario]:
+    async def health(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.get("/health/")
+
+    async def predict(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        data_url = "data:image/jpeg;base64," + base64.b64encode(_image(i, unique_images)).decode("ascii")
+        return await client.post("/api/v1/predict", json={"image_url": data_url, "location": "-1.29,36.82"})
+
+    async def upload(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.post(
+            "/api/v1/upload-and-detect",
+            files={"image": ("snake.jpg", _image(i, unique_images), "image/jpeg")},
+            data={"userId": f"bench-{i % 50}", "sessionId": f"bench-{i}", "location": "-1.29,36.82"},
+        )
+
+    async def chat(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.post(
+            "/api/v1/chat",
+            json={"query": CHAT_QUERIES[i % len(CHAT_QUERIES)], "session_id": f"bench-{i % 20}"},
+        )
+
+    return {"health": health, "predict": predict, "upload": upload, "chat": chat}
+
+async def _probe_loop_lag(client: httpx.AsyncClient, stop: asyncio.Event, samples: List[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get("/health/live")
+            samples.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), 0.05)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_scenario(
+    base_url: str, name: str, scenario: Scenario, concurrency: int, total: int, pid: Optional[int]
+) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lag_samples: List[float] = []
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client, \
+            httpx.AsyncClient(base_url=base_url, timeout=30) as probe_client:
+        async def worker() -> None:
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await scenario(client, i)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - start
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == "200":
+                    latencies.append(elapsed)
+
+        rss_before = _rss_bytes(pid)
+        peak_rss = rss_before or 0
+        stop = asyncio.Event()
+        prober = asyncio.create_task(_probe_loop_lag(probe_client, stop, lag_samples))
+        start = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        while not all(w.done() for w in workers):
+            await asyncio.sleep(0.1)
+            peak_rss = max(peak_rss, _rss_bytes(pid) or 0)
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+        rss_after = _rss_bytes(pid)
+
+    latencies.sort()
+    lag_samples.sort()
+    ok = len(latencies)
+    result: Dict[str, Any] = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "statuses": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "loop_lag_ms": {
+            "samples": len(lag_samples),
+            "p50": round(percentile(lag_samples, 50) * 1000, 2),
+            "p99": round(percentile(lag_samples, 99) * 1000, 2),
+            "max": round(lag_samples[-1] * 1000, 2) if lag_samples else 0.0,
+        },
+    }
+    if rss_before is not None and rss_after is not None:
+        result["memory"] = {
+            "rss_before_mb": round(rss_before / 2**20, 1),
+            "rss_after_mb": round(rss_after / 2**20, 1),
+            "rss_peak_mb": round(peak_rss / 2**20, 1),
+            "growth_per_request_kb": round((rss_after - rss_before) / 1024 / max(total, 1), 2),
+            "peak_per_concurrent_request_kb": round((peak_rss - rss_before) / 1024 / max(concurrency, 1), 2),
+        }
+    return result
+
+def _wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not become ready")
+
+def start_stack(args: argparse.Namespace) -> Dict[str, Any]:
+    """Spawn the fake upstream and the service; returns the processes and service URL"""
+    upstream_port, service_port = _free_port(), _free_port()
+    upstream = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstream", "--port", str(upstream_port),
+         "--latency", args.latency, "--error-rate", str(args.error_rate), "--seed", "1"],
+        cwd=SERVICE_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    _wait_ready(f"http://127.0.0.1:{upstream_port}/")
+
+    base_url = f"http://127.0.0.1:{upstream_port}"
+    providers = [
+        {"name": "fake-fast", "kind": "http", "model": "fake-flash", "tier": "fast",
+         "capabilities": ["text"], "cost": 0.2, "base_url": base_url},
+        {"name": "fake-reliable", "kind": "http", "model": "fake-pro", "tier": "reliable",
+         "capabilities": ["text", "vision"], "cost": 1.0, "base_url": base_url},
+    ]
+    env = dict(
+        os.environ,
+        PYTHONUNBUFFERED="1",
+        GEMINI_API_KEY="",
+        MODEL_PROVIDERS=json.dumps(providers),
+        LOG_LEVEL="WARNING",
+    )
+    service = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(service_port), "--log-level", "warning"],
+        cwd=SERVICE_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    service_url = f"http://127.0.0.1:{service_port}"
+    _wait_ready(f"{service_url}/health/ready")
+    return {"processes": [service, upstream], "url": service_url, "pid": service.pid}
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the change in throughput and p95 per scenario against a baseline run"""
+    previous = {s["scenario"]: s for s in baseline.get("scenarios", [])}
+    print(f"\ncompared with {baseline.get('revision', '?')}:")
+    for scenario in result["scenarios"]:
+        old = previous.get(scenario["scenario"])
+        if not old:
+            continue
+        def change(new: float, before: float) -> str:
+            return f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {scenario['scenario']:<8} throughput {change(scenario['throughput_rps'], old['throughput_rps'])}"
+              f"  p95 {change(scenario['latency_ms']['p95'], old['latency_ms']['p95'])}")
+
+async def run(args: argparse.Namespace, base_url: str, pid: Optional[int]) -> List[Dict[str, Any]]:
+    scenarios = build_scenarios(not args.repeat_images)
+    results = []
+    for name in args.scenarios.split(","):
+        if name not in scenarios:
+            raise SystemExit(f"Unknown scenario: {name}")
+        result = await run_scenario(base_url, name, scenarios[name], args.concurrency, args.requests, pid)
+        results.append(result)
+        latency = result["latency_ms"]
+        print(f"{name:<8} {result['throughput_rps']:8.1f} req/s  p50 {latency['p50']:7.1f}  p95 {latency['p95']:7.1f}"
+              f"  p99 {latency['p99']:7.1f} ms  loop lag p99 {result['loop_lag_ms']['p99']:.1f} ms"
+              f"  ok {result['ok']}/{result['requests']}")
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default="health,predict,upload,chat")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--latency", default="lognormal:0.8:0.4", help="Fake upstream latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake upstream failure rate")
+    parser.add_argument("--repeat-images", action="store_true", help="Send the same image every time")
+    parser.add_argument("--target", help="Benchmark a running service instead of spawning one")
+    parser.add_argument("--pid", type=int, help="Service PID for memory readings with --target")
+    parser.add_argument("--output", default=str(SERVICE_ROOT / "benchmarks" / "results" / "load.json"))
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    stack = None
+    if args.target:
+        base_url, pid = args.target.rstrip("/"), args.pid
+    else:
+        stack = start_stack(args)
+        base_url, pid = stack["url"], stack["pid"]
+
+    try:
+        scenarios = asyncio.run(run(args, base_url, pid))
+    finally:
+        if stack:
+            for proc in stack["processes"]:
+                proc.terminate()
+                proc.wait()
+
+    result = {
+        "benchmark": "load",
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "upstream_latency": None if args.target else args.latency,
+            "upstream_error_rate": None if args.target else args.error_rate,
+            "unique_images": not args.repeat_images,
+        },
+        "scenarios": scenarios,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"results written to {output}")
+
+    if args.baseline:
+        compare(result, json.loads(Path(args.baseline).read_text()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Response serialization benchmark
+
+Times turning each response model the API returns into body bytes, both the
+way FastAPI does it by default (dump, validate against response_model,
+``jsonable_encoder``, stdlib ``json``) and through ``FastJSONResponse``. Also
+checks that both produce the same JSON. Results are written as JSON.
+
+Usage:
+    python -m benchmarks.serialization [--iterations 5000] [--output benchmarks/results/serialization.json]
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def sample_responses() -> Dict[str, BaseModel]:
+    """One representative instance of each response model"""
+    from app.api.v1.health import HealthResponse
+    from app.models.chatbot import ChatbotRequest, ChatbotResponse, QueryType
+    from app.models.jobs import DetectionJob, JobStatus
+    from app.models.snake_detection import SnakeDetectionResponse
+    from app.services.chatbot_service import ChatbotService
+    from app.services.snake_detection_service import SnakeDetectionService, nearby_facilities
+
+    detection = SnakeDetectionService()
+    result = detection._generate_mock_detection_result(None)
+    result.nearby_facilities = nearby_facilities(result.species, "-1.2921,36.8219")
+    predict = SnakeDetectionResponse(success=True, result=result, processing_time=1.234)
+
+    chat = ChatbotService()
+    answer = chat._generate_mock_response(ChatbotRequest(query="I was bitten"), QueryType.FIRST_AID)
+    chat_response = ChatbotResponse(
+        success=True,
+        response=answer["content"],
+        query_type=QueryType.FIRST_AID,
+        confidence=answer["confidence"],
+        sources=answer["sources"],
+        follow_up_questions=answer["follow_up_questions"],
+        processing_time=0.42,
+    )
+
+    health = HealthResponse(
+        status="healthy", timestamp="2024-01-01T00:00:00", uptime=0.0, version="1.0.0",
+        services={"snake_detection": "operational", "chatbot": "operational"},
+    )
+
+    job = DetectionJob(
+        job_id="0" * 32, status=JobStatus.SUCCEEDED, image_sha256="0" * 64,
+        created_at="2024-01-01T00:00:00Z", updated_at="2024-01-01T00:00:02Z", result=predict,
+    )
+    return {"predict": predict, "chat": chat_response, "health": health, "job": job}
+
+async def _fastapi_default(field, model: BaseModel) -> bytes:
+    content = await serialize_response(field=field, response_content=model)
+    return JSONResponse(content).body
+
+def _time(fn: Callable[[], Any], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+def run(iterations: int) -> Dict[str, Any]:
+    from app.core.responses import FastJSONResponse
+
+    loop = asyncio.new_event_loop()
+    results: Dict[str, Any] = {}
+    for name, model in sample_responses().items():
+        field = create_response_field(name=f"Response_{name}", type_=type(model))
+        default_body = loop.run_until_complete(_fastapi_default(field, model))
+        fast_body = FastJSONResponse(model).body
+        before = _time(lambda: loop.run_until_complete(_fastapi_default(field, model)), iterations)
+        after = _time(lambda: FastJSONResponse(model).body, iterations)
+        results[name] = {
+            "model": type(model).__name__,
+            "bytes": len(fast_body),
+            "before_us": round(before * 1e6, 2),
+            "after_us": round(after * 1e6, 2),
+            "speedup": round(before / after, 2),
+            "identical": json.loads(default_body) == json.loads(fast_body),
+        }
+    loop.close()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--output", default=str(SERVICE_ROOT / "benchmarks" / "results" / "serialization.json"))
+    args = parser.parse_args()
+
+    responses = run(args.iterations)
+    result = {
+        "benchmark": "serialization",
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "iterations": args.iterations,
+        "responses": responses,
+    }
+
+    print(f"{'response':<10} {'bytes':>7} {'before µs':>10} {'after µs':>10} {'speedup':>8}  same")
+    for name, r in responses.items():
+        print(f"{name:<10} {r['bytes']:>7} {r['before_us']:>10} {r['after_us']:>10} {r['speedup']:>7}x  {r['identical']}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
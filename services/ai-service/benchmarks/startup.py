@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark
+
+Reports the import-time profile of ``main`` (from ``python -X importtime``) and
+the wall time from process start to the first successful ``/health/ready``,
+then writes both to a JSON file so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--top 15] [--output benchmarks/results/startup.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def import_profile(top: int) -> Dict[str, Any]:
+    """Cumulative import time of main and its heaviest top-level dependencies"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVICE_ROOT, capture_output=True, text=True, check=True,
+    )
+    modules: List[Dict[str, Any]] = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent) // 2
+        if name == "main":
+            total_us = int(cumulative_us)
+        # Depth 1 entries are the direct imports of main and of site
+        if depth <= 1:
+            modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return {"main_import_ms": total_us / 1000, "top_modules": modules[:top]}
+
+def time_to_ready(timeout: float = 60.0) -> float:
+    """Seconds from spawning uvicorn to the first 200 from /health/ready"""
+    port = _free_port()
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health/ready"
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("service did not become ready")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default=str(SERVICE_ROOT / "benchmarks" / "results" / "startup.json"))
+    args = parser.parse_args()
+
+    profile = import_profile(args.top)
+    ready = [time_to_ready() for _ in range(args.runs)]
+    result = {
+        "benchmark": "startup",
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "import_profile": profile,
+        "time_to_ready_s": {
+            "runs": [round(r, 4) for r in ready],
+            "median": round(statistics.median(ready), 4),
+            "min": round(min(ready), 4),
+        },
+    }
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+
+    print(f"main import: {profile['main_import_ms']:.1f} ms")
+    for module in profile["top_modules"]:
+        print(f"  {module['cumulative_ms']:8.1f} ms  {module['module']}")
+    print(f"time to /health/ready: median {result['time_to_ready_s']['median']:.3f} s over {args.runs} runs")
+    print(f"results written to {output}")
+
+if __name__ == "__main__":
+    main()
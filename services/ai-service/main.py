@@ -6,16 +6,21 @@ Uses external APIs for AI capabilities instead of local ML models
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import JSONResponse, Response
 from starlette.middleware.base import BaseHTTPMiddleware
-import uvicorn
 import structlog
 import time
+import asyncio
 from contextlib import asynccontextmanager
 
+from app.core.body_limit import BodySizeLimitMiddleware
 from app.core.config import settings
 from app.core.logging import setup_logging
-from app.api.v1 import snake_detection, chatbot, health
+from app.api.v1 import snake_detection, chatbot, health, jobs, uploads, debug, admin, internal
 from app.core.exceptions import SnaKToxAIException
+from app.core.lifecycle import inflight
+from app.core.responses import FastJSONResponse
+from app.core.tracing import NOOP_SPAN, exporter, server_timing, start_request_span, traceparent_for
 
 # Setup structured logging
 setup_logging()
@@ -29,6 +34,11 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         url = str(request.url)
         client_ip = request.client.host if request.client else "unknown"
         user_agent = request.headers.get("user-agent", "unknown")
+        request_span = start_request_span(
+            f"{method} {request.url.path}",
+            request.headers.get("traceparent"),
+            **{"http.method": method, "http.target": request.url.path},
+        )
         
         logger.info(
             "Incoming request",
@@ -38,34 +48,70 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             user_agent=user_agent
         )
         
-        try:
-            response = await call_next(request)
-            duration = time.time() - start_time
-            logger.info(
-                "Request completed",
-                method=method,
-                url=url,
-                status_code=response.status_code,
-                duration_ms=round(duration * 1000, 2)
-            )
-            return response
-        except Exception as e:
-            duration = time.time() - start_time
-            logger.error(
-                "Request failed",
-                method=method,
-                url=url,
-                error=str(e),
-                duration_ms=round(duration * 1000, 2)
-            )
-            raise
+        with request_span:
+            try:
+                response = await call_next(request)
+                duration = time.time() - start_time
+                request_span.set_attribute("http.status_code", response.status_code)
+                logger.info(
+                    "Request completed",
+                    method=method,
+                    url=url,
+                    status_code=response.status_code,
+                    duration_ms=round(duration * 1000, 2)
+                )
+            except Exception as e:
+                duration = time.time() - start_time
+                logger.error(
+                    "Request failed",
+                    method=method,
+                    url=url,
+                    error=str(e),
+                    duration_ms=round(duration * 1000, 2)
+                )
+                raise
+        
+        if request_span is not NOOP_SPAN:
+            response.headers["traceparent"] = traceparent_for(request_span)
+            if settings.SERVER_TIMING_ENABLED:
+                response.headers["Server-Timing"] = server_timing(request_span)
+            exporter.submit(request_span.trace)
+        return response
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     logger.info("Starting SnaKTox AI Service", version=settings.VERSION)
+    if settings.LOOP_MONITOR_ENABLED:
+        from app.core.loop_monitor import get_loop_monitor
+        get_loop_monitor().start()
+    warmup_task = None
+    if settings.STARTUP_WARMUP:
+        # Runs in the background so readiness is not delayed by upstream handshakes
+        from app.services.model_router import get_provider_router
+        warmup_task = asyncio.create_task(get_provider_router().warm_up())
+    from app.services.cache_snapshots import get_cache_snapshots
+    get_cache_snapshots().start()
     yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
     logger.info("Shutting down SnaKTox AI Service")
+    await inflight.drain(settings.SERVER_GRACEFUL_TIMEOUT)
+    from app.services.job_service import get_job_service
+    await get_job_service().shutdown()
+    from app.services.prefetch import get_prefetcher
+    await get_prefetcher().shutdown()
+    from app.services.shadow import get_shadow_evaluator
+    await get_shadow_evaluator().shutdown()
+    # After the drain, so the last answers make it into the snapshot
+    await get_cache_snapshots().shutdown()
+    from app.services.analytics import get_analytics
+    await get_analytics().shutdown()
+    from app.services.usage import get_usage_accountant
+    await get_usage_accountant().shutdown()
+    if settings.LOOP_MONITOR_ENABLED:
+        await get_loop_monitor().stop()
+    await exporter.shutdown()
 
 # Create FastAPI application
 app = FastAPI(
@@ -74,12 +120,20 @@ app = FastAPI(
     version=settings.VERSION,
     docs_url="/docs",
     redoc_url="/redoc",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse if settings.FAST_JSON_RESPONSES else JSONResponse
 )
 
 # Request logging middleware (add first to log all requests)
 app.add_middleware(RequestLoggingMiddleware)
 
+# Body size limit; the internal API, when mounted, enforces its own per endpoint
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.REQUEST_MAX_BODY_BYTES,
+    exempt_prefixes=("/internal/",) if settings.INTERNAL_API_ENABLED else ()
+)
+
 # Security middleware
 app.add_middleware(
     TrustedHostMiddleware,
@@ -99,15 +153,27 @@ app.add_middleware(
 @app.exception_handler(SnaKToxAIException)
 async def snaktox_exception_handler(request, exc: SnaKToxAIException):
     logger.error("SnaKTox AI Exception", error=str(exc), status_code=exc.status_code)
-    return HTTPException(
+    headers = {}
+    if getattr(exc, "retry_after", None) is not None:
+        headers["Retry-After"] = str(exc.retry_after)
+    if getattr(exc, "offset", None) is not None:
+        headers["Upload-Offset"] = str(exc.offset)
+    return JSONResponse(
         status_code=exc.status_code,
-        detail=exc.detail
+        content={"detail": exc.detail},
+        headers=headers
     )
 
 # Include API routes
 app.include_router(health.router, prefix="/health", tags=["health"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"], include_in_schema=False)
+app.include_router(admin.router, prefix="/admin", tags=["admin"], include_in_schema=False)
 app.include_router(snake_detection.router, prefix="/api/v1", tags=["snake-detection"])
 app.include_router(chatbot.router, prefix="/api/v1", tags=["chatbot"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["jobs"])
+app.include_router(uploads.router, prefix="/api/v1", tags=["uploads"])
+if settings.INTERNAL_API_ENABLED:
+    app.include_router(internal.router, prefix="/internal/v1", tags=["internal"], include_in_schema=False)
 
 @app.get("/")
 async def root():
@@ -119,11 +185,26 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint"""
+    from app.core.metrics import render_latest
+    
+    payload, content_type = render_latest()
+    return Response(content=payload, media_type=content_type)
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=settings.DEBUG,
-        log_level="info"
-    )
+    if settings.DEBUG:
+        import uvicorn
+        
+        # Single auto-reloading process for development
+        uvicorn.run(
+            "main:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            reload=True,
+            log_level="info"
+        )
+    else:
+        from app.core.server import run
+        run()